@@ -0,0 +1,81 @@
+from PyQt5 import QtCore, QtGui
+from PyQt5.QtCore import Qt
+
+
+class AuditTableModel(QtCore.QAbstractTableModel):
+    """
+    Audited ballots shown in the main window's audit table. The model reads
+    the ballots on demand and only announces the rows that were added or
+    changed, so entering a ballot costs the same however long the audit is.
+    """
+    AUDIT_NUM = 0
+    BALLOT_NUM = 1
+    REPORTED_VALUE = 2
+    ACTUAL_VALUE = 3
+
+    headers = ["Audit #", "Actual Ballot #", "Reported Value", "Actual Value"]
+    highlight_color = QtGui.QColor(255, 154, 0)
+
+    def __init__(self, ballots=None, parent=None):
+        super().__init__(parent)
+        self._ballots = ballots if ballots is not None else []
+        self._highlighted_row = None
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._ballots)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(AuditTableModel.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return QtCore.QCoreApplication.translate("MainWindow", AuditTableModel.headers[section])
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role == Qt.DisplayRole:
+            ballot = self._ballots[index.row()]
+            if index.column() == AuditTableModel.AUDIT_NUM:
+                return str(index.row())
+            elif index.column() == AuditTableModel.BALLOT_NUM:
+                return str(ballot.get_physical_ballot_num())
+            elif index.column() == AuditTableModel.REPORTED_VALUE:
+                return ballot.get_reported_value().get_name()
+            elif index.column() == AuditTableModel.ACTUAL_VALUE:
+                return ballot.get_actual_value().get_name()
+        elif role == Qt.BackgroundRole and index.row() == self._highlighted_row:
+            return QtGui.QBrush(AuditTableModel.highlight_color)
+        return None
+
+    def get_ballot(self, row):
+        return self._ballots[row]
+
+    def set_ballots(self, ballots):
+        self.beginResetModel()
+        self._ballots = ballots
+        self._highlighted_row = None
+        self.endResetModel()
+
+    def append_ballot(self, ballot):
+        row = len(self._ballots)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self._ballots.append(ballot)
+        self.endInsertRows()
+
+    def ballot_changed(self, row):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def set_highlighted_row(self, row):
+        # Highlights the ballot on which the audit stopped; None clears it
+        previous = self._highlighted_row
+        self._highlighted_row = row
+        for changed in (previous, row):
+            if changed is not None and changed < len(self._ballots):
+                self.ballot_changed(changed)
@@ -0,0 +1,126 @@
+import threading
+from PyQt5 import QtCore
+
+
+class Cancelled(Exception):
+    pass
+
+
+def recompute_job(audit, ballots, results, replay, progress):
+    # Job the main window runs on the service, against a private copy of the audit
+    audit.simulation_callback = progress
+    stopped_ballot = audit.recompute(ballots, results) if replay else None
+    status = audit.get_status()
+    progress_str = audit.get_progress()
+    audit.simulation_callback = None
+    return audit, len(ballots), replay, stopped_ballot, status, progress_str
+
+
+class _JobSignals(QtCore.QObject):
+    # Emitted from the worker thread, delivered to the service on the GUI thread
+    done = QtCore.pyqtSignal(int, object)
+    failed = QtCore.pyqtSignal(int, str)
+    progress = QtCore.pyqtSignal(int, int, int)
+
+
+class _Job(QtCore.QRunnable):
+    def __init__(self, generation, fn, args, signals):
+        super().__init__()
+        self._generation = generation
+        self._fn = fn
+        self._args = args
+        self._signals = signals
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report_progress(self, done, total):
+        # Passed to the job as its progress callback; also where cancellation takes effect
+        if self._cancel.is_set():
+            raise Cancelled()
+        self._signals.progress.emit(self._generation, int(done), int(total))
+
+    def run(self):
+        try:
+            result = self._fn(*self._args, progress=self.report_progress)
+        except Cancelled:
+            result = Cancelled
+        except Exception as e:
+            self._signals.failed.emit(self._generation, str(e))
+            return
+        self._signals.done.emit(self._generation, result)
+
+
+class RecomputeService(QtCore.QObject):
+    """
+    Runs audit computations on a QThreadPool thread, one at a time. A request
+    made while another is running cancels it and waits in a single pending
+    slot, so a burst of requests runs only the last one. Only the result of
+    the latest request is posted back through `finished`.
+
+    Jobs are called as fn(*args, progress=callback) and should call
+    callback(done, total) regularly; the callback raises Cancelled once the
+    job has been superseded.
+    """
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    progress = QtCore.pyqtSignal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pool = QtCore.QThreadPool.globalInstance()
+        self._signals = _JobSignals(self)
+        self._signals.done.connect(self._on_done)
+        self._signals.failed.connect(self._on_failed)
+        self._signals.progress.connect(self._on_progress)
+
+        self._generation = 0
+        self._running = None
+        self._pending = None
+
+    def request(self, fn, *args):
+        self._generation += 1
+        self._pending = (self._generation, fn, args)
+        if self._running is not None:
+            self._running.cancel()
+        else:
+            self._start_pending()
+
+    def cancel(self):
+        # Drops the pending request and stops the running one; nothing is posted back
+        self._generation += 1
+        self._pending = None
+        if self._running is not None:
+            self._running.cancel()
+
+    def is_busy(self):
+        return self._running is not None or self._pending is not None
+
+    def _start_pending(self):
+        if self._pending is None:
+            return
+        generation, fn, args = self._pending
+        self._pending = None
+        self._running = _Job(generation, fn, args, self._signals)
+        self._running.setAutoDelete(False)
+        self._pool.start(self._running)
+
+    @QtCore.pyqtSlot(int, object)
+    def _on_done(self, generation, result):
+        self._running = None
+        if generation == self._generation and result is not Cancelled:
+            self.finished.emit(result)
+        self._start_pending()
+
+    @QtCore.pyqtSlot(int, str)
+    def _on_failed(self, generation, message):
+        self._running = None
+        if generation == self._generation:
+            self.failed.emit(message)
+        self._start_pending()
+
+    @QtCore.pyqtSlot(int, int, int)
+    def _on_progress(self, generation, done, total):
+        if generation == self._generation:
+            self.progress.emit(done, total)
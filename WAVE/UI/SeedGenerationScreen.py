@@ -10,6 +10,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtCore import pyqtSignal
 import random
 import audit
+from audit import journal
 import UI
 import UI.UIUtils
 
@@ -155,7 +156,7 @@ class Ui_Seed_Generation(object):
     def open_main_window(self):
         self.window = QtWidgets.QMainWindow()
         self.ui = UI.Ui_MainWindow()
-        self.ui.init(self._election, self._audit, int(self.seed))
+        self.ui.init(self._election, self._audit, int(self.seed), journal_filename=journal.journal_filename(self._election))
         self.ui.setupUi(self.window)
         self.window.show()
 
@@ -1,2 +1,4 @@
+from UI.AuditTableModel import AuditTableModel
+from UI.RecomputeService import RecomputeService
 from UI.mainwindow import Ui_MainWindow
 from UI.SeedGenerationScreen import Ui_Seed_Generation
\ No newline at end of file
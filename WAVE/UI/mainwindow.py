@@ -7,16 +7,14 @@
 # WARNING! All changes made in this file will be lost!
 
 from PyQt5 import QtCore, QtGui, QtWidgets
-from PyQt5.QtGui import  QColor
 from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QTableWidget,QTableWidgetItem
-import enum
+import copy
 import audit
+from audit import sampler, event_log, journal
 import election
-import random
-import csv
 import UI
 import UI.UIUtils
+from UI.RecomputeService import recompute_job
 
 from PyQt5.QtCore import pyqtSignal
 class Ui_MainWindow(object):
@@ -29,25 +27,71 @@ class Ui_MainWindow(object):
     seed = 0
     #audit_type = "bcrla"
 
-    class TableNum(enum.IntEnum):
-        AUDIT_NUM = 0
-        BALLOT_NUM = 1
-        REPORTED_VALUE = 2
-        ACTUAL_VALUE = 3
-
     def __init__(self):
         self._election = None
         self._current_ballot = None
+        self._current_row = None
         self._audit = None
+        self._replay_requested = False
+        self._journal = None
 
         self._audits = audit.get_audits()
 
-    def init(self, election, audit,seed):
+    def init(self, election, audit, seed, journal_filename=None):
         self._election = election
         self._audit = audit
         self.seed = int(seed)
 
-        print("SEED " + str(self.seed))
+        # With a journal, an interrupted audit of this election can pick up where it left off
+        if journal_filename is not None:
+            self._journal = journal.Journal(journal_filename)
+            if not (self._journal.exists() and self.resume_journal()):
+                self._journal.start(self.seed, audit, election.get_ballot_count(),
+                                    key=journal.election_key(election))
+
+        event_log.log_event("seed", seed=self.seed)
+
+    def resume_journal(self):
+        """
+        Resumes the session in the journal if it used the seed just entered,
+        or if the user chooses to. Otherwise, or if the journal cannot be
+        resumed, it is archived so a new session can start. Returns whether
+        the session was resumed.
+        """
+        session = self._journal.read_session()
+        if session is not None and (session["seed"] == self.seed or self.confirm_resume(session)):
+            try:
+                self.resume(self._journal.resume(self._election))
+                return True
+            except (ValueError, KeyError, IndexError) as error:
+                archived = self._journal.archive()
+                QtWidgets.QMessageBox.warning(None, "Audit journal",
+                                              "The interrupted audit could not be resumed ({}). "
+                                              "It was kept as {} and a new audit is started.".format(error, archived))
+                event_log.log_event("journal_rejected", journal=archived, error=str(error))
+                return False
+
+        archived = self._journal.archive()
+        event_log.log_event("journal_archived", journal=archived)
+        return False
+
+    def confirm_resume(self, session):
+        # Asks whether to resume an interrupted audit that used another seed
+        answer = QtWidgets.QMessageBox.question(
+            None, "Resume audit?",
+            "An interrupted {} of this election with seed {} was found. Resume it "
+            "instead of starting a new audit with seed {}?".format(session["audit"], session["seed"], self.seed),
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No)
+        return answer == QtWidgets.QMessageBox.Yes
+
+    def resume(self, session):
+        # Must run before setupUi, which shows audited_ballots in the audit table
+        self.seed = session.seed
+        self._audit = session.audit
+        self.audited_ballots = session.ballots
+        self.audited_ballot_nums = [b.get_physical_ballot_num() for b in session.ballots]
+        self.current_audit_ballot = session.next_draw
+        event_log.log_event("resume", journal=self._journal.get_filename(), ballots=len(session.ballots))
 
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
@@ -76,7 +120,7 @@ class Ui_MainWindow(object):
         self.line_5.setFrameShape(QtWidgets.QFrame.HLine)
         self.line_5.setObjectName("line_5")
         self.gridLayout_2.addWidget(self.line_5, 0, 0, 2, 1)
-        self.auditTable = QtWidgets.QTableWidget(self.centralwidget)
+        self.auditTable = QtWidgets.QTableView(self.centralwidget)
         self.auditTable.setEnabled(True)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.MinimumExpanding)
         sizePolicy.setHorizontalStretch(100)
@@ -99,17 +143,10 @@ class Ui_MainWindow(object):
         self.auditTable.setIconSize(QtCore.QSize(0, 0))
         self.auditTable.setGridStyle(QtCore.Qt.SolidLine)
         self.auditTable.setWordWrap(True)
-        self.auditTable.setRowCount(0)
-        self.auditTable.setColumnCount(4)
+        self.auditTableModel = UI.AuditTableModel(self.audited_ballots)
+        self.auditTable.setModel(self.auditTableModel)
+        self.auditTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.auditTable.setObjectName("auditTable")
-        item = QtWidgets.QTableWidgetItem()
-        self.auditTable.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.auditTable.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.auditTable.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.auditTable.setHorizontalHeaderItem(3, item)
         self.auditTable.horizontalHeader().setVisible(True)
         self.auditTable.horizontalHeader().setDefaultSectionSize(53)
         self.auditTable.verticalHeader().setVisible(False)
@@ -471,6 +508,10 @@ class Ui_MainWindow(object):
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
         MainWindow.setStatusBar(self.statusbar)
+        self.recomputeService = UI.RecomputeService(MainWindow)
+        self.recomputeService.finished.connect(self.on_recompute_finished)
+        self.recomputeService.failed.connect(self.on_recompute_failed)
+        self.recomputeService.progress.connect(self.on_recompute_progress)
         self.auditSpecialValuesTable.raise_()
 
         self.retranslateUi(MainWindow)
@@ -510,7 +551,7 @@ class Ui_MainWindow(object):
 
         self.contestantTable.setShowGrid(False)
         self.reportedResultsTable.setShowGrid(False)
-        self.auditTable.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
+        self.auditTable.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.contestantTable.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
         self.reportedResultsTable.setEditTriggers(QtWidgets.QTableWidget.NoEditTriggers)
 
@@ -525,14 +566,7 @@ class Ui_MainWindow(object):
     def retranslateUi_backup(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
         MainWindow.setWindowTitle(_translate("MainWindow", "MainWindow"))
-        item = self.auditTable.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Audit #"))
-        item = self.auditTable.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Actual Ballot #"))
-        item = self.auditTable.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Reported Value"))
-        item = self.auditTable.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "Actual Value"))
+        self.auditTableModel.headerDataChanged.emit(Qt.Horizontal, 0, self.auditTableModel.columnCount() - 1)
         self.recomputeButton.setText(_translate("MainWindow", "Recompute"))
         self.pushButton.setText(_translate("MainWindow", "Edit Election"))
         self.exportButton.setText(_translate("MainWindow", "Export Results"))
@@ -652,21 +686,14 @@ class Ui_MainWindow(object):
     def get_audit_type(self):
         return self.getAuditTypeComboBox().currentIndex()
 
-    def setTableCell(self, row, col, value):
-        self.auditTable.setItem(row, col, QtWidgets.QTableWidgetItem(value))
-
-    def setAuditTableCell(self, row, col, value):
-        self.auditTable.setItem(row, col, QtWidgets.QTableWidgetItem(value))
-
     def setReportedResultsTableCell(self, row, col, value):
         self.reportedResultsTable.setItem(row, col, QtWidgets.QTableWidgetItem(value))
 
     def setContestantTableCell(self, row, col, value):
         self.contestantTable.setItem(row, col, QtWidgets.QTableWidgetItem(value))
 
-    def getCurrentlySelectedAuditTableRow(self, tableItem):
-        self.auditTable.setItem(1, 1, QtWidgets.QTableWidgetItem(tableItem))
-        return tableItem.currentRow()
+    def getCurrentlySelectedAuditTableRow(self):
+        return self.auditTable.currentIndex().row()
 
     def setAuditSpecialValueTableCell(self,row,col, value):
         self.auditSpecialValuesTable.setItem(row, col, QtWidgets.QTableWidgetItem(value))
@@ -680,21 +707,20 @@ class Ui_MainWindow(object):
 
         return audit_index
 
-    def setCurrentBallotInformation(self, tableItem):
-        self._current_ballot = list(filter(lambda b: b.get_audit_seq_num() == self.auditTable.currentRow(),
-                                           self._election.get_ballots()))[0]
+    def setCurrentBallotInformation(self, tableIndex):
+        row = tableIndex.row()
+        self._current_row = row
+        self._current_ballot = self.auditTableModel.get_ballot(row)
 
-        self.auditedBallotValue.setText(str(self.auditTable.currentRow()))
+        self.auditedBallotValue.setText(str(row))
 
-        reportedValueName = self.auditTable.item(self.auditTable.currentRow(), 2).text()
+        reportedValueName = self._current_ballot.get_reported_value().get_name()
         index = self.reportedValueComboBox.findText(str(reportedValueName)) #findText(str(name))
         self.reportedValueComboBox.setCurrentIndex(index)
 
-        actualValueName = self.auditTable.item(self.auditTable.currentRow(), 3).text()
+        actualValueName = self._current_ballot.get_actual_value().get_name()
 
-        if not actualValueName:
-            print("VALUE IS NULL")
-        else:
+        if actualValueName:
             actualValueIndex = self.reportedValueComboBox.findText(str(actualValueName))  # findText(str(name))
             self.actualValueComboBox.setCurrentIndex(actualValueIndex)
 
@@ -708,44 +734,37 @@ class Ui_MainWindow(object):
         if reported_value_text == "Select Candidate" or actual_value_text == "Select Candidate":
             return
 
-        reported_value = list(filter(lambda x: x.get_name() == reported_value_text, self._election.get_contestants()))[0]
-        actual_value = list(filter(lambda x: x.get_name() == actual_value_text, self._election.get_contestants()))[0]
+        reported_value = self._election.get_contestant_by_name(reported_value_text)
+        actual_value = self._election.get_contestant_by_name(actual_value_text)
 
-        self._current_ballot.set_reported_value(reported_value)
-        self._current_ballot.set_actual_value(actual_value)
-        self.audited_ballots[self._current_ballot.get_audit_seq_num()].set_actual_value(actual_value)
-        self.audited_ballots[self._current_ballot.get_audit_seq_num()].set_reported_value(reported_value)
-
-
-
-        self.reload_audit_table()
-        self._audit.recompute(self.audited_ballots, self._election.get_reported_results())
-        self.recompute_and_highlight()
+        if self._audit.supports_remove:
+            self._audit.amend_ballot(self._current_ballot, reported_value, actual_value)
+        else:
+            # Audits that cannot undo a single ballot replay the whole sample
+            self._current_ballot.set_reported_value(reported_value)
+            self._current_ballot.set_actual_value(actual_value)
+            self._replay_requested = True
+        if self._journal is not None:
+            self._journal.record_amend(self._current_row, self._current_ballot)
+
+        self.auditTableModel.ballot_changed(self._current_row)
         self.refresh_audit_status()
 
     def save_and_add_ballot(self):
         self.choose_next_ballot()
         if not self.auditedBallotValue.text().isdigit():
             pass
-        elif int(self.auditedBallotValue.text()) >= self.auditTable.rowCount():
+        elif int(self.auditedBallotValue.text()) >= self.auditTableModel.rowCount():
             audit_seq = int(self.auditedBallotValue.text())
 
             reported_value_text = self.reportedValueComboBox.currentText()
             actual_value_text = self.actualValueComboBox.currentText()
 
-            print("Reported Value Text")
-            print(reported_value_text)
-            print("Actual Value Text")
-            print(actual_value_text)
-
             if reported_value_text == "Select Candidate" or actual_value_text == "Select Candidate":
                 return
 
-            reported_value = list(filter(lambda x: x.get_name() == reported_value_text,
-                                         self._election.get_contestants()))[0]
-
-            actual_value = list(filter(lambda x: x.get_name() == actual_value_text,
-                                       self._election.get_contestants()))[0]
+            reported_value = self._election.get_contestant_by_name(reported_value_text)
+            actual_value = self._election.get_contestant_by_name(actual_value_text)
 
             # TODO: FIX THIS JANK
             physical_seq = -1
@@ -757,75 +776,43 @@ class Ui_MainWindow(object):
             ballot.set_actual_value(actual_value)
 
             self._election.add_ballot(ballot)
-            self.reload_audit_table()
             #self._audit.recompute(self._election.get_ballots(), self._election.get_reported_results())
             # self._audit.recompute(self.audited_ballots, self._election.get_reported_results())
             # self.refresh_audit_status()
         else:
             self.save_ballot()
-        #TODO: IS IT OK TO RECOMPUTE AFTER JUST CLICKING THE BUTTON WITHOUT HAVING TO MESS WITH THE VALUES?
-        self._audit.recompute(self.audited_ballots, self._election.get_reported_results())
         self.refresh_audit_status()
-        self.auditedBallotValue.setText(str(self.auditTable.rowCount()))
+        self.auditedBallotValue.setText(str(self.auditTableModel.rowCount()))
         self.reportedValueComboBox.setCurrentIndex(0)
         self.actualValueComboBox.setCurrentIndex(0)
 
     def reload_audit_table(self):
-        _translate = QtCore.QCoreApplication.translate
-
-        self.auditTable.setRowCount(0)
-
-        # Table Setup
-        self.auditTable.horizontalHeaderItem(Ui_MainWindow.TableNum.AUDIT_NUM).setText(
-            _translate("MainWindow", "Audit #"))
-        self.auditTable.horizontalHeaderItem(Ui_MainWindow.TableNum.BALLOT_NUM).setText(
-            _translate("MainWindow", "Actual Ballot #"))
-        self.auditTable.horizontalHeaderItem(Ui_MainWindow.TableNum.REPORTED_VALUE).setText(
-            _translate("MainWindow", "Reported Value"))
-        self.auditTable.horizontalHeaderItem(Ui_MainWindow.TableNum.ACTUAL_VALUE).setText(
-            _translate("MainWindow", "Actual Value"))
-
-        # for i, ballot in enumerate(sorted(self._election.get_ballots(), key=lambda x: x.get_audit_seq_num())):
-        for i in range(0, self.current_audit_ballot):#ballot in self.audited_ballots:
-            self.auditTable.insertRow(i)
-            ballot = self.audited_ballot_nums[i]
-            print ("BALLOT NUM: " + str(ballot))
-            self.setTableCell(i, Ui_MainWindow.TableNum.AUDIT_NUM, str(i))
-            self.setTableCell(i, Ui_MainWindow.TableNum.BALLOT_NUM, str(self.audited_ballots[i].get_physical_ballot_num()))
-            #self.setTableCell(i, Ui_MainWindow.TableNum.BALLOT_NUM, str(self.audited_ballots[i].get_physical_ballot_num()))
-            self.setTableCell(i, Ui_MainWindow.TableNum.REPORTED_VALUE, self.audited_ballots[i].get_reported_value().get_name())
-            self.setTableCell(i, Ui_MainWindow.TableNum.ACTUAL_VALUE, self.audited_ballots[i].get_actual_value().get_name())
-
-
+        # Only needed when the audited ballots are replaced; entries update single rows
+        self.auditTableModel.set_ballots(self.audited_ballots)
 
     def choose_next_ballot(self):
         if(self.total_rows == 0):
             self.set_csv_total_rows(self.filename)
-       # next_ballot = round(random.random() * self.total_rows*10) % self.total_rows
-        next_ballot = random.randint(2, self.total_rows)
-        print(next_ballot)
-        self.auditTable.insertRow(self.current_audit_ballot)
-        if self._election.get_ballots is None:
-            print("NULL")
-        # else:
-        #     print(len(self._election.get_ballots))
-        ballot = self._election.get_ballot(next_ballot-2)
+        next_ballot = sampler.draw(self.seed, self.current_audit_ballot, self.total_rows)
+        ballot = self._election.get_ballot(next_ballot)
         ballot.set_audit_seq_num(self.current_audit_ballot)
-        self.audited_ballots.append(ballot)
+        self.auditTableModel.append_ballot(ballot)
+        event_log.log_event("draw", draw=self.current_audit_ballot, index=next_ballot,
+                            ballot=ballot.get_physical_ballot_num())
+        self._audit.add_ballot(ballot)
+        if self._journal is not None:
+            self._journal.record_draw(self.current_audit_ballot, next_ballot, ballot)
 
         self.audited_ballot_nums.append(ballot.get_physical_ballot_num())
 
         self.current_audit_ballot = self.current_audit_ballot + 1
-        self.reload_audit_table()
+        self.auditTable.scrollToBottom()
 
     def set_csv_total_rows(self, filename):
-        input_file = open(filename, "r+")
-        reader_file = csv.reader(input_file)
-        self.total_rows = len(list(reader_file))
-        random.seed(self.seed)
+        # The election already holds one ballot per CVR row
+        self.total_rows = self._election.get_ballot_count()
 
     def recompute_audit(self):
-        self.reload_audit_table()
         param = []
 
         for i in range(self.auditSpecialValuesTable.rowCount()):
@@ -837,22 +824,23 @@ class Ui_MainWindow(object):
             self._audit = self._audits[int(self.getAuditTypeComboBoxSelectedIndex())]()
             self._audit.init(self._election.get_reported_results(),
                     self._election.get_ballot_count())
+            # Later entries are applied incrementally, so catch the new audit up now
+            self.recompute_and_highlight()
 
             self.refresh_parameters()
 
         else:
             self._audit.set_parameters(param)
             self.recompute_and_highlight()
-            self.refresh_audit_status()
+
+        if self._journal is not None:
+            self._journal.record_parameters(self._audit.get_name(),
+                                            [p[1] for p in self._audit.get_parameters()])
 
     def recompute_and_highlight(self):
-        stopped_ballot = self._audit.recompute(self.audited_ballots, 
-            self._election.get_reported_results())
-        
-        if stopped_ballot is not None and stopped_ballot.get_audit_seq_num() <= self.auditTable.rowCount():
-            for i in range(self.auditTable.columnCount()):
-                self.auditTable.item(stopped_ballot.get_audit_seq_num(), i).setBackground(
-                        QtGui.QColor(255, 154, 0))
+        # Replays the sample in the background; on_recompute_finished highlights the stopping ballot
+        self._replay_requested = True
+        self.refresh_audit_status()
 
     def refresh_parameters(self):
         self.auditSpecialValuesTable.setRowCount(0)
@@ -864,12 +852,51 @@ class Ui_MainWindow(object):
             self.setAuditSpecialValueTableCell(i, 1, param[1])
 
     def refresh_audit_status(self):
-        if self._audit is not None:
-            self.setProgressValueLabel(self._audit.get_progress())
-            self.setProgressLabel(self._audit.get_status())
-        else:
+        if self._audit is None:
+            self.recomputeService.cancel()
             self.setProgressValueLabel("Please Select")
             self.setProgressLabel("an audit")
+            return
+
+        # The worker gets its own copy of the audit, sharing the ballots and contestants
+        shared = [self._election.get_ballots()] + list(self._election.get_contestants())
+        snapshot = copy.deepcopy(self._audit, {id(obj): obj for obj in shared})
+        self.recomputeService.request(recompute_job,
+                                      snapshot,
+                                      list(self.audited_ballots),
+                                      self._election.get_reported_results(),
+                                      self._replay_requested)
+        self.statusbar.showMessage("Updating audit status...")
+
+    def on_recompute_finished(self, result):
+        updated_audit, ballot_count, replayed, stopped_ballot, status, progress = result
+
+        # Ballots drawn while the worker ran are applied to its copy before it takes over
+        for ballot in self.audited_ballots[ballot_count:]:
+            updated_audit.add_ballot(ballot)
+        self._audit = updated_audit
+        # The audit now reflects every journal entry, so it can be snapshotted
+        if self._journal is not None and (replayed or self._journal.snapshot_due()):
+            self._journal.snapshot(self._audit, self.audited_ballots, self._election)
+
+        if replayed:
+            self._replay_requested = False
+            if stopped_ballot is not None and stopped_ballot.get_audit_seq_num() < self.auditTableModel.rowCount():
+                self.auditTableModel.set_highlighted_row(stopped_ballot.get_audit_seq_num())
+            else:
+                self.auditTableModel.set_highlighted_row(None)
+
+        self.setProgressValueLabel(progress)
+        self.setProgressLabel(status)
+        self.statusbar.clearMessage()
+
+    def on_recompute_failed(self, message):
+        self._replay_requested = False
+        self.statusbar.showMessage("Audit update failed: {}".format(message))
+        event_log.log_event("recompute_failed", event_log.WARNING, error=message)
+
+    def on_recompute_progress(self, done, total):
+        self.statusbar.showMessage("Simulating upset probability... {}/{} trials".format(done, total))
 
     def retranslateUi(self, MainWindow):
         # Generate the Basic Window
@@ -969,10 +996,7 @@ class Ui_MainWindow(object):
         self.recomputeButton.setText(_translate("MainWindow", "Recompute"))
         self.exportButton.setText(_translate("MainWindow", "Export Results"))
         self.choose_next_ballot()
-        if (self.get_audit_type() == 1):
-            self.set_bprla_UI()
-        elif (self.get_audit_type() == 2):
-            self.set_comp_rla_UI()
+        self.modify_UI_listener()
 
 
     def set_bprla_UI(self):
@@ -989,9 +1013,10 @@ class Ui_MainWindow(object):
         self.reportedValueComboBox.setDisabled(False)
 
     def modify_UI_listener(self):
-        if (self.get_audit_type() == 1):
+        selected_audit = self._audits[self.get_audit_type()]
+        if selected_audit is audit.BallotPolling:
             self.set_bprla_UI()
-        elif (self.get_audit_type() == 2):
+        elif selected_audit is not audit.Audit:
             self.set_comp_rla_UI()
 
 
@@ -1004,4 +1029,3 @@ if __name__ == "__main__":
     ui.setupUi(MainWindow)
     MainWindow.show()
     sys.exit(app.exec_())
-
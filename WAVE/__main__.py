@@ -1,5 +1,6 @@
 import election
 import audit
+from audit import event_log
 import data_gen
 import sys
 from PyQt5 import QtCore, QtGui, QtWidgets
@@ -16,9 +17,8 @@ pres.gen_ballots(ballot_count, 0.05)
 
 e = pres.get_election()
 
-for i, ballot in enumerate(e.get_ballots()):
-    print("Ballot " + str(ballot.get_audit_seq_num()) + " Reported Value " + str(
-        ballot.get_reported_value().get_name()) + " Actual value " + str(ballot.get_actual_value().get_name()))
+# Ballot decisions and statistics go to the tamper-evident event log
+event_log.start("audit_log.jsonl")
 
 rla = audit.BallotPolling()
 rla.init(pres.get_reported_results(), e.get_ballot_count())
@@ -0,0 +1,77 @@
+import sys
+import csv
+from collections import OrderedDict
+import election
+from audit import planner
+
+
+"""
+Plans ballot polling and comparison audits for every contest in a CSV file
+with the columns contest, ballots, candidate, votes (one row per candidate;
+ballots is the number of ballots cast in the contest) and writes the
+expected and 50/90/99th percentile sample sizes of each to the output file.
+
+usage: python __planner__.py contests.csv output.csv [risk limit %] [trials] [seed]
+"""
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("usage: python __planner__.py contests.csv output.csv [risk limit %] [trials] [seed]")
+        sys.exit(1)
+    risk_limit = float(sys.argv[3]) / 100 if len(sys.argv) > 3 else 0.05
+    num_trials = int(sys.argv[4]) if len(sys.argv) > 4 else 1000
+    seed = int(sys.argv[5]) if len(sys.argv) > 5 else None
+
+    names, contests, ballot_counts = read_contests(sys.argv[1])
+    plans = planner.plan(contests, ballot_counts, risk_limit, trials=num_trials, seed=seed)
+
+    with open(sys.argv[2], 'w', newline='') as myfile:
+        wr = csv.writer(myfile, delimiter=',')
+        wr.writerow(['Contest',
+                     'Ballots',
+                     'Audit type',
+                     'Risk Limit',
+                     'Trials',
+                     'Analytic ASN',
+                     'Mean Ballots to Stop'] +
+                    ['{:g}% Quantile'.format(q * 100) for q in planner.QUANTILES] +
+                    ['Full Hand Count Rate'])
+        for name, ballot_count, contest_plans in zip(names, ballot_counts, plans):
+            for audit_type, summary in contest_plans.items():
+                wr.writerow([name,
+                             str(ballot_count),
+                             audit_type,
+                             '{:g}'.format(risk_limit * 100),
+                             str(num_trials),
+                             format_value(summary["asn"]),
+                             format_value(summary["mean"])] +
+                            [format_value(summary[q]) for q in planner.QUANTILES] +
+                            [format_value(summary["full_hand_count_rate"])])
+
+
+def read_contests(filename):
+    # Contest names, per-contest lists of Results and ballot counts, in file order
+    rows = OrderedDict()
+    with open(filename, 'r', encoding='utf-8-sig') as csvfile:
+        csvfile.readline()  # Skip first line
+        readCSV = csv.reader(csvfile, delimiter=',')
+        for contest, ballots, candidate, votes in readCSV:
+            rows.setdefault((contest, int(ballots)), []).append((candidate, int(votes)))
+
+    names, contests, ballot_counts = [], [], []
+    for (contest, ballots), candidates in rows.items():
+        total = sum(votes for _, votes in candidates)
+        contests.append([election.Result(election.Contestant(i, candidate), votes / total, votes)
+                         for i, (candidate, votes) in enumerate(candidates)])
+        names.append(contest)
+        ballot_counts.append(ballots)
+    return names, contests, ballot_counts
+
+
+def format_value(value):
+    return '' if value is None else '{:.2f}'.format(value)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@ from abc import ABC, abstractmethod
 
 
 class Audit(ABC):
+    #whether remove_ballot, and so amend_ballot, can undo a single ballot;
+    #callers replay the whole sample with recompute for audits that cannot
+    supports_remove = False
+
     @abstractmethod
     def init(self, results, ballot_count):
         pass
@@ -40,6 +44,22 @@ class Audit(ABC):
     def compute(self, ballot):
         pass
 
+    #updates the statistics with one newly audited ballot
+    def add_ballot(self, ballot):
+        self.compute(ballot)
+
+    #reverses the contribution of a ballot previously passed to compute;
+    #only available if supports_remove is set
+    def remove_ballot(self, ballot):
+        raise NotImplementedError
+
+    #changes the values of an audited ballot without replaying the others
+    def amend_ballot(self, ballot, reported_value, actual_value):
+        self.remove_ballot(ballot)
+        ballot.set_reported_value(reported_value)
+        ballot.set_actual_value(actual_value)
+        self.add_ballot(ballot)
+
     @abstractmethod
     def get_current_result(self):
         pass
@@ -1,10 +1,8 @@
+from math import log
 import audit
 import election
 import numpy as np
-import os
-
-os.sys.path.append("2018-bctool/code/")
-import bctool
+from audit import bayes_engine, event_log
 
 
 class BallotPolling(audit.Audit):
@@ -12,71 +10,100 @@ class BallotPolling(audit.Audit):
     status_codes = ["In Progress", 
                     "Election Results Verified",
                     "Full Hand Count Required"]
+    supports_remove = True
 
     def __init__(self):
         self._T = 1
         self._s = -1
         self._m = 0
         self._s_wl = {}
-        self._t_loser = {}
+        self._log_t = np.zeros(0)
         self._winner = -1
         self._tolerance = .01
         self._status = 0
-        self._cached_results = list()
+        self._registry = None
+        self._tally = np.zeros(0, dtype=np.int64)
         self._ballot_count = None
+        # Upset probabilities on either side of the risk limit stop simulating early;
+        # set _upset_ci_width to None to always run every trial
+        self._risk_limit = 0.1
+        self._upset_ci_width = 0.01
         self.upset_prob = None
+        self.upset_prob_ci = None
+        self.upset_prob_trials = 0
+        self._upset_prob_key = None
+        # Posterior draws reused from one upset probability to the next
+        self._posterior = bayes_engine.PosteriorCache()
+        # Passed on to bayes_engine.compute_upset_prob as its progress callback
+        self.simulation_callback = None
 
     def init(self, results, ballot_count):
         self._T = 1
         self._s = -1
         self._m = 0
         self._s_wl = {}
-        self._t_loser = {}
         self._winner = None
         self.upset_prob = None
+        self.upset_prob_ci = None
+        self.upset_prob_trials = 0
+        self._upset_prob_key = None
         self._status = 0
 
         results_sorted = sorted(results, 
                                 key=lambda r: r.get_percentage(),
                                 reverse=True)
 
-        self._candidates = []
-        for r in results_sorted:
-            self._candidates.append(r.get_contestant().get_name())
-        self._candidates.extend(["overvote", "undervote", "Write-in"])
+        # Codes by reported rank: the winner is 0 and loser_names[i] is i + 1
+        self._registry = election.CandidateRegistry([r.get_contestant() for r in results_sorted])
+        self._candidates = self._registry.get_names()
 
         self._s = results_sorted[0].get_percentage()
         self._winner = results_sorted[0].get_contestant()
         #self._margin = self._s - self._tolerance
 
         self.loser_names = [r.get_contestant().get_name() for r in results_sorted if r != results_sorted[0]]
-        #dictionary of T values for losing canddidates
-        #   usage: self._t_winner_loser[losing_candidate]
-        self._t_loser = {lose_c : 1 for lose_c in self.loser_names}
+        #log T values for losing candidates, in loser_names order
+        self._log_t = np.zeros(len(self.loser_names))
 
         #dictionary of (losing) candidate to votes for winner / (total votes for either)
         #    s_wl from BRAVO paper
         #    usage self._s_wl[losing_candidate]
         self._s_wl =  {r.get_contestant()._name : self._s / (r.get_percentage() + self._s) for r in results_sorted if r.get_contestant() != self._winner}
 
+        # log T factors of a winner and of a loser vote for each pair, over loser_names
+        self._log_t_winner = np.log([2 * self._s_wl[lose_c] for lose_c in self.loser_names])
+        self._log_t_loser = np.log([2 * (1 - self._s_wl[lose_c]) for lose_c in self.loser_names])
+        self._loser_codes = np.arange(1, len(self.loser_names) + 1)
+
         self._ballot_count = ballot_count
+        self._results = results
+
+        # Ballots counted for each code
+        self._tally = np.zeros(len(self._registry), dtype=np.int64)
 
-        for result in results:
-            self._cached_results.append([result.get_contestant(), 0])
-        # assert(False)
-        self.bayesian_formatted_results = {k: 0 for k in self._candidates}
+        event_log.log_event("init", audit=self.name, winner=self._winner.get_name(),
+                            ballot_count=ballot_count, t=self.get_t_values(), s_wl=self._s_wl)
 
-        print("Winner: {}".format(self._winner.get_name()))
-        print("Init T values : {}".format(self._t_loser))
-        print("Initial s_wl values: {}".format(self._s_wl))
+    def get_t_values(self):
+        # BRAVO T of the reported winner against each loser
+        return dict(zip(self.loser_names, np.exp(self._log_t).tolist()))
+
+    def get_tallies(self):
+        # Ballots counted for each choice, by name
+        return dict(zip(self._candidates, self._tally.tolist()))
 
     def get_progress(self, final=False):
         progress_str = ""
         if final:
-            for loser in self._t_loser:
-                progress_str += "Risk of reported winner vs. {} = {}<br />".format(loser, 1./self._t_loser[loser])
-            progress_str += "Upset probability = {} <br />".format(self.upset_prob)
-        progress_str += "Current results: <br /> {}".format(self.bayesian_formatted_results)
+            for loser, t in self.get_t_values().items():
+                progress_str += "Risk of reported winner vs. {} = {}<br />".format(loser, 1./t)
+            self.compute_upset_prob()
+            if self.upset_prob_trials:
+                progress_str += "Upset probability = {} (95% CI {:.4f} - {:.4f} from {} trials) <br />".format(
+                    self.upset_prob, self.upset_prob_ci[0], self.upset_prob_ci[1], self.upset_prob_trials)
+            else:
+                progress_str += "Upset probability = {} (exact) <br />".format(self.upset_prob)
+        progress_str += "Current results: <br /> {}".format(self.get_tallies())
         return progress_str
 
     def get_status(self):
@@ -86,6 +113,13 @@ class BallotPolling(audit.Audit):
     def get_name():
         return BallotPolling.name
 
+    def get_risk_limit(self):
+        return self._risk_limit
+
+    def set_risk_limit(self, risk_limit):
+        self._risk_limit = risk_limit
+        self._refresh_status()
+
     def get_parameters(self):
         param = [["Tolerance", "{0:.2f}%".format(self._tolerance * 100)]]
         return param
@@ -101,32 +135,78 @@ class BallotPolling(audit.Audit):
         return ballot.get_actual_value().get_id() == election.Undervote.CID or ballot.get_actual_value().get_id() == election.Overvote.CID
 
     def compute(self, ballot):
-        ballot_vote = ballot.get_actual_value()
-        ballot_name = ballot_vote.get_name()
-        winner_name = self._winner.get_name()
-
-        self.bayesian_formatted_results[ballot_vote.get_name()] += 1
-        # Vote for reported winner
-        if ballot_name == winner_name:
-            for lose_c in self.loser_names :
-                # multiply Twl by sw`/0.5.
-                self._t_loser[lose_c] = 2 * self._t_loser[lose_c] * self._s_wl[lose_c]
-        # Vote for reported loser
-        elif not self.is_ballot_invalid(ballot):
-            self._t_loser[ballot_name]  = 2 *  self._t_loser[ballot_name] * (1-self._s_wl[ballot_name])
+        self._update(ballot, 1)
 
-        else:
-            print("T is not updated since ballot was invalid")
+    def remove_ballot(self, ballot):
+        self._update(ballot, -1)
 
-        for i in range(len(self._cached_results)):
-            if self._cached_results[i][0].equals(ballot_vote):
-                self._cached_results[i][1] += 1
-                break
+    # Applies (direction=1) or reverts (direction=-1) the contribution of a ballot
+    def _update(self, ballot, direction):
+        code = self._registry.get_code(ballot.get_actual_value())
 
-        print("Vote for: %s winner: %s update T: %s " % (ballot_name, winner_name, str(self._t_loser)))
-        # print(str(self._T) + " " + ballot.get_reported_value().get_name() + " " + ballot.get_actual_value().get_name())
+        self._tally[code] += direction
+        # Vote for reported winner: multiply Twl by sw/0.5 for every loser
+        if code == 0:
+            self._log_t += direction * self._log_t_winner
+        # Vote for reported loser
+        # Invalid ballots and write-ins leave T unchanged
+        elif code <= len(self.loser_names):
+            self._log_t[code - 1] += direction * self._log_t_loser[code - 1]
+
+        self._refresh_status()
+        event_log.log_event("ballot", audit=self.name, ballot=ballot.get_physical_ballot_num(),
+                            actual=ballot.get_actual_value().get_name(), direction=direction,
+                            t=np.exp(self._log_t), status=self.get_status())
+
+    # log T factor of each ballot for each pair, as a (ballots x losers) array
+    def _log_steps(self, actual_codes):
+        codes = np.asarray(actual_codes)
+        return (codes == 0)[:, np.newaxis] * self._log_t_winner + \
+               (codes[:, np.newaxis] == self._loser_codes) * self._log_t_loser
+
+    def get_actual_codes(self, ballots):
+        """
+        Returns the contest's code for the actual vote of each ballot, for
+        the batch methods below. Votes that are not choices in the contest
+        get election.CandidateRegistry.INVALID.
+        """
+        if isinstance(ballots, election.BallotStore):
+            return self._registry.codes_from_ids(ballots.get_actual_ids(), ballots)
+        return np.fromiter((self._registry.find_code(b.get_actual_value()) for b in ballots),
+                           dtype=np.int64)
+
+    def trajectory(self, actual_codes):
+        """
+        Returns log T of every winner/loser pair after each ballot, given the
+        actual vote codes of a sequence of ballots, as a (ballots x losers)
+        array with columns in loser_names order. Starts from the current T.
+        """
+        return self._log_t + np.cumsum(self._log_steps(actual_codes), axis=0)
+
+    def first_crossings(self, actual_codes):
+        # Index of the first ballot at which each pair's T reaches 1 / risk limit, or -1
+        crossed = self.trajectory(actual_codes) >= -log(self._risk_limit)
+        return np.where(crossed.any(axis=0), crossed.argmax(axis=0), -1)
+
+    def stopping_index(self, actual_codes):
+        # Index of the first ballot at which get_status() would report the results verified, or -1
+        log_t = self.trajectory(actual_codes)
+        if log_t.shape[1] == 0:
+            return -1
+        verified = log_t.min(axis=1) >= -log(self._risk_limit)
+        return int(verified.argmax()) if verified.any() else -1
+
+    def compute_batch(self, actual_codes, direction=1):
+        # Applies (direction=1) or reverts (direction=-1) a sequence of ballots given by actual vote code
+        codes = np.asarray(actual_codes)
+        if (codes == election.CandidateRegistry.INVALID).any():
+            raise KeyError("Ballot for a choice that is not in this contest")
+        self._log_t += direction * self._log_steps(codes).sum(axis=0)
+        self._tally += direction * np.bincount(codes, minlength=len(self._registry))
 
         self._refresh_status()
+        event_log.log_event("batch", audit=self.name, ballots=len(codes), direction=direction,
+                            t=np.exp(self._log_t), status=self.get_status())
 
     def compute_upset_prob(self, seed=1, num_trials=10000, n_winners=1):
         strata = [("Total", "-Missing")]
@@ -136,57 +216,58 @@ class BallotPolling(audit.Audit):
         for (collection, reported_choice) in strata:
             stratum_sample_tally = []
             stratum_pseudocounts = []
-            for actual_choice in self._candidates:
-                stratum_sample_tally.append(self.bayesian_formatted_results[actual_choice])
+            for code, actual_choice in enumerate(self._candidates):
+                stratum_sample_tally.append(int(self._tally[code]))
                 if reported_choice == actual_choice:
                     stratum_pseudocounts.append(50)
                 else:
                     stratum_pseudocounts.append(1)
         strata_sample_tallies.append(np.array(stratum_sample_tally))
         strata_pseudocounts.append(np.array(stratum_pseudocounts))
-        win_probs = bctool.compute_win_probs(strata_sample_tallies,
-                                       strata_pseudocounts,
-                                       total_num_votes,
-                                       seed,
-                                       num_trials,
-                                       self._candidates,
-                                       n_winners)
 
-        self.upset_prob = 1.0 - win_probs[0][1]
+        # The simulation only depends on the tallies, so reuse it until they change
+        key = (tuple(stratum_sample_tally), seed, num_trials, n_winners,
+               self._risk_limit, self._upset_ci_width)
+        if key == self._upset_prob_key:
+            return self.upset_prob
+
+        self.upset_prob, self.upset_prob_ci, self.upset_prob_trials = \
+            self._posterior.compute_upset_prob(strata_sample_tallies,
+                                              strata_pseudocounts,
+                                              total_num_votes,
+                                              seed,
+                                              num_trials,
+                                              n_winners,
+                                              threshold=self._risk_limit,
+                                              ci_width=self._upset_ci_width,
+                                              callback=self.simulation_callback,
+                                              choices=self._registry.get_num_candidates())
+        self._upset_prob_key = key
+        return self.upset_prob
 
     def _refresh_status(self):
-        if self._T > 9.9:
+        # BRAVO verifies the results once every winner/loser T reaches 1 / risk limit
+        if len(self._log_t) and self._log_t.min() >= -log(self._risk_limit):
             self._status = 1
-        elif self._T < 0.011:
-            self._status = 2
         else:
             self._status = 0
 
     def recompute(self, ballots, results):
         self.init(results, self._ballot_count)
-
-        for ballot in ballots:
-            self.compute(ballot)
-
-            self.compute_upset_prob()
-            #TODO: if T reject null hypothesis do not update TL
-
+        self.compute_batch(self.get_actual_codes(ballots))
+        #TODO: if T reject null hypothesis do not update TL
 
     def update_reported_ballots(self, ballots, results):
-        self.init(results, self._ballot_count)
-        for ballot in ballots:
-            self.compute(ballot)
+        self.recompute(ballots, results)
 
     def get_current_result(self):
-        count = 0
-
-        for result in self._cached_results:
-            count += result[1]
+        counts = [int(self._tally[self._registry.get_code(result.get_contestant())])
+                  for result in self._results]
+        count = sum(counts)
 
         audit_results = []
 
-        for person in self._cached_results:
-            result = election.Result(person[0], person[1] / count)
-            audit_results.append(result)
+        for result, votes in zip(self._results, counts):
+            audit_results.append(election.Result(result.get_contestant(), votes / count))
 
         return audit_results
@@ -1,29 +1,89 @@
 import audit
 import election
+import numpy as np
+from audit import bayes_engine
 
 
 class Bayesian(audit.Audit):
     name = "Bayesian Audit"
-    status_codes = ["In Progress", 
+    status_codes = ["In Progress",
                     "Election Results Verified",
                     "Full Hand Count Required"]
+    supports_remove = True
 
     def __init__(self):
-        self.risk_limit_m = -1
-        self.risk_upset_m = -1
+        self.risk_limit_m = 0.05
+        self.risk_upset_m = 0.95
+        # Prior counts of each (reported, audited) pair per stratum. They are kept
+        # small so a few audited ballots outweigh them: with 50 for matching
+        # pairs, a contest whose reported winner lost verified on its first ballot
         self.pseudocount_base = 0.5
-        self.pseudocount_match = 50.0
+        self.pseudocount_match = 1.0
         self.n_trials = 100000
+        # Stop simulating once the upset probability is pinned down to this width
+        # or is clearly on one side of the risk limit; None runs every trial
+        self._upset_ci_width = 0.01
+        # Called with (trials run, trial limit) while simulating, e.g. to report progress
+        self.simulation_callback = None
 
         self.status = 0
+        self.upset_prob = None
+        self.upset_prob_ci = None
+        self.upset_prob_trials = 0
+        self._upset_prob_key = None
+        # Posterior draws reused from one upset probability to the next
+        self._posterior = bayes_engine.PosteriorCache()
+        self._candidates = []
+        self._registry = None
+        self._results = []
+        self._stratum_sizes = None
+        self._tallies = None
+        self._pseudocounts = None
+        self._ballot_count = None
 
-    def init(self, results):
-        pass
+    def init(self, results, ballot_count):
+        self.status = 0
+        self.upset_prob = None
+        self.upset_prob_ci = None
+        self.upset_prob_trials = 0
+        self._upset_prob_key = None
+        self._ballot_count = ballot_count
+        results_sorted = sorted(results,
+                                key=lambda r: r.get_percentage(),
+                                reverse=True)
+
+        self._registry = election.CandidateRegistry([r.get_contestant() for r in results_sorted])
+        self._candidates = self._registry.get_names()
+        self._results = results
+
+        # Ballots are stratified by reported choice; fall back to the reported
+        # percentage when the results carry no vote counts
+        self._stratum_sizes = np.zeros(len(self._candidates), dtype=np.int64)
+        for r in results_sorted:
+            votes = r.get_votes() or int(round(r.get_percentage() * ballot_count))
+            self._stratum_sizes[self._registry.get_code(r.get_contestant())] = votes
 
-    def get_progress(self):
-        pass 
+        # self._tallies[i][j] is the number of ballots reported for i and audited as j
+        self._tallies = np.zeros((len(self._candidates), len(self._candidates)), dtype=np.int64)
+        self._pseudocounts = np.full(self._tallies.shape, self.pseudocount_base)
+        np.fill_diagonal(self._pseudocounts, self.pseudocount_match)
+
+    def get_progress(self, final=False):
+        self.compute_upset_prob()
+        progress_str = "Upset probability = {} (95% CI {:.4f} - {:.4f} from {} trials) <br />".format(
+            self.upset_prob, self.upset_prob_ci[0], self.upset_prob_ci[1], self.upset_prob_trials)
+        if final:
+            progress_str += "<table> <tr> <th> {} </th><th> {} </th><th> {} </th></tr>".format("Original CVR", "Audit CVR", "Count")
+            for i, reported_candidate in enumerate(self._candidates):
+                for j, actual_candidate in enumerate(self._candidates):
+                    if self._tallies[i][j] != 0:
+                        progress_str += "<tr> <td> {} </td><td> {} </td><td> {} </td></tr>".format(reported_candidate, actual_candidate,
+                                                                                                   self._tallies[i][j])
+            progress_str += "</table>"
+        return progress_str
 
     def get_status(self):
+        self._refresh_status()
         return Bayesian.status_codes[self.status]
 
     @staticmethod
@@ -31,19 +91,87 @@ class Bayesian(audit.Audit):
         return Bayesian.name
 
     def get_parameters(self):
-        param = [["Risk Limit", str(self.risk_limit_m)],
-                 ["Risk Upset", str(self.risk_upset_m)]]
-                
+        param = [["Risk Limit", str(self.risk_limit_m * 100)],
+                 ["Risk Upset", str(self.risk_upset_m * 100)]]
+
         return param
 
     def set_parameters(self, param):
-        pass
+        self.risk_limit_m = float(param[0]) / 100
+        self.risk_upset_m = float(param[1]) / 100
+
+    def compute(self, ballot):
+        self._update(ballot, 1)
+
+    def remove_ballot(self, ballot):
+        self._update(ballot, -1)
+
+    # Applies (direction=1) or reverts (direction=-1) the contribution of a ballot
+    def _update(self, ballot, direction):
+        reported = self._registry.get_code(ballot.get_reported_value())
+        actual = self._registry.get_code(ballot.get_actual_value())
+        self._tallies[reported, actual] += direction
+
+    def compute_upset_prob(self, seed=1, num_trials=None, n_winners=1):
+        if num_trials is None:
+            num_trials = self.n_trials
+
+        # Strata with no reported votes only matter once a ballot lands in them
+        sampled = self._tallies.sum(axis=1)
+        strata = np.nonzero((self._stratum_sizes > 0) | (sampled > 0))[0]
+
+        key = (self._tallies.tobytes(), seed, num_trials, n_winners,
+               self.risk_limit_m, self._upset_ci_width)
+        if key == self._upset_prob_key:
+            return self.upset_prob
+
+        self.upset_prob, self.upset_prob_ci, self.upset_prob_trials = \
+            self._posterior.compute_upset_prob(self._tallies[strata],
+                                              self._pseudocounts[strata],
+                                              np.maximum(self._stratum_sizes[strata], sampled[strata]),
+                                              seed,
+                                              num_trials,
+                                              n_winners,
+                                              threshold=self.risk_limit_m,
+                                              ci_width=self._upset_ci_width,
+                                              callback=self.simulation_callback)
+        self._upset_prob_key = key
+        return self.upset_prob
+
+    def _refresh_status(self):
+        if self._tallies is None or self._tallies.sum() == 0:
+            self.status = 0
+            return
+
+        upset_prob = self.compute_upset_prob()
+        if upset_prob <= self.risk_limit_m:
+            self.status = 1
+        elif upset_prob >= self.risk_upset_m:
+            self.status = 2
+        else:
+            self.status = 0
 
     def recompute(self, ballots, results):
-        pass
+        self.init(results, self._ballot_count)
 
-    def compute(self, ballot):
-        pass
+        for ballot in ballots:
+            self.compute(ballot)
+
+    def update_reported_ballots(self, ballots, results):
+        self.init(results, self._ballot_count)
+        for ballot in ballots:
+            self.compute(ballot)
 
     def get_current_result(self):
-        pass
+        # Audited ballots for each choice are the column sums of the tallies
+        actual_counts = self._tallies.sum(axis=0)
+        counts = [int(actual_counts[self._registry.get_code(result.get_contestant())])
+                  for result in self._results]
+        count = sum(counts)
+
+        audit_results = []
+
+        for result, votes in zip(self._results, counts):
+            audit_results.append(election.Result(result.get_contestant(), votes / count))
+
+        return audit_results
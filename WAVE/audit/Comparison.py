@@ -1,11 +1,8 @@
-from math import log, ceil
+from math import log, ceil, exp
 import audit
 import election
 import numpy as np
-import os
-
-os.sys.path.append("2018-bctool/code/")
-import bctool
+from audit import bayes_engine, event_log
 
 
 """
@@ -16,6 +13,7 @@ class Comparison(audit.Audit):
     name = "Comparison RLA"
     status_codes = ["In Progress",
                     "Election Results \nVerified"]
+    supports_remove = True
 
     def __init__(self):
         # Arbritary Starting Numbers - taken from Stark's paper
@@ -35,9 +33,18 @@ class Comparison(audit.Audit):
         self._status = 0
 
         self._winner = None
+        self._registry = None
         self._candidates = None
+        self._upset_ci_width = 0.01
         self.upset_prob = None
-        self._cached_results = list()
+        self.upset_prob_ci = None
+        self.upset_prob_trials = 0
+        self._upset_prob_key = None
+        # Posterior draws reused from one upset probability to the next
+        self._posterior = bayes_engine.PosteriorCache()
+        self.simulation_callback = None
+        self._results = []
+        self._tallies = None
         self._ballot_count = list()
         self._reported_choices = dict()
         self._last_ballot = None
@@ -46,7 +53,7 @@ class Comparison(audit.Audit):
 
     def init(self, results, ballot_count, reported_choices):
         self._status = 0
-        self._cached_results = list()
+        self._results = results
         self._ballot_count = ballot_count
         self._reported_choices = reported_choices
         self._sample_size = 0
@@ -55,60 +62,82 @@ class Comparison(audit.Audit):
         self._u1 = 0
         self._u2 = 0
         self._last_ballot = None
+        self.upset_prob = None
+        self.upset_prob_ci = None
+        self.upset_prob_trials = 0
+        self._upset_prob_key = None
         results_sorted = sorted(results,
                                 key=lambda r: r.get_percentage(),
                                 reverse=True)
 
-        self._candidates = []
-        for r in results_sorted:
-            self._candidates.append(r.get_contestant().get_name())
-        self._candidates.extend(["overvote", "undervote", "Write-in"])
-
-        self.bayesian_formatted_results = {k: {} for k in self._candidates}
-        for candidate in self.bayesian_formatted_results:
-            # This is a dict of dicts, where self.bayesian_formatted_results[i][j] is the number
-            # of votes that were reported for i and were actually for j
-            self.bayesian_formatted_results[candidate] = {j: 0 for j in self._candidates}
+        # Codes by reported rank, so the reported winner is 0
+        self._registry = election.CandidateRegistry([r.get_contestant() for r in results_sorted])
+        self._candidates = self._registry.get_names()
+        # Valid choices, i.e. the candidates and write-ins
+        self._total_num_candidates = self._registry.get_num_candidates() + 1
+
+        # self._tallies[i][j] is the number of ballots reported for code i and audited as code j
+        self._tallies = np.zeros((len(self._registry), len(self._registry)), dtype=np.int64)
+        self._pseudocounts = np.ones(self._tallies.shape)
+        np.fill_diagonal(self._pseudocounts, 5)
+
+        # Upset simulation strata, one per reported choice, as rows of the matrices above.
+        # Strata are ordered by code, so the usual case of every candidate is a slice and
+        # the engine gets views instead of copies
+        codes = sorted(self._candidates.index(name) for name in reported_choices)
+        self._strata_sizes = np.array([reported_choices[self._candidates[c]] for c in codes], dtype=np.int64)
+        if codes == list(range(len(codes))):
+            self._strata = slice(0, len(codes))
+        else:
+            self._strata = np.array(codes, dtype=np.int64)
 
         self._winner = results_sorted[0].get_contestant()
 
         margin = results_sorted[0].get_votes() - results_sorted[1].get_votes()
         self._diluted_margin = margin / self._ballot_count
-        self._stopping_count = ceil(-2 * self._inflator * log(self._risk_limit) / ( \
+
+        # Log factors of Stark's formula for each kind of discrepancy, so a ballot
+        # only costs a few additions instead of re-evaluating the logs
+        self._log_o1 = log(1 - 1 / (2 * self._inflator))
+        self._log_o2 = log(1 - 1 / self._inflator)
+        self._log_u1 = log(1 + 1 / (2 * self._inflator))
+        self._log_u2 = log(1 + 1 / self._inflator)
+        # Log of the P-value factor (1 - 1/U) contributed by every audited ballot
+        self._log_match = log(1 - self._diluted_margin / (2 * self._inflator))
+
+        # Sample size needed if discrepancies occur at the expected rates
+        self._initial_stopping_count = ceil(-2 * self._inflator * log(self._risk_limit) / ( \
                 self._diluted_margin + 2 * self._inflator * ( \
-                    self._o1_expected * log(1 - (1 / (2 * self._inflator))) + \
-                    self._o2_expected * log(1 - (1 / self._inflator)) + \
-                    self._u1_expected * log(1 + (1 / (2 * self._inflator))) + \
-                    self._u2_expected * log(1 + (1 / self._inflator))
+                    self._o1_expected * self._log_o1 + \
+                    self._o2_expected * self._log_o2 + \
+                    self._u1_expected * self._log_u1 + \
+                    self._u2_expected * self._log_u2
                     )
                 ))
+        self._log_risk_limit = log(self._risk_limit)
+        self._stopping_count = self._initial_stopping_count
         self._risk = 1.0
 
-        print("Results:")
-        
-        for r in results_sorted:
-            print("Contestant: {}".format(r.get_contestant().get_name()))
-            print("Votes: {}".format(r.get_votes()))
-
-        print("Initial Stopping Count: {}".format(self._stopping_count))
-        print("Margin: {}".format(margin))
-        print("Total Votes: {}".format(self._ballot_count))
-        print("Diluted Margin: {}".format(self._diluted_margin))
-        print("Risk Limit: {}".format(self._risk_limit))
-
-        for result in results:
-            self._cached_results.append([result.get_contestant(), 0])
+        event_log.log_event("init", audit=self.name,
+                            votes={r.get_contestant().get_name(): r.get_votes() for r in results_sorted},
+                            initial_stopping_count=self._stopping_count,
+                            margin=margin,
+                            ballot_count=self._ballot_count,
+                            diluted_margin=self._diluted_margin,
+                            risk_limit=self._risk_limit)
 
     def get_progress(self, final=False):
         progress_str = ""
         if self._last_ballot and self._last_ballot.get_actual_value().get_name() != self._last_ballot.get_reported_value().get_name():
             progress_str = "<i>Discrepancy in ballot, Original CVR: {} Audit CVR: {}</i> <br>".format(self._last_ballot.get_reported_value().get_name(),self._last_ballot.get_actual_value().get_name())
         if final:
-            progress_str += "Measured Risk = {};<br> Upset probability={} <br>".format(int(1000*self._risk) / 1000, self.upset_prob)
+            self.compute_upset_prob()
+            progress_str += "Measured Risk = {};<br> Upset probability={} (95% CI {:.4f} - {:.4f} from {} trials) <br>".format(
+                int(1000*self._risk) / 1000, self.upset_prob, self.upset_prob_ci[0], self.upset_prob_ci[1], self.upset_prob_trials)
             progress_str += "<table> <tr> <th> {} </th><th> {} </th><th> {} </th><th> {} </th></tr>".format("Original CVR","Audit CVR", "Count", "Match")
-            for actual_candidate in self._candidates:
-                for reported_candidate in self._candidates:
-                    count = self.bayesian_formatted_results[reported_candidate][actual_candidate]
+            for j, actual_candidate in enumerate(self._candidates):
+                for i, reported_candidate in enumerate(self._candidates):
+                    count = self._tallies[i, j]
                     match = actual_candidate==reported_candidate
                     if count != 0:
                         progress_str += "<tr> <td> {} </td><td> {} </td><td> {} </td><td> {} </td></tr>".format(reported_candidate,actual_candidate,
@@ -142,116 +171,119 @@ class Comparison(audit.Audit):
         self._u2_expected = float(param[5])
 
     def compute_upset_prob(self, seed=1, num_trials=10000, n_winners=1):
-        strata = []
-        strata_sizes = []
-        # print(self._reported_choices)
-        for reported in self._reported_choices:
-            strata.append(("Total", reported))
-            strata_sizes.append(self._reported_choices[reported])
-
-
-        strata_sample_tallies = []
-        strata_pseudocounts = []
-        for (collection, reported_choice) in strata:
-            stratum_sample_tally = []
-            stratum_pseudocounts = []
-            for actual_choice in self._candidates:
-                stratum_sample_tally.append(self.bayesian_formatted_results[reported_choice][actual_choice])
-                if reported_choice == actual_choice:
-                    stratum_pseudocounts.append(5)
-                else:
-                    stratum_pseudocounts.append(1)
-            strata_sample_tallies.append(np.array(stratum_sample_tally))
-            strata_pseudocounts.append(np.array(stratum_pseudocounts))
-        win_probs = bctool.compute_win_probs(strata_sample_tallies,
-                                       strata_pseudocounts,
-                                       strata_sizes,
-                                       seed,
-                                       num_trials,
-                                       self._candidates,
-                                       n_winners)
-        self.upset_prob = 1.0 - win_probs[0][1]
-        print(win_probs)
+        strata_sample_tallies = self._tallies[self._strata]
+
+        # The simulation only depends on the tallies, so reuse it until they change
+        key = (strata_sample_tallies.tobytes(), self._strata_sizes.tobytes(),
+               seed, num_trials, n_winners, self._risk_limit, self._upset_ci_width)
+        if key == self._upset_prob_key:
+            return self.upset_prob
+
+        self.upset_prob, self.upset_prob_ci, self.upset_prob_trials = \
+            self._posterior.compute_upset_prob(strata_sample_tallies,
+                                              self._pseudocounts[self._strata],
+                                              self._strata_sizes,
+                                              seed,
+                                              num_trials,
+                                              n_winners,
+                                              threshold=self._risk_limit,
+                                              ci_width=self._upset_ci_width,
+                                              callback=self.simulation_callback)
+        self._upset_prob_key = key
+        event_log.log_event("upset_prob", event_log.DEBUG, audit=self.name, upset_prob=self.upset_prob,
+                            ci=self.upset_prob_ci, trials=self.upset_prob_trials)
+        return self.upset_prob
 
     def is_ballot_invalid(self, ballot):
         return ballot.get_actual_value().get_id() == election.Undervote.CID or ballot.get_actual_value().get_id() == election.Overvote.CID
 
 
     def compute(self, ballot):
-        # Flag if the stopping count needs to be recomputed mathematically
-        recompute = True
         self._last_ballot = ballot
-        actual_name = ballot.get_actual_value().get_name()
-        reported_name = ballot.get_reported_value().get_name()
-        self.bayesian_formatted_results[reported_name][actual_name] += 1
-        self._sample_size += 1
+        self._update(ballot, 1)
+
+    def remove_ballot(self, ballot):
+        self._update(ballot, -1)
+
+    # Applies (direction=1) or reverts (direction=-1) the contribution of a ballot
+    def _update(self, ballot, direction):
+        reported = self._registry.get_code(ballot.get_reported_value())
+        actual = self._registry.get_code(ballot.get_actual_value())
+        self._tallies[reported, actual] += direction
+        self._sample_size += direction
+
+        discrepancy = self._discrepancy(reported, actual)
+        if discrepancy == 1:
+            self._o1 += direction
+        elif discrepancy == 2:
+            self._o2 += direction
+        elif discrepancy == -1:
+            self._u1 += direction
+        elif discrepancy == -2:
+            self._u2 += direction
+
+        self._refresh_stopping_count()
+        self._risk = self.compute_risk()
 
-        total_num_candidates = len(set(self._candidates) - set(["overvote", "undervote"]))
+        # Update status
+        self._refresh_status()
+        event_log.log_event("ballot", audit=self.name, ballot=ballot.get_physical_ballot_num(),
+                            reported=self._candidates[reported], actual=self._candidates[actual],
+                            direction=direction,
+                            discrepancy=discrepancy, o1=self._o1, o2=self._o2, u1=self._u1, u2=self._u2,
+                            stopping_count=self._stopping_count, risk=self._risk,
+                            status=self.get_status())
+
+    # Number of votes by which a ballot with the given reported and actual codes
+    # overstates the reported winner's margin; negative values are understatements
+    def _discrepancy(self, reported, actual):
         # No discrepency in the ballot
-        if ballot.get_actual_value() == ballot.get_reported_value():
-            self._stopping_count -= 1
-            recompute = False
+        if actual == reported:
+            return 0
         # If the ballot is reported as an undervote or an overvote
-        elif ballot.get_reported_value().get_id() == election.Undervote.CID or ballot.get_reported_value().get_id() == election.Overvote.CID:
+        elif self._registry.is_invalid(reported):
             # if actual is for winner, is 1-vote U
-            if ballot.get_actual_value().equals(self._winner):
-                self._u1 += 1
+            if actual == 0:
+                return -1
             # if actual is for a valid loser, is 1-vote O
-            elif not self.is_ballot_invalid(ballot):
-                self._o1 += 1
+            elif not self._registry.is_invalid(actual):
+                return 1
         # If reported is for winner:
-        elif ballot.get_reported_value().equals(self._winner):
+        elif reported == 0:
             # if actual is invalid, 1-vote O
-            if self.is_ballot_invalid(ballot):
-                self._o1 += 1
+            if self._registry.is_invalid(actual):
+                return 1
             # if actual is for loser is 2-vote O
             else:
-                self._o2 += 1
-
+                return 2
         # If the ballot is a reported vote for a loser
-        elif not ballot.get_reported_value().equals(self._winner):
-            if not self.is_ballot_invalid(ballot):
-                # if actual is for winner, is 1-vote U
-                if ballot.get_actual_value().equals(self._winner):
-                    # In a 2-candidate election, this is a 2-vote understatement
-                    if total_num_candidates == 2:
-                        self._u2 += 1
-                    # if multiple candidates, this is a 1-vote understatement
-                    else:
-                        self._u1 += 1
-                # if reported is for different loser, is 1-vote O
+        elif not self._registry.is_invalid(actual):
+            # if actual is for winner, is 1-vote U
+            if actual == 0:
+                # In a 2-candidate election, this is a 2-vote understatement
+                if self._total_num_candidates == 2:
+                    return -2
+                # if multiple candidates, this is a 1-vote understatement
                 else:
-                    self._o1 += 1
-        # Error handling
-        elif recompute:
-            print("Error processing ballot {}".format(ballot.get_physical_ballot_num()))
-            print("Actual: {}".format(ballot.get_actual_value().get_name()))
-            print("Reported: {}".format(ballot.get_reported_value().get_name()))
-        print("u1={},o1={},u2={},o2={}".format(self._u1,self._o1,self._u2,self._o2))
-        # Recacluate count using Stark's formula
-        if recompute:
-            self._stopping_count = ceil(-2 * self._inflator * ( \
-                    log(self._risk_limit) + \
-                    self._o1 * log(1 - 1 / (2 * self._inflator)) + \
-                    self._o2 * log(1 - 1 / self._inflator) + \
-                    self._u1 * log(1 + 1 / (2 * self._inflator)) + \
-                    self._u2 * log(1 + 1 / self._inflator)) \
-                    / self._diluted_margin)
-
-        # Update cached results
-        for i in range(len(self._cached_results)):
-            if self._cached_results[i][0].equals(ballot.get_actual_value()):
-                self._cached_results[i][1] += 1
-                break
-
-        # Update status
-        self._refresh_status()
-        
-        # print("\n")
-        # print("Ballot {}".format(ballot.get_audit_seq_num()))
-        # print("Actual: {}".format(ballot.get_actual_value().get_name()))
-        # print("Reported: {}".format(ballot.get_reported_value().get_name()))
-        # print("Stopping Count: {}".format(self._stopping_count))
+                    return -1
+            # if reported is for different loser, is 1-vote O
+            else:
+                return 1
+        return 0
+
+    # Sum of the log factors of every discrepancy seen so far
+    def _log_discrepancies(self):
+        return self._o1 * self._log_o1 + self._o2 * self._log_o2 + \
+               self._u1 * self._log_u1 + self._u2 * self._log_u2
+
+    def _refresh_stopping_count(self):
+        # Until a discrepancy shows up, plan on the expected discrepancy rates;
+        # afterwards use Stark's formula with the observed counts
+        if self._o1 == 0 and self._o2 == 0 and self._u1 == 0 and self._u2 == 0:
+            total = self._initial_stopping_count
+        else:
+            total = ceil(-2 * self._inflator * (self._log_risk_limit + self._log_discrepancies()) / self._diluted_margin)
+        self._stopping_count = max(0, total - self._sample_size)
 
     def _refresh_status(self):
         if self._stopping_count == 0:
@@ -259,13 +291,9 @@ class Comparison(audit.Audit):
         else:
             self._status = 0
 
+    # Kaplan-Markov P-value, accumulated in log space so large samples do not underflow
     def compute_risk(self):
-        p_val = 1.0
-        u = 2*self._inflator / self._diluted_margin
-        p_val *= (1 - 1. / u)**(self._sample_size)
-        p_val *= (1 - 1. / (2*self._inflator))**(-1*self._o1)
-        p_val *= (1 - 1. / (self._inflator)) ** (-1 * self._o2)
-        return p_val
+        return exp(self._sample_size * self._log_match - self._log_discrepancies())
 
     def recompute(self, ballots, results):
         self.init(results, self._ballot_count, self._reported_choices)
@@ -275,8 +303,6 @@ class Comparison(audit.Audit):
             
             if self._stopping_count == 0:
                 return ballot
-        self.compute_upset_prob()
-        self._risk = self.compute_risk()
 
     def update_reported_ballots(self, ballots, results):
         self.init(results, self._ballot_count, self._reported_choices)
@@ -286,13 +312,13 @@ class Comparison(audit.Audit):
             #    return ballot
 
     def get_current_result(self):
-        count = 0
-
-        for result in self._cached_results:
-            count += result[1]
+        # Audited ballots for each choice are the column sums of the tallies
+        actual_counts = self._tallies.sum(axis=0)
+        counts = [int(actual_counts[self._registry.get_code(result.get_contestant())])
+                  for result in self._results]
+        count = sum(counts)
 
         audit_results = []
 
-        for person in self._cached_results:
-            result = election.Result(person[0], person[1] / count)
-            audit_results.append(result)
+        for result, votes in zip(self._results, counts):
+            audit_results.append(election.Result(result.get_contestant(), votes / count))
@@ -0,0 +1,301 @@
+from math import log, ceil
+import audit
+import election
+import numpy as np
+from scipy.stats import binom
+from audit import event_log
+
+
+"""
+Round-based ballot polling audit following Zagorski, McClearn, Morin,
+Vora and Vora's Minerva. Ballots are pulled in rounds; after each round the
+cumulative tally of every (reported winner, loser) pair is compared with
+the ratio of binomial tails under the null (a tie) and under the reported
+result, conditioned on the audit not having stopped in an earlier round.
+A pair is confirmed once the null tail is at most risk limit times the
+reported tail.
+
+Only ballots for the pair's two candidates count towards a pair. The tail
+distributions are kept as arrays over the pair's winner tally and a round
+adds one binomial convolution to them, so a round of any size costs one
+array computation rather than one update per ballot.
+"""
+
+# Round sizes are searched up to this many times BRAVO's average sample number.
+# Each step of the search convolves over the whole round, and rounds with a 99%
+# chance of stopping take under 3 times the average.
+ROUND_SIZE_BOUND = 4
+
+
+class _Pair:
+    # Minerva test of the reported winner against one loser
+    def __init__(self, s_wl):
+        self.s_wl = s_wl
+        # Probability of each winner tally, over sequences of rounds that have not
+        # stopped, under the null and under the reported result
+        self.dist_null = np.ones(1)
+        self.dist_reported = np.ones(1)
+        self.sampled = 0
+        self.winner_votes = 0
+        self.risk = 1.0
+        self.confirmed = False
+
+    def tails(self, new_ballots):
+        # Tails P(tally >= k) of both distributions after new_ballots more relevant ballots
+        draws = np.arange(new_ballots + 1)
+        dist_null = np.convolve(self.dist_null, binom.pmf(draws, new_ballots, 0.5))
+        dist_reported = np.convolve(self.dist_reported, binom.pmf(draws, new_ballots, self.s_wl))
+        tail_null = np.cumsum(dist_null[::-1])[::-1]
+        tail_reported = np.cumsum(dist_reported[::-1])[::-1]
+        return dist_null, dist_reported, tail_null, tail_reported
+
+    def kmin(self, tail_null, tail_reported, risk_limit):
+        # Smallest cumulative winner tally that confirms the pair, or None
+        passing = np.nonzero((tail_reported > 0) & (tail_null <= risk_limit * tail_reported))[0]
+        return int(passing[0]) if len(passing) else None
+
+    def add_round(self, new_ballots, new_winner_votes, risk_limit):
+        dist_null, dist_reported, tail_null, tail_reported = self.tails(new_ballots)
+        self.sampled += new_ballots
+        self.winner_votes += new_winner_votes
+        self.risk = float(tail_null[self.winner_votes] / tail_reported[self.winner_votes]) \
+            if tail_reported[self.winner_votes] > 0 else 1.0
+
+        kmin = self.kmin(tail_null, tail_reported, risk_limit)
+        self.confirmed = kmin is not None and self.winner_votes >= kmin
+        # Later rounds only happen if this one did not stop
+        stop = len(dist_null) if kmin is None else kmin
+        self.dist_null = dist_null[:stop]
+        self.dist_reported = dist_reported[:stop]
+
+    def bravo_asn(self, risk_limit):
+        # Average number of the pair's ballots a BRAVO audit would need, or inf if it cannot confirm it
+        s = self.s_wl
+        if s <= 0.5:
+            return np.inf
+        drift = s * log(2 * s) + ((1 - s) * log(2 * (1 - s)) if s < 1 else 0.0)
+        return (log(1 / risk_limit) + log(2 * s) / 2) / drift
+
+    def stopping_probability(self, new_ballots, risk_limit):
+        # Chance, if the reported result is right, that the next round confirms the pair
+        if self.confirmed:
+            return 1.0
+        kmin = self.kmin(*self.tails(new_ballots)[2:], risk_limit)
+        if kmin is None:
+            return 0.0
+        return float(binom.sf(kmin - self.winner_votes - 1, new_ballots, self.s_wl))
+
+
+class Minerva(audit.Audit):
+    name = "Minerva Round-Based Audit"
+    status_codes = ["In Progress",
+                    "Election Results Verified",
+                    "Full Hand Count Required"]
+
+    def __init__(self):
+        self._risk_limit = 0.1
+        # Rounds are sized for this chance of stopping if the reported results are right
+        self._stopping_probability = 0.9
+        self._status = 0
+        self._registry = None
+        self._results = []
+        self._pairs = []
+        self._shares = None
+        self._tally = np.zeros(0, dtype=np.int64)
+        self._pending = np.zeros(0, dtype=np.int64)
+        self._round_ends = []
+        self._next_round_size = None
+        self._ballot_count = None
+
+    def init(self, results, ballot_count):
+        self._status = 0
+        self._ballot_count = ballot_count
+        self._results = results
+        results_sorted = sorted(results,
+                                key=lambda r: r.get_percentage(),
+                                reverse=True)
+
+        # Codes by reported rank: the winner is 0 and loser i is pair i - 1
+        self._registry = election.CandidateRegistry([r.get_contestant() for r in results_sorted])
+        self._candidates = self._registry.get_names()
+
+        s = results_sorted[0].get_percentage()
+        self._pairs = [_Pair(s / (s + r.get_percentage())) for r in results_sorted[1:]]
+        self._shares = np.array([r.get_percentage() for r in results_sorted], dtype=float)
+        self._shares /= self._shares.sum()
+
+        # Ballots counted in closed rounds, and drawn since the last round closed, per code
+        self._tally = np.zeros(len(self._registry), dtype=np.int64)
+        self._pending = np.zeros(len(self._registry), dtype=np.int64)
+        self._round_ends = []
+        self._next_round_size = self.propose_round_size()
+
+        event_log.log_event("init", audit=self.name, ballot_count=ballot_count,
+                            s_wl=[pair.s_wl for pair in self._pairs],
+                            round_size=self._next_round_size)
+
+    def get_progress(self, final=False):
+        progress_str = "Round {}: {} ballots audited, {} in the current round<br />".format(
+            len(self._round_ends), int(self._tally.sum()), int(self._pending.sum()))
+        for name, pair in zip(self._candidates[1:], self._pairs):
+            progress_str += "Risk of reported winner vs. {} = {:.4f}{}<br />".format(
+                name, pair.risk, " (confirmed)" if pair.confirmed else "")
+        if self._status == 0:
+            progress_str += "Next round: {} ballots".format(self._next_round_size)
+        return progress_str
+
+    def get_status(self):
+        return Minerva.status_codes[self._status]
+
+    @staticmethod
+    def get_name():
+        return Minerva.name
+
+    def get_risk_limit(self):
+        return self._risk_limit
+
+    def set_risk_limit(self, risk_limit):
+        self._risk_limit = risk_limit
+
+    def get_parameters(self):
+        param = [["Risk Limit", str(self._risk_limit * 100)],
+                 ["Stopping Probability", str(self._stopping_probability * 100)]]
+        return param
+
+    def set_parameters(self, param):
+        self._risk_limit = float(param[0]) / 100
+        self._stopping_probability = float(param[1]) / 100
+
+    def get_round_ends(self):
+        # Number of ballots audited at the end of each closed round
+        return list(self._round_ends)
+
+    def get_next_round_size(self):
+        return self._next_round_size
+
+    def compute(self, ballot):
+        # Ballots wait for the rest of their round; the round closes once it is full
+        self._pending[self._registry.get_code(ballot.get_actual_value())] += 1
+        if self._status == 0 and self._pending.sum() >= self._next_round_size:
+            self.close_round()
+
+    def compute_round(self, ballots):
+        """
+        Adds a whole round of ballots (a list or a BallotStore) and closes
+        the round, however large it is.
+        """
+        if isinstance(ballots, election.BallotStore):
+            codes = self._registry.codes_from_ids(ballots.get_actual_ids(), ballots)
+            if (codes == election.CandidateRegistry.INVALID).any():
+                raise KeyError("Ballot for a choice that is not in this contest")
+        else:
+            codes = np.fromiter((self._registry.get_code(b.get_actual_value()) for b in ballots),
+                                dtype=np.int64)
+        self._pending += np.bincount(codes, minlength=len(self._registry))
+        self.close_round()
+
+    def close_round(self):
+        # Evaluates every unconfirmed pair on the ballots drawn since the last round
+        pending = self._pending
+        for i, pair in enumerate(self._pairs):
+            if not pair.confirmed:
+                pair.add_round(int(pending[0] + pending[i + 1]), int(pending[0]), self._risk_limit)
+
+        self._tally += pending
+        self._pending = np.zeros_like(pending)
+        self._round_ends.append(int(self._tally.sum()))
+
+        if all(pair.confirmed for pair in self._pairs):
+            self._status = 1
+        elif self._tally.sum() >= self._ballot_count:
+            self._status = 2
+        else:
+            self._status = 0
+            self._next_round_size = self.propose_round_size()
+
+        event_log.log_event("round", audit=self.name, round=len(self._round_ends),
+                            ballots=self._round_ends[-1], risk=[pair.risk for pair in self._pairs],
+                            status=self.get_status(), next_round_size=self._next_round_size)
+
+    def stopping_probability(self, round_size):
+        """
+        Chance that a round of round_size more ballots confirms every pair,
+        if the reported results are right. Ballots are split between pairs
+        in proportion to the reported shares, and the hardest pair decides.
+        """
+        probability = 1.0
+        for i, pair in enumerate(self._pairs):
+            relevant = int(round(round_size * (self._shares[0] + self._shares[i + 1])))
+            probability = min(probability, pair.stopping_probability(relevant, self._risk_limit))
+        return probability
+
+    def round_size_bound(self):
+        # ROUND_SIZE_BOUND times the ballots BRAVO would need on average for the hardest unconfirmed pair
+        bound = 0.0
+        for i, pair in enumerate(self._pairs):
+            if not pair.confirmed:
+                relevant = self._shares[0] + self._shares[i + 1]
+                bound = max(bound, pair.bravo_asn(self._risk_limit) / relevant)
+        return ROUND_SIZE_BOUND * bound
+
+    def propose_round_size(self):
+        """
+        Smallest round reaching the target stopping probability, searched up
+        to round_size_bound() and the number of unaudited ballots. If the
+        bound falls short of the target, the audit goes on with a round of
+        that size and a new proposal after it.
+        """
+        remaining = max(1, self._ballot_count - int(self._tally.sum()))
+        bound = self.round_size_bound()
+        if np.isinf(bound):
+            # A pair that BRAVO cannot confirm cannot be confirmed by Minerva either
+            return remaining
+        remaining = max(1, min(remaining, int(ceil(bound))))
+        if self.stopping_probability(remaining) < self._stopping_probability:
+            return remaining
+
+        low, high = 0, 1
+        while high < remaining and self.stopping_probability(high) < self._stopping_probability:
+            low, high = high, min(2 * high, remaining)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self.stopping_probability(middle) >= self._stopping_probability:
+                high = middle
+            else:
+                low = middle
+        return high
+
+    def recompute(self, ballots, results):
+        # Replays the ballots with the same round boundaries as before
+        round_ends = self._round_ends
+        self.init(results, self._ballot_count)
+
+        start = 0
+        for end in round_ends:
+            if end > len(ballots) or self._status != 0:
+                break
+            self.compute_round(ballots[start:end])
+            start = end
+            if self._status == 1:
+                return ballots[end - 1]
+        for ballot in ballots[start:]:
+            self.compute(ballot)
+            if self._status == 1:
+                return ballot
+        return None
+
+    def update_reported_ballots(self, ballots, results):
+        self.recompute(ballots, results)
+
+    def get_current_result(self):
+        counts = [int(self._tally[self._registry.get_code(result.get_contestant())] +
+                      self._pending[self._registry.get_code(result.get_contestant())])
+                  for result in self._results]
+        count = sum(counts)
+
+        audit_results = []
+
+        for result, votes in zip(self._results, counts):
+            audit_results.append(election.Result(result.get_contestant(), votes / count))
+
+        return audit_results
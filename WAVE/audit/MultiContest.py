@@ -0,0 +1,177 @@
+from math import log
+import numpy as np
+import election
+
+
+"""
+Audits every contest on a ballot at once from a single sample of ballots.
+Each contest is reduced to (reported winner, loser) pairs, and a sampled
+ballot updates the statistics of every pair with one array operation.
+
+Ballot polling follows BRAVO, with one T statistic per pair. Comparison
+follows Stark's "Super-Simple Simultaneous Single-ballot Risk Limiting
+Audits", with one Kaplan-Markov P-value per contest, using the largest
+overstatement over that contest's pairs and its diluted margin.
+"""
+
+# Code of any value that is not a reported candidate (undervote, overvote,
+# write-in or a contest missing from the ballot)
+INVALID = election.CandidateRegistry.INVALID
+
+
+class MultiContest:
+    name = "Multi-Contest Audit"
+    status_codes = ["In Progress",
+                    "Election Results Verified"]
+
+    def __init__(self, audit_type="polling"):
+        self._audit_type = audit_type
+        self._risk_limit = 0.05
+        self._inflator = 1.03905
+
+        self._contests = []
+        self._registries = []
+        self._ballot_count = None
+        self._sample_size = 0
+
+    def init(self, contests, ballot_count):
+        self._contests = contests
+        self._ballot_count = ballot_count
+        self._sample_size = 0
+
+        # Per contest, candidates are coded by reported rank so the winner is 0
+        self._registries = []
+        pair_contest = []
+        pair_loser = []
+        s_wl = []
+        diluted_margins = []
+        for c, contest in enumerate(contests):
+            results_sorted = sorted(contest.get_reported_results(),
+                                    key=lambda r: r.get_percentage(),
+                                    reverse=True)
+            self._registries.append(election.CandidateRegistry([r.get_contestant() for r in results_sorted],
+                                                               invalid_choices=False))
+
+            s = results_sorted[0].get_percentage()
+            for i, r in enumerate(results_sorted[1:], 1):
+                pair_contest.append(c)
+                pair_loser.append(i)
+                s_wl.append(s / (s + r.get_percentage()))
+
+            if len(results_sorted) > 1:
+                margin = self._votes(results_sorted[0]) - self._votes(results_sorted[1])
+                diluted_margins.append(margin / ballot_count)
+            else:
+                diluted_margins.append(1.0)
+
+        self._pair_contest = np.array(pair_contest, dtype=np.int64)
+        self._pair_loser = np.array(pair_loser, dtype=np.int64)
+        self._uncontested = np.bincount(self._pair_contest, minlength=len(contests)) == 0
+        s_wl = np.array(s_wl, dtype=float)
+
+        # BRAVO: log T for every pair, and its per-ballot increments
+        self._log_t = np.zeros(len(pair_contest))
+        self._log_t_winner = np.log(2 * s_wl)
+        self._log_t_loser = np.log(2 * (1 - s_wl))
+
+        # Kaplan-Markov: log P-value for every contest; the increment for a ballot is
+        # indexed by its overstatement + 2 (i.e. u2, u1, match, o1, o2)
+        self._diluted_margins = np.array(diluted_margins, dtype=float)
+        self._log_p = np.zeros(len(contests))
+        self._log_p_match = np.log(1 - self._diluted_margins / (2 * self._inflator))
+        self._log_p_discrepancy = -np.array([log(1 + 1 / self._inflator),
+                                             log(1 + 1 / (2 * self._inflator)),
+                                             0.0,
+                                             log(1 - 1 / (2 * self._inflator)),
+                                             log(1 - 1 / self._inflator)])
+
+    def _votes(self, result):
+        return result.get_votes() or result.get_percentage() * self._ballot_count
+
+    def get_codes(self, ballot, actual=True):
+        codes = np.full(len(self._contests), INVALID, dtype=np.int64)
+        for c, contest in enumerate(self._contests):
+            if actual:
+                value = ballot.get_contest_actual_value(contest.get_id())
+            else:
+                value = ballot.get_contest_reported_value(contest.get_id())
+            if value is not None:
+                codes[c] = self._registries[c].find_code(value)
+        return codes
+
+    def compute(self, ballot):
+        self.compute_batch(self.get_codes(ballot, actual=False)[np.newaxis],
+                           self.get_codes(ballot)[np.newaxis])
+
+    def remove_ballot(self, ballot):
+        self.compute_batch(self.get_codes(ballot, actual=False)[np.newaxis],
+                           self.get_codes(ballot)[np.newaxis],
+                           direction=-1)
+
+    def compute_batch(self, reported_codes, actual_codes, direction=1):
+        """
+        Applies a batch of ballots given as (ballots x contests) arrays of
+        candidate codes, as returned by get_codes.
+        """
+        reported = np.asarray(reported_codes)[:, self._pair_contest]
+        actual = np.asarray(actual_codes)[:, self._pair_contest]
+        self._sample_size += direction * len(actual)
+
+        if self._audit_type == "polling":
+            increments = (actual == 0) * self._log_t_winner + \
+                         (actual == self._pair_loser) * self._log_t_loser
+            self._log_t += direction * increments.sum(axis=0)
+        else:
+            # Overstatement of each pair's margin, reduced to the worst pair per contest
+            overstatements = self._pair_votes(reported) - self._pair_votes(actual)
+            worst = np.full((len(overstatements), len(self._contests)), -2, dtype=np.int64)
+            np.maximum.at(worst, (slice(None), self._pair_contest), overstatements)
+            worst[:, self._uncontested] = 0
+            increments = self._log_p_match + self._log_p_discrepancy[worst + 2]
+            self._log_p += direction * increments.sum(axis=0)
+
+    # +1 for the reported winner, -1 for the pair's loser and 0 for anything else
+    def _pair_votes(self, codes):
+        return (codes == 0).astype(np.int64) - (codes == self._pair_loser)
+
+    def recompute(self, ballots):
+        self.init(self._contests, self._ballot_count)
+        for ballot in ballots:
+            self.compute(ballot)
+
+    def get_risks(self):
+        if self._audit_type == "polling":
+            # Each contest's risk is set by its weakest pair
+            min_log_t = np.full(len(self._contests), np.inf)
+            np.minimum.at(min_log_t, self._pair_contest, self._log_t)
+            return np.minimum(1.0, np.exp(-min_log_t))
+        return np.minimum(1.0, np.exp(self._log_p))
+
+    def get_statuses(self):
+        verified = self.get_risks() <= self._risk_limit
+        return [MultiContest.status_codes[int(v)] for v in verified]
+
+    def get_status(self):
+        if all(self.get_risks() <= self._risk_limit):
+            return MultiContest.status_codes[1]
+        return MultiContest.status_codes[0]
+
+    def get_progress(self, final=False):
+        progress_str = "Ballots sampled: {} <br />".format(self._sample_size)
+        for contest, risk, status in zip(self._contests, self.get_risks(), self.get_statuses()):
+            progress_str += "{}: risk = {:.4f}, {} <br />".format(contest.get_name(), risk, status)
+        return progress_str
+
+    @staticmethod
+    def get_name():
+        return MultiContest.name
+
+    def get_parameters(self):
+        param = [["Risk Limit", str(self._risk_limit * 100)],
+                 ["Error Inflation Factor", str(self._inflator)]]
+
+        return param
+
+    def set_parameters(self, param):
+        self._risk_limit = float(param[0]) / 100
+        self._inflator = float(param[1])
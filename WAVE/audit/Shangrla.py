@@ -0,0 +1,306 @@
+import audit
+import election
+import numpy as np
+from audit import event_log
+
+
+"""
+Assorter-based audits following Stark's "Sets of Half-Average Nulls Generate
+Risk-Limiting Audits" (SHANGRLA). A contest's reported outcome is reduced to
+assertions, each of which holds iff the mean of an assorter (a function
+from a ballot to [0, u]) exceeds 1/2:
+
+- plurality with any number of winners: one assertion per (winner, loser)
+  pair, with A(ballot) = (1[winner] - 1[loser] + 1) / 2 and u = 1
+- supermajority: the winner needs a fraction f of the valid votes, with
+  A(ballot) = 1 / (2f) for the winner, 0 for another candidate and 1/2 for
+  an undervote or overvote, and u = 1 / (2f)
+
+Ballot polling audits test the assorter values of the audited ballots.
+Comparison audits test the overstatement assorter
+B = (1 - (A(cvr) - A(mvr)) / u) / (2 - v / u), where v is the reported
+assorter margin. Assorters are tables indexed by CandidateRegistry code, so
+the values of a whole sample are one fancy-indexing operation, and the
+risk-measuring functions below turn an (assertions x ballots) array of
+values into running P-values with cumulative sums and products.
+"""
+
+RISK_FUNCTIONS = ("alpha", "kaplan-markov")
+
+
+def alpha_p_values(x, u, eta0, t=0.5, d=100, population=None, state=None):
+    """
+    Running P-values of the ALPHA supermartingale test of the null that
+    the mean of x (assertions x ballots, values in [0, u]) is at most t.
+    The alternative is estimated with Stark's truncated shrinkage
+    estimator, starting from eta0 with weight d. Given the population
+    size, the null mean is updated for sampling without replacement;
+    otherwise ballots are taken to be drawn with replacement.
+
+    With a state dict the test continues from the ballots it has seen
+    before, and the dict is updated to include x, so a sample can be fed
+    in batches at a cost proportional to each batch.
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    u = np.asarray(u, dtype=float).reshape(-1, 1)
+    eta0 = np.asarray(eta0, dtype=float).reshape(-1, 1)
+    state = {} if state is None else state
+    total = state.get("sum", np.zeros((x.shape[0], 1)))
+    seen = state.get("j", 0)
+    j = seen + np.arange(1, x.shape[1] + 1)
+
+    sum_before = total + np.cumsum(x, axis=1) - x
+    if population is None:
+        mu = np.full(x.shape, t)
+    else:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu = (population * t - sum_before) / (population - j + 1)
+
+    shrunk = (d * eta0 + sum_before) / (d + j - 1)
+    # eta has to stay above the null mean even when the reported result does not,
+    # and below u, which bounds it last
+    c = np.maximum(eta0 - t, 1e-6) / 2
+    eta = np.minimum(u * (1 - np.finfo(float).eps), np.maximum(shrunk, mu + c / np.sqrt(d + j - 1)))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = x / mu * (eta - mu) / (u - mu) + (u - eta) / (u - mu)
+        # The null is impossible once the rest of the population cannot bring the mean
+        # down to t, and certain once it could not reach t even if every ballot were u
+        terms = np.where(mu <= 0, np.inf, np.where(mu >= u, 0.0, terms))
+        log_t = state.get("log_t", 0.0) + np.cumsum(np.log(np.maximum(terms, 0)), axis=1)
+    best = np.maximum(state.get("best", 0.0), np.maximum.accumulate(log_t, axis=1))
+
+    if x.shape[1]:
+        state.update({"sum": sum_before[:, -1:] + x[:, -1:], "j": int(j[-1]),
+                      "log_t": log_t[:, -1:], "best": best[:, -1:]})
+    return np.minimum(1.0, np.exp(-best))
+
+
+def kaplan_markov_p_values(x, t=0.5, g=0.1, state=None):
+    # Running P-values of the Kaplan-Markov test of the null that the mean of x is at most t;
+    # a state dict carries the test over from earlier batches, as for alpha_p_values
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    state = {} if state is None else state
+    log_p = state.get("log_p", 0.0) + np.cumsum(np.log(t + g) - np.log(x + g), axis=1)
+    lowest = np.minimum(state.get("lowest", 0.0), np.minimum.accumulate(log_p, axis=1))
+    if x.shape[1]:
+        state.update({"log_p": log_p[:, -1:], "lowest": lowest[:, -1:]})
+    return np.minimum(1.0, np.exp(lowest))
+
+
+class Shangrla(audit.Audit):
+    name = "SHANGRLA Audit"
+    status_codes = ["In Progress",
+                    "Election Results Verified",
+                    "Full Hand Count Required"]
+
+    def __init__(self):
+        self._risk_limit = 0.05
+        self._n_winners = 1
+        # Fraction of the valid votes the winner needs; 0 for plurality
+        self._supermajority = 0.0
+        self._comparison = False
+        self._risk_function = "alpha"
+
+        self._status = 0
+        self._registry = None
+        self._results = []
+        self._assertions = []
+        self._actual_counts = np.zeros(0, dtype=np.int64)
+        self._sample_size = 0
+        self._p_values = np.zeros(0)
+        self._risk_state = {}
+        self._stop_index = -1
+        self._ballot_count = None
+
+    def init(self, results, ballot_count):
+        self._status = 0
+        self._ballot_count = ballot_count
+        self._results = results
+        results_sorted = sorted(results,
+                                key=lambda r: r.get_percentage(),
+                                reverse=True)
+
+        self._registry = election.CandidateRegistry([r.get_contestant() for r in results_sorted])
+        self._candidates = self._registry.get_names()
+
+        # Reported share of every code, for the reported assorter means
+        shares = np.zeros(len(self._registry))
+        shares[:len(results_sorted)] = [r.get_percentage() for r in results_sorted]
+        invalid_share = max(0.0, 1 - shares.sum())
+        shares[self._registry.get_undervote_code()] = invalid_share
+
+        # Assorter of every assertion as a table over codes, with its upper bound
+        self._assertions = []
+        tables = []
+        bounds = []
+        num_candidates = self._registry.get_num_candidates()
+        if self._supermajority > 0:
+            table = np.full(len(self._registry), 0.5)
+            table[:num_candidates] = 0
+            table[self._registry.get_code(election.WriteIn())] = 0
+            table[0] = 1 / (2 * self._supermajority)
+            self._assertions.append("{} has {:g}% of the valid votes".format(
+                self._candidates[0], self._supermajority * 100))
+            tables.append(table)
+            bounds.append(1 / (2 * self._supermajority))
+        else:
+            n_winners = min(self._n_winners, num_candidates - 1)
+            for w in range(n_winners):
+                for l in range(n_winners, num_candidates):
+                    table = np.full(len(self._registry), 0.5)
+                    table[w] = 1
+                    table[l] = 0
+                    self._assertions.append("{} beats {}".format(self._candidates[w], self._candidates[l]))
+                    tables.append(table)
+                    bounds.append(1.0)
+        self._tables = np.array(tables).reshape(len(tables), len(self._registry))
+        self._bounds = np.array(bounds)
+
+        # Reported assorter margins v = 2 * mean - 1
+        self._margins = 2 * self._tables @ shares - 1
+        if self._comparison:
+            self._test_bounds = 2 / (2 - self._margins / self._bounds)
+            self._eta0 = 1 / (2 - self._margins / self._bounds)
+        else:
+            self._test_bounds = self._bounds
+            self._eta0 = (self._margins + 1) / 2
+
+        # Running state of the risk function, so each batch only costs its own ballots
+        self._actual_counts = np.zeros(len(self._registry), dtype=np.int64)
+        self._sample_size = 0
+        self._p_values = np.ones(len(self._assertions))
+        self._risk_state = {}
+        self._stop_index = -1
+
+        event_log.log_event("init", audit=self.name, assertions=self._assertions,
+                            margins=self._margins, comparison=self._comparison,
+                            risk_function=self._risk_function, ballot_count=ballot_count)
+
+    def get_progress(self, final=False):
+        progress_str = ""
+        p_values = self.get_p_values()
+        for assertion, margin, p_value in zip(self._assertions, self._margins, p_values):
+            progress_str += "{} (margin {:.4f}): P-value = {:.4f}<br />".format(assertion, margin, p_value)
+        return progress_str
+
+    def get_status(self):
+        return Shangrla.status_codes[self._status]
+
+    @staticmethod
+    def get_name():
+        return Shangrla.name
+
+    def get_risk_limit(self):
+        return self._risk_limit
+
+    def set_risk_limit(self, risk_limit):
+        self._risk_limit = risk_limit
+
+    def get_parameters(self):
+        param = [["Risk Limit", str(self._risk_limit * 100)],
+                 ["Winners", str(self._n_winners)],
+                 ["Supermajority", str(self._supermajority * 100)],
+                 ["Comparison", "1" if self._comparison else "0"],
+                 ["Risk Function", self._risk_function]]
+        return param
+
+    def set_parameters(self, param):
+        self._risk_limit = float(param[0]) / 100
+        self._n_winners = int(param[1])
+        self._supermajority = float(param[2]) / 100
+        self._comparison = str(param[3]).strip() not in ("0", "", "False")
+        risk_function = str(param[4]).strip().lower()
+        if risk_function not in RISK_FUNCTIONS:
+            raise ValueError("Unknown risk function {!r}".format(param[4]))
+        self._risk_function = risk_function
+
+    def get_assertions(self):
+        return list(self._assertions)
+
+    def get_p_values(self):
+        # Current P-value of every assertion
+        return self._p_values
+
+    def assorter_values(self, reported_codes, actual_codes):
+        """
+        Values of every assertion's assorter (polling) or overstatement
+        assorter (comparison) for a sample, as an (assertions x ballots) array.
+        """
+        actual = self._tables[:, actual_codes]
+        if not self._comparison:
+            return actual
+        overstatement = self._tables[:, reported_codes] - actual
+        return (1 - overstatement / self._bounds[:, np.newaxis]) / \
+               (2 - self._margins / self._bounds)[:, np.newaxis]
+
+    def p_values(self, values, state=None):
+        # Running P-values of every assertion over a sample's assorter values
+        if self._risk_function == "kaplan-markov":
+            return kaplan_markov_p_values(values, state=state)
+        return alpha_p_values(values, self._test_bounds, self._eta0, state=state)
+
+    def compute(self, ballot):
+        self.compute_batch([self._registry.get_code(ballot.get_reported_value())],
+                           [self._registry.get_code(ballot.get_actual_value())])
+
+    def get_codes(self, ballots, actual=True):
+        # Codes of the actual (or reported) votes of a list of ballots or a BallotStore
+        if isinstance(ballots, election.BallotStore):
+            ids = ballots.get_actual_ids() if actual else ballots.get_reported_ids()
+            codes = self._registry.codes_from_ids(ids, ballots)
+            if (codes == election.CandidateRegistry.INVALID).any():
+                raise KeyError("Ballot for a choice that is not in this contest")
+            return codes
+        get_value = (lambda b: b.get_actual_value()) if actual else (lambda b: b.get_reported_value())
+        return np.fromiter((self._registry.get_code(get_value(b)) for b in ballots), dtype=np.int64)
+
+    def compute_batch(self, reported_codes, actual_codes):
+        # Adds a sequence of ballots, given by code, and carries the running P-values on over them
+        reported_codes = np.asarray(reported_codes, dtype=np.int64)
+        actual_codes = np.asarray(actual_codes, dtype=np.int64)
+        p_values = self.p_values(self.assorter_values(reported_codes, actual_codes), self._risk_state)
+        if p_values.shape[1]:
+            # P-values only fall, so the first ballot that confirms every assertion stays the stopping point
+            confirmed = p_values.max(axis=0) <= self._risk_limit
+            if self._stop_index < 0 and confirmed.any():
+                self._stop_index = self._sample_size + int(confirmed.argmax())
+            self._p_values = p_values[:, -1]
+        self._actual_counts += np.bincount(actual_codes, minlength=len(self._registry))
+        self._sample_size += len(actual_codes)
+        self._refresh_status()
+
+        event_log.log_event("batch", audit=self.name, ballots=len(actual_codes),
+                            p_values=self.get_p_values(), status=self.get_status())
+
+    def _refresh_status(self):
+        if len(self._assertions) == 0 or self.get_p_values().max() <= self._risk_limit:
+            self._status = 1
+        elif self._sample_size >= self._ballot_count:
+            self._status = 2
+        else:
+            self._status = 0
+
+    def stopping_index(self):
+        # Index of the first ballot after which every assertion was confirmed, or -1
+        return self._stop_index
+
+    def recompute(self, ballots, results):
+        self.init(results, self._ballot_count)
+        self.compute_batch(self.get_codes(ballots, actual=False), self.get_codes(ballots))
+        stop = self.stopping_index()
+        return ballots[stop] if stop >= 0 else None
+
+    def update_reported_ballots(self, ballots, results):
+        self.recompute(ballots, results)
+
+    def get_current_result(self):
+        votes = [int(self._actual_counts[self._registry.get_code(result.get_contestant())]) for result in self._results]
+        count = sum(votes)
+
+        audit_results = []
+
+        for result, vote_count in zip(self._results, votes):
+            audit_results.append(election.Result(result.get_contestant(), vote_count / count))
+
+        return audit_results
@@ -4,14 +4,17 @@ import inspect
 from audit.Audit import Audit
 from audit.BallotPolling import BallotPolling
 from audit.Comparison import Comparison
-# from audit.Bayesian import Bayesian
+from audit.Bayesian import Bayesian
+from audit.MultiContest import MultiContest
+from audit.Minerva import Minerva
+from audit.Shangrla import Shangrla
 
 
 def get_audits():
     audits = []
 
     for name, obj in inspect.getmembers(sys.modules[__name__]):
-        if inspect.isclass(obj):
+        if inspect.isclass(obj) and issubclass(obj, Audit):
             audits.append(obj)
 
     return audits
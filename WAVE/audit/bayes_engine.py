@@ -0,0 +1,334 @@
+import copy
+import numpy as np
+from scipy.special import gammaln
+
+
+"""
+Vectorized Dirichlet-multinomial simulation for Bayesian audits, following
+Rivest's bctool. Every trial of every stratum is drawn as one NumPy array
+instead of looping over trials in Python.
+
+Single-stratum, single-winner contests between two choices need no
+simulation: the Dirichlet posterior marginalizes to a beta-binomial over the
+unsampled ballots, and the upset probability is one beta-binomial CDF.
+Audits that refresh the upset probability after every ballot keep their
+draws in a PosteriorCache, which reweights them rather than drawing again.
+"""
+
+
+def extend_strata(rng, strata_sample_tallies, strata_pseudocounts, strata_sizes, num_trials):
+    shares, extensions = draw_posterior(rng, strata_sample_tallies, strata_pseudocounts,
+                                        strata_sizes, num_trials)
+    return extensions.sum(axis=1) + np.asarray(strata_sample_tallies, dtype=np.int64).sum(axis=0)
+
+
+def draw_posterior(rng, strata_sample_tallies, strata_pseudocounts, strata_sizes, num_trials):
+    """
+    Draws num_trials posterior share vectors per stratum and the unsampled
+    ballots of each stratum given them, as (trials x strata x choices) arrays.
+    """
+    tallies = np.asarray(strata_sample_tallies, dtype=np.int64)
+    alphas = tallies + np.asarray(strata_pseudocounts, dtype=float)
+    nonsample_sizes = np.maximum(np.asarray(strata_sizes, dtype=np.int64) - tallies.sum(axis=1), 0)
+
+    # One Dirichlet draw per (trial, stratum), normalized from gamma variates
+    gammas = rng.standard_gamma(alphas, size=(num_trials,) + alphas.shape)
+    shares = gammas / gammas.sum(axis=2, keepdims=True)
+
+    # Extend each stratum's sample to its full size
+    return shares, rng.multinomial(nonsample_sizes, shares)
+
+
+def count_wins(total_tallies, n_winners=1):
+    # A stable sort hands ties to the earlier candidate, i.e. the reported winner
+    order = np.argsort(-total_tallies, axis=1, kind="stable")[:, :n_winners]
+    return np.bincount(order.ravel(), minlength=total_tallies.shape[1])
+
+
+def upsets(total_tallies, n_winners=1):
+    # Whether each trial's winners leave out the first (reported winning) candidate
+    order = np.argsort(-total_tallies, axis=1, kind="stable")[:, :n_winners]
+    return ~(order == 0).any(axis=1)
+
+
+def _win_count_chunks(strata_sample_tallies, strata_pseudocounts, strata_sizes, seed,
+                      num_trials, n_winners, chunk_size):
+    # Trials are drawn in chunks to bound memory and to allow stopping early
+    rng = np.random.default_rng(seed)
+    remaining = num_trials
+    while remaining > 0:
+        trials = min(chunk_size, remaining)
+        totals = extend_strata(rng, strata_sample_tallies, strata_pseudocounts,
+                               strata_sizes, trials)
+        yield trials, count_wins(totals, n_winners)
+        remaining -= trials
+
+
+def compute_win_probs(strata_sample_tallies,
+                      strata_pseudocounts,
+                      strata_sizes,
+                      seed,
+                      num_trials,
+                      candidate_names,
+                      n_winners,
+                      chunk_size=10000):
+    """
+    Drop-in replacement for bctool.compute_win_probs. Returns a list of
+    (i, p) pairs where p is the fraction of trials won by the i-th (1-indexed)
+    candidate. The same seed always gives the same probabilities.
+    """
+    wins = np.zeros(len(candidate_names), dtype=np.int64)
+    for trials, chunk_wins in _win_count_chunks(strata_sample_tallies, strata_pseudocounts,
+                                                strata_sizes, seed, num_trials,
+                                                n_winners, chunk_size):
+        wins += chunk_wins
+
+    return [(i + 1, wins[i] / num_trials) for i in range(len(candidate_names))]
+
+
+def wilson_interval(successes, trials, z=1.96):
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    center = (p + z ** 2 / (2 * trials)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def betabinom_cdf(k, n, a, b):
+    """
+    P(X <= k) for X ~ BetaBinomial(n, a, b). With integer a and b the Polya
+    urn duality gives P(X <= k) = P(Y >= a) for Y ~ BetaBinomial(a + b - 1,
+    k + 1, n - k), a sum over b terms instead of k + 1, so the shorter of the
+    two is used. Both sum the tail itself rather than subtracting from 1,
+    which keeps small upset probabilities accurate.
+    """
+    if k < 0:
+        return 0.0
+    if k >= n:
+        return 1.0
+    if a == int(a) and b == int(b) and b < k + 1:
+        return _betabinom_sum(int(a), int(a + b) - 1, int(a + b) - 1, k + 1, n - k)
+    return _betabinom_sum(0, k, n, a, b)
+
+
+def _betabinom_sum(low, high, n, a, b):
+    # P(low <= X <= high) for X ~ BetaBinomial(n, a, b), from log probabilities
+    x = np.arange(low, high + 1)
+    log_pmf = (gammaln(n + 1) - gammaln(x + 1) - gammaln(n - x + 1) +
+               gammaln(x + a) + gammaln(n - x + b) - gammaln(n + a + b) +
+               gammaln(a + b) - gammaln(a) - gammaln(b))
+    return float(min(1.0, np.exp(log_pmf).sum()))
+
+
+def exact_upset_prob(sample_tally, pseudocounts, nonsample_size):
+    """
+    Probability that the second of two choices ends with more votes than the
+    first (ties go to the first, as in count_wins) once the nonsample_size
+    unsampled ballots are split by the beta-binomial posterior predictive.
+    """
+    winner_votes, loser_votes = (int(t) for t in sample_tally)
+    a, b = (float(p) for p in pseudocounts)
+    # The loser wins iff the winner gets at most this many of the unsampled ballots
+    most = int(np.ceil((loser_votes - winner_votes + nonsample_size) / 2)) - 1
+    return betabinom_cdf(most, int(nonsample_size), winner_votes + a, loser_votes + b)
+
+
+def compute_upset_prob(strata_sample_tallies,
+                       strata_pseudocounts,
+                       strata_sizes,
+                       seed,
+                       num_trials,
+                       n_winners=1,
+                       threshold=None,
+                       ci_width=None,
+                       chunk_size=1000,
+                       callback=None,
+                       choices=None):
+    """
+    Estimates the probability that the first (reported winning) candidate
+    does not win. With ci_width set, trials run in chunks and stop once the
+    Wilson interval is narrower than ci_width or lies entirely on one side of
+    threshold; num_trials is then only an upper bound. callback, if given,
+    is called as callback(trials_run, num_trials) after every chunk and may
+    raise to abandon the simulation.
+
+    choices is the number of leading columns that are the contest's real
+    choices (the rest being overvotes, undervotes and write-ins). With two
+    choices, one stratum and one winner, the upset probability is computed
+    exactly by exact_upset_prob: the other columns are dropped and every
+    unsampled ballot is taken to be a vote for one of the two choices, the
+    larger and so more uncertain population. The interval is then the point
+    itself and trials_run is 0.
+
+    Returns (upset_prob, (ci_low, ci_high), trials_run).
+    """
+    if choices == 2 and n_winners == 1 and len(strata_sample_tallies) == 1:
+        tally = np.asarray(strata_sample_tallies[0])
+        nonsample_size = max(int(strata_sizes[0]) - int(tally.sum()), 0)
+        upset_prob = exact_upset_prob(tally[:2], np.asarray(strata_pseudocounts[0])[:2], nonsample_size)
+        return upset_prob, (upset_prob, upset_prob), 0
+
+    upsets = 0
+    trials_run = 0
+    for trials, wins in _win_count_chunks(strata_sample_tallies, strata_pseudocounts,
+                                          strata_sizes, seed, num_trials,
+                                          n_winners, chunk_size):
+        upsets += trials - wins[0]
+        trials_run += trials
+        if callback is not None:
+            callback(trials_run, num_trials)
+        low, high = wilson_interval(upsets, trials_run)
+        if ci_width is None:
+            continue
+        if high - low <= ci_width:
+            break
+        if threshold is not None and (high < threshold or low > threshold):
+            break
+
+    return upsets / trials_run, wilson_interval(upsets, trials_run), trials_run
+
+
+class PosteriorCache:
+    """
+    Keeps the posterior draws of the last upset probability computation and
+    carries them forward as ballots are added, instead of drawing afresh.
+
+    A ballot for choice c in stratum s multiplies each draw's importance
+    weight by its share p[s, c], the likelihood of that observation. The
+    draw's unsampled ballots lose one ballot picked uniformly at random,
+    which leaves a multinomial draw over one fewer ballot with the same
+    shares. The weighted upset fraction then estimates the new posterior
+    upset probability. The draws are replaced once the effective sample
+    size falls below ess_fraction of their number, or when anything but
+    added ballots changed.
+    """
+    def __init__(self, ess_fraction=0.5, max_step=100):
+        self.ess_fraction = ess_fraction
+        # More new ballots than this at once are cheaper to draw afresh
+        self.max_step = max_step
+        self._clear()
+
+    def _clear(self):
+        self._key = None
+        self._tallies = None
+        self._shares = None
+        self._extensions = None
+        self._totals = None
+        self._upsets = None
+        self._weights = None
+        self._rng = None
+        # Number of times the draws were replaced
+        self.resamples = 0
+
+    def __getstate__(self):
+        # Snapshots leave out the draws; they are redrawn on the next computation
+        state = self.__dict__.copy()
+        state.update(_key=None, _tallies=None, _shares=None, _extensions=None,
+                     _totals=None, _upsets=None, _weights=None, _rng=None)
+        return state
+
+    def __deepcopy__(self, memo):
+        clone = PosteriorCache.__new__(PosteriorCache)
+        memo[id(self)] = clone
+        for name, value in self.__dict__.items():
+            setattr(clone, name, copy.deepcopy(value, memo))
+        return clone
+
+    def get_effective_sample_size(self):
+        if self._weights is None:
+            return 0.0
+        return float(self._weights.sum() ** 2 / (self._weights ** 2).sum())
+
+    def compute_upset_prob(self,
+                           strata_sample_tallies,
+                           strata_pseudocounts,
+                           strata_sizes,
+                           seed,
+                           num_trials,
+                           n_winners=1,
+                           threshold=None,
+                           ci_width=None,
+                           chunk_size=1000,
+                           callback=None,
+                           choices=None):
+        """
+        Same arguments and result as compute_upset_prob; the interval comes
+        from the effective sample size of the weighted draws.
+        """
+        if choices == 2 and n_winners == 1 and len(strata_sample_tallies) == 1:
+            return compute_upset_prob(strata_sample_tallies, strata_pseudocounts, strata_sizes,
+                                      seed, num_trials, n_winners, choices=choices)
+
+        tallies = np.asarray(strata_sample_tallies, dtype=np.int64)
+        pseudocounts = np.asarray(strata_pseudocounts, dtype=float)
+        sizes = np.asarray(strata_sizes, dtype=np.int64)
+        key = (tallies.shape, pseudocounts.tobytes(), sizes.tobytes(), seed, num_trials, n_winners)
+
+        added = None if key != self._key else tallies - self._tallies
+        if added is None or (added < 0).any() or added.sum() > self.max_step:
+            self._rng = None
+            self._draw(tallies, pseudocounts, sizes, seed, num_trials, n_winners,
+                       threshold, ci_width, chunk_size, callback)
+            self._key = key
+        elif added.any():
+            self._add(added, n_winners)
+            if self.get_effective_sample_size() < self.ess_fraction * len(self._weights):
+                self._draw(tallies, pseudocounts, sizes, seed, num_trials, n_winners,
+                           threshold, ci_width, chunk_size, callback)
+        self._tallies = tallies.copy()
+
+        ess = self.get_effective_sample_size()
+        upset_prob = float(self._weights[self._upsets].sum() / self._weights.sum())
+        return upset_prob, wilson_interval(upset_prob * ess, ess), len(self._weights)
+
+    def _draw(self, tallies, pseudocounts, sizes, seed, num_trials, n_winners,
+              threshold, ci_width, chunk_size, callback):
+        # Fresh, equally weighted draws, stopping early like compute_upset_prob; the
+        # generator carries on from earlier draws unless the inputs were reset
+        rng = np.random.default_rng(seed) if self._rng is None else self._rng
+        shares, extensions, upset = [], [], []
+        trials_run = 0
+        while trials_run < num_trials:
+            trials = min(chunk_size, num_trials - trials_run)
+            chunk_shares, chunk_extensions = draw_posterior(rng, tallies, pseudocounts, sizes, trials)
+            shares.append(chunk_shares)
+            extensions.append(chunk_extensions)
+            upset.append(upsets(chunk_extensions.sum(axis=1) + tallies.sum(axis=0), n_winners))
+            trials_run += trials
+            if callback is not None:
+                callback(trials_run, num_trials)
+            if ci_width is None:
+                continue
+            low, high = wilson_interval(sum(u.sum() for u in upset), trials_run)
+            if high - low <= ci_width:
+                break
+            if threshold is not None and (high < threshold or low > threshold):
+                break
+
+        self._rng = rng
+        self._shares = np.concatenate(shares)
+        self._extensions = np.concatenate(extensions)
+        self._totals = self._extensions.sum(axis=1) + tallies.sum(axis=0)
+        self._upsets = np.concatenate(upset)
+        self._weights = np.ones(trials_run)
+        self.resamples += 1
+
+    def _add(self, added, n_winners):
+        trials = np.arange(len(self._weights))
+        for stratum, choice in zip(*np.nonzero(added)):
+            for _ in range(added[stratum, choice]):
+                self._weights *= self._shares[:, stratum, choice]
+                self._weights /= self._weights.sum()
+
+                # Take one of the stratum's unsampled ballots away, uniformly at random
+                extension = self._extensions[:, stratum]
+                remaining = extension.sum(axis=1)
+                if (remaining > 0).all():
+                    picks = self._rng.integers(0, remaining)
+                    removed = (np.cumsum(extension, axis=1) <= picks[:, np.newaxis]).sum(axis=1)
+                    extension[trials, removed] -= 1
+                    self._totals[trials, removed] -= 1
+                self._totals[:, choice] += 1
+        self._upsets = upsets(self._totals, n_winners)
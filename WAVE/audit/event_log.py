@@ -0,0 +1,182 @@
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+import numpy as np
+from logging import DEBUG, INFO, WARNING
+
+
+"""
+Audit event log. Audits and the UI record ballot decisions and statistic
+updates with log_event, which costs one level check while no log is open.
+Once start() is called, events are queued and written by a background
+thread as JSON lines. Every line carries the SHA-256 of the previous one,
+so editing, dropping or reordering lines breaks the chain and shows up in
+verify_log. A line torn by a crash mid-write is cut off when the log is
+reopened, and the bytes dropped are recorded as the next entry.
+"""
+
+logger = logging.getLogger("wave.audit")
+logger.propagate = False
+
+GENESIS_HASH = "0" * 64
+
+_listener = None
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def log_event(event, level=INFO, **fields):
+    if not logger.isEnabledFor(level):
+        return
+    # Snapshot the fields now; they are serialized later on the writer thread
+    fields = json.loads(json.dumps(fields, default=_to_json))
+    logger.log(level, event, extra={"fields": fields})
+
+
+def _record_hash(entry):
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class HashChainHandler(logging.Handler):
+    """
+    Writes one JSON object per record, chained to the previous line by its
+    hash. Appending to an existing log continues its chain. Lines are
+    buffered and flushed every flush_every records and on close.
+    """
+
+    def __init__(self, filename, flush_every=100):
+        super().__init__()
+        self._seq, self._prev, end = _chain_tail(filename)
+        torn = b""
+        if os.path.exists(filename):
+            with open(filename, 'rb') as log_file:
+                log_file.seek(end)
+                torn = log_file.read()
+        self._stream = open(filename, 'a', encoding='utf-8')
+        self._flush_every = flush_every
+        if torn:
+            self._stream.truncate(end)
+            self._write(time.time(), "WARNING", "torn_tail",
+                        {"offset": end, "dropped": torn.decode('utf-8', 'replace')})
+            self._stream.flush()
+
+    def _write(self, created, level, event, fields):
+        entry = {"seq": self._seq,
+                 "time": created,
+                 "level": level,
+                 "event": event,
+                 "fields": fields,
+                 "prev": self._prev}
+        entry["hash"] = _record_hash(entry)
+        self._stream.write(json.dumps(entry, sort_keys=True) + "\n")
+        self._seq += 1
+        self._prev = entry["hash"]
+
+    def emit(self, record):
+        try:
+            self._write(record.created, record.levelname, record.getMessage(),
+                        getattr(record, "fields", {}))
+            if self._seq % self._flush_every == 0:
+                self._stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self._stream.flush()
+
+    def close(self):
+        self._stream.close()
+        super().close()
+
+
+def _chain_tail(filename, block=1 << 16):
+    """
+    Sequence number and hash the next line of an existing log must continue
+    from, and the offset just past the last whole entry. Anything after that
+    offset was torn by a crash mid-write. The file is read backwards from the
+    end, a block at a time.
+    """
+    try:
+        size = os.path.getsize(filename)
+    except FileNotFoundError:
+        return 0, GENESIS_HASH, 0
+    with open(filename, 'rb') as log_file:
+        start = size
+        while start > 0:
+            start = max(0, start - block)
+            block *= 2
+            log_file.seek(start)
+            lines = log_file.read(size - start).split(b"\n")
+            # The last piece has no newline; the first may be cut off by the block start
+            end = size - len(lines[-1])
+            for line in reversed(lines[1 if start else 0:-1]):
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                    return entry["seq"] + 1, entry["hash"], end
+                except (ValueError, KeyError, TypeError):
+                    end -= len(line) + 1
+    return 0, GENESIS_HASH, 0
+
+
+def start(filename, level=INFO, flush_every=100):
+    """
+    Opens the event log at filename and records events at `level` and above
+    to it from a background thread until stop() is called.
+    """
+    global _listener
+    stop()
+
+    records = queue.Queue()
+    handler = HashChainHandler(filename, flush_every)
+    _listener = logging.handlers.QueueListener(records, handler)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(level)
+    _listener.start()
+
+
+def stop():
+    # Writes out every queued event and closes the log
+    global _listener
+    if _listener is None:
+        return
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.setLevel(WARNING)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(stop)
+
+
+def verify_log(filename):
+    """
+    Checks the hash chain of an event log. Returns the number of the first
+    line (from 0) that was altered, removed or inserted, or None if the
+    whole log is intact.
+    """
+    prev = GENESIS_HASH
+    with open(filename, 'r', encoding='utf-8') as log_file:
+        for line_num, line in enumerate(log_file):
+            try:
+                entry = json.loads(line)
+                recorded = entry.pop("hash")
+            except (ValueError, KeyError):
+                return line_num
+            if entry.get("seq") != line_num or entry.get("prev") != prev or _record_hash(entry) != recorded:
+                return line_num
+            prev = recorded
+    return None
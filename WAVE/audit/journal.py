@@ -0,0 +1,341 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import time
+import audit
+import election
+
+
+"""
+Audit session journal. Every draw, ballot entry and parameter change is
+appended to a JSON-lines file and fsync'd before the UI moves on, so a
+crash loses at most the entry being typed. Every so often the audit
+engine itself is pickled to a snapshot file next to the journal, together
+with the byte offset of the journal it covers; resuming loads the snapshot
+and replays only the entries written after it.
+
+The journal holds election data by reference (ballot indices and contestant
+names), so it must be resumed against the same election it was written for.
+journal_filename names the journal after a fingerprint of the election, and
+resume() rejects a journal whose fingerprint does not match.
+"""
+
+SNAPSHOT_SUFFIX = ".snapshot"
+
+
+def election_key(election_):
+    # Fingerprint of the ballots, contestants and reported results of an election
+    digest = hashlib.sha256()
+    digest.update(str(election_.get_ballot_count()).encode('utf-8'))
+    for contestant in election_.get_contestants():
+        digest.update(contestant.get_name().encode('utf-8') + b"\0")
+    for result in election_.get_reported_results():
+        digest.update("{}:{}\0".format(result.get_contestant().get_name(), result.get_votes()).encode('utf-8'))
+    digest.update(election_.get_ballots().get_physical_ballot_nums().astype('<i4').tobytes())
+    return digest.hexdigest()[:16]
+
+
+def journal_filename(election_, directory=""):
+    return os.path.join(directory, "audit_journal_{}.jsonl".format(election_key(election_)))
+
+
+class Session:
+    """
+    State of an audit rebuilt from a journal: the seed, the audit engine,
+    the audited ballots in audit order and the number of the next draw.
+    """
+
+    def __init__(self, seed, audit, ballots, next_draw):
+        self.seed = seed
+        self.audit = audit
+        self.ballots = ballots
+        self.next_draw = next_draw
+
+
+class _ElectionPickler(pickle.Pickler):
+    # Ballots, contestants and results are saved as references into the election
+    def __init__(self, file, election):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._refs = {id(election.get_ballots()): ("ballots",)}
+        for contestant in election.get_contestants():
+            self._refs[id(contestant)] = ("contestant", contestant.get_name())
+        for i, result in enumerate(election.get_reported_results()):
+            self._refs[id(result)] = ("result", i)
+
+    def persistent_id(self, obj):
+        return self._refs.get(id(obj))
+
+
+class _ElectionUnpickler(pickle.Unpickler):
+    def __init__(self, file, election):
+        super().__init__(file)
+        self._election = election
+
+    def persistent_load(self, ref):
+        if ref[0] == "ballots":
+            return self._election.get_ballots()
+        if ref[0] == "contestant":
+            return self._election.get_contestant_by_name(ref[1])
+        if ref[0] == "result":
+            return self._election.get_reported_results()[ref[1]]
+        raise pickle.UnpicklingError("Unknown reference {}".format(ref))
+
+
+def _contestant(election_, name):
+    # Undervotes and overvotes need not be contestants of the election
+    contestant = election_.get_contestant_by_name(name)
+    if contestant is not None:
+        return contestant
+    for special in (election.Undervote(), election.Overvote(), election.WriteIn()):
+        if special.get_name() == name:
+            return special
+    raise KeyError(name)
+
+
+def _read_records(filename, offset=0):
+    """
+    Reads the journal from `offset`. Returns the records and the offset just
+    past the last complete one; a torn final line, from a crash mid-write,
+    is left out.
+    """
+    records = []
+    with open(filename, 'rb') as journal_file:
+        journal_file.seek(offset)
+        for line in journal_file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line.decode('utf-8')))
+            except ValueError:
+                break
+            offset += len(line)
+    return records, offset
+
+
+class Journal:
+    """
+    Append-only journal of one audit session. Create it, then either
+    start() a new session or resume() the one already in the file; after
+    that the record_* methods and snapshot() append to it.
+    """
+
+    def __init__(self, filename, snapshot_every=500, sync=True):
+        self._filename = filename
+        self._snapshot_filename = filename + SNAPSHOT_SUFFIX
+        self._snapshot_every = snapshot_every
+        self._sync = sync
+        self._stream = None
+        self._seq = 0
+        # Election index of each audited ballot, in audit order
+        self._indices = []
+        self._since_snapshot = 0
+
+    def exists(self):
+        # Whether the file already holds a session to resume
+        return os.path.exists(self._filename) and os.path.getsize(self._filename) > 0
+
+    def get_filename(self):
+        return self._filename
+
+    def _open(self, offset):
+        # Drops anything after the last complete record before appending
+        self._stream = open(self._filename, 'ab')
+        self._stream.truncate(offset)
+
+    def _append(self, record_type, **fields):
+        record = {"seq": self._seq, "type": record_type}
+        record.update(fields)
+        self._stream.write((json.dumps(record, sort_keys=True) + "\n").encode('utf-8'))
+        self._stream.flush()
+        if self._sync:
+            os.fsync(self._stream.fileno())
+        self._seq += 1
+
+    def start(self, seed, audit_, ballot_count, key=None):
+        """
+        Begins a new journal, replacing any previous session in the file. The
+        election_key of the election, if given, is checked again on resume.
+        """
+        if os.path.exists(self._snapshot_filename):
+            os.remove(self._snapshot_filename)
+        self._stream = open(self._filename, 'wb')
+        self._seq = 0
+        self._indices = []
+        self._since_snapshot = 0
+        self._append("session", seed=seed, audit=audit_.get_name(),
+                     parameters=[p[1] for p in audit_.get_parameters()],
+                     ballot_count=ballot_count,
+                     election=key)
+
+    def read_session(self):
+        # The session record at the start of the journal, or None if there is none
+        try:
+            with open(self._filename, 'rb') as journal_file:
+                header = json.loads(journal_file.readline().decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(header, dict) or header.get("type") != "session":
+            return None
+        return header
+
+    def archive(self):
+        """
+        Moves the journal and its snapshot aside, to the journal's name with a
+        timestamp appended, so a new session can start without losing the old
+        one. Returns the new name of the journal.
+        """
+        self.close()
+        archived = "{}.{}".format(self._filename, time.strftime("%Y%m%d-%H%M%S"))
+        if os.path.exists(self._snapshot_filename):
+            os.replace(self._snapshot_filename, archived + SNAPSHOT_SUFFIX)
+        if os.path.exists(self._filename):
+            os.replace(self._filename, archived)
+        return archived
+
+    def record_draw(self, draw, index, ballot):
+        self._indices.append(index)
+        self._since_snapshot += 1
+        self._append("draw", draw=draw, index=index,
+                     ballot=ballot.get_physical_ballot_num())
+
+    def record_amend(self, row, ballot):
+        # row is the ballot's place among the audited ballots; with replacement one
+        # ballot can fill several rows, so its audit sequence number does not identify it
+        self._since_snapshot += 1
+        self._append("amend", row=row,
+                     reported=ballot.get_reported_value().get_name(),
+                     actual=ballot.get_actual_value().get_name())
+
+    def record_parameters(self, audit_name, parameters):
+        self._append("parameters", audit=audit_name, parameters=list(parameters))
+
+    def snapshot_due(self):
+        return self._since_snapshot >= self._snapshot_every
+
+    def snapshot(self, audit_, ballots, election_):
+        """
+        Saves the audit engine and the values of the audited ballots as of
+        the last record. The audit must already reflect every record. The
+        file is replaced atomically, so a crash leaves the previous snapshot.
+        """
+        buffer = io.BytesIO()
+        _ElectionPickler(buffer, election_).dump({
+            "audit": audit_,
+            "ballots": [(index, b.get_reported_value().get_name(), b.get_actual_value().get_name())
+                        for index, b in zip(self._indices, ballots)],
+        })
+        header = {"seq": self._seq, "offset": self._stream.tell()}
+
+        temp_filename = self._snapshot_filename + ".tmp"
+        with open(temp_filename, 'wb') as snapshot_file:
+            snapshot_file.write((json.dumps(header) + "\n").encode('utf-8'))
+            snapshot_file.write(buffer.getvalue())
+            snapshot_file.flush()
+            if self._sync:
+                os.fsync(snapshot_file.fileno())
+        os.replace(temp_filename, self._snapshot_filename)
+        self._since_snapshot = 0
+
+    def _load_snapshot(self, election_):
+        # (header, state) of the snapshot, or None if there is none or it is unreadable
+        try:
+            with open(self._snapshot_filename, 'rb') as snapshot_file:
+                header = json.loads(snapshot_file.readline().decode('utf-8'))
+                state = _ElectionUnpickler(snapshot_file, election_).load()
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError, KeyError, AttributeError):
+            return None
+        if header["offset"] > os.path.getsize(self._filename):
+            return None
+        return header, state
+
+    def resume(self, election_):
+        """
+        Rebuilds the session in the journal against `election_` and opens the
+        journal for appending. Returns a Session.
+        """
+        header = self.read_session()
+        if header is None:
+            raise ValueError("{} is not an audit journal".format(self._filename))
+        if header.get("election") is not None and header["election"] != election_key(election_):
+            raise ValueError("{} was written for a different election".format(self._filename))
+        if header["ballot_count"] != election_.get_ballot_count():
+            raise ValueError("{} was written for an election with {} ballots".format(
+                self._filename, header["ballot_count"]))
+
+        results = election_.get_reported_results()
+        ballots = []
+        self._indices = []
+        snapshot = self._load_snapshot(election_)
+        if snapshot is not None:
+            snapshot_header, state = snapshot
+            audit_ = state["audit"]
+            for draw, (index, reported, actual) in enumerate(state["ballots"]):
+                ballot = election_.get_ballot(index)
+                ballot.set_audit_seq_num(draw)
+                ballot.set_reported_value(_contestant(election_, reported))
+                ballot.set_actual_value(_contestant(election_, actual))
+                ballots.append(ballot)
+                self._indices.append(index)
+            records, end = _read_records(self._filename, snapshot_header["offset"])
+            self._seq = snapshot_header["seq"]
+        else:
+            audit_ = _new_audit(header["audit"], header["parameters"], election_)
+            records, end = _read_records(self._filename)
+            self._seq = 0
+
+        # Replay the tail; audits that cannot amend a single ballot are replayed once at the end
+        replay = False
+        for record in records:
+            self._seq = record["seq"] + 1
+            if record["type"] == "draw":
+                ballot = election_.get_ballot(record["index"])
+                ballot.set_audit_seq_num(record["draw"])
+                ballots.append(ballot)
+                self._indices.append(record["index"])
+                if not replay:
+                    audit_.add_ballot(ballot)
+            elif record["type"] == "amend":
+                ballot = ballots[record["row"]]
+                reported = _contestant(election_, record["reported"])
+                actual = _contestant(election_, record["actual"])
+                if replay or not audit_.supports_remove:
+                    ballot.set_reported_value(reported)
+                    ballot.set_actual_value(actual)
+                    replay = True
+                else:
+                    audit_.amend_ballot(ballot, reported, actual)
+            elif record["type"] == "parameters":
+                if record["audit"] != audit_.get_name():
+                    audit_ = _new_audit(record["audit"], record["parameters"], election_)
+                else:
+                    audit_.set_parameters(record["parameters"])
+                replay = True
+        if replay:
+            audit_.recompute(ballots, results)
+
+        self._since_snapshot = len(records)
+        self._open(end)
+        return Session(header["seed"], audit_, ballots, len(ballots))
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+def _new_audit(name, parameters, election_):
+    for audit_class in audit.get_audits():
+        if audit_class.get_name() == name:
+            audit_ = audit_class()
+            audit_.set_parameters(parameters)
+            results = election_.get_reported_results()
+            if isinstance(audit_, audit.Comparison):
+                # Comparison audits are stratified by the reported vote counts
+                reported_choices = {r.get_contestant().get_name(): r.get_votes() for r in results}
+                audit_.init(results, election_.get_ballot_count(), reported_choices)
+            else:
+                audit_.init(results, election_.get_ballot_count())
+            return audit_
+    raise ValueError("Unknown audit type {}".format(name))
@@ -0,0 +1,246 @@
+from math import log
+import numpy as np
+import audit
+from audit import simulation
+
+
+"""
+Sample sizes to plan for before an audit starts. For ballot polling (BRAVO)
+and comparison (Kaplan-Markov) audits the average sample number has a
+closed form, evaluated for whole arrays of contests at once, and the
+distribution of sample sizes comes from simulating the audit's test
+statistic directly: trials x ballots draws are made in blocks and each
+block is one cumulative sum, so no election or ballot objects are built.
+Other audit types fall back to simulation.simulate.
+
+Planning assumes the reported results are correct, i.e. the audit draws
+from an electorate that voted as reported (with the expected discrepancy
+rates, for comparison audits). Sample sizes are counted in draws with
+replacement and are capped at the ballot count, which stands for a full
+hand count.
+"""
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Most cells of the trials x ballots x pairs array handled per block
+BLOCK_CELLS = 1 << 22
+
+
+def _comparison_defaults():
+    # Inflator and expected discrepancy rates, as Comparison starts out with
+    param = [float(value) for _, value in audit.Comparison().get_parameters()]
+    return param[1], param[2:6]
+
+
+def bravo_asn(p_winner, p_loser, risk_limit):
+    """
+    Average sample number of a BRAVO test of one winner/loser pair, from
+    the BRAVO paper. p_winner and p_loser are the fractions of all ballots
+    cast for each, and may be arrays. Pairs the test cannot confirm give inf.
+    """
+    p_winner = np.asarray(p_winner, dtype=float)
+    p_loser = np.asarray(p_loser, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s_w = p_winner / (p_winner + p_loser)
+        log_winner = np.log(2 * s_w)
+        log_loser = np.log(2 * (1 - s_w))
+        drift = p_winner * log_winner + np.where(p_loser > 0, p_loser * log_loser, 0)
+        asn = (log(1 / risk_limit) + log_winner / 2) / drift
+    return np.where(drift > 0, asn, np.inf)
+
+
+def comparison_asn(diluted_margin, risk_limit, inflator=None, rates=None):
+    """
+    Sample size of a Kaplan-Markov comparison audit if discrepancies occur
+    at the expected rates (o1, o2, u1, u2), by the formula Comparison uses
+    for its initial stopping count. diluted_margin may be an array.
+    """
+    default_inflator, default_rates = _comparison_defaults()
+    inflator = default_inflator if inflator is None else inflator
+    o1, o2, u1, u2 = default_rates if rates is None else rates
+
+    diluted_margin = np.asarray(diluted_margin, dtype=float)
+    discrepancies = o1 * log(1 - 1 / (2 * inflator)) + o2 * log(1 - 1 / inflator) + \
+                    u1 * log(1 + 1 / (2 * inflator)) + u2 * log(1 + 1 / inflator)
+    denominator = diluted_margin + 2 * inflator * discrepancies
+    with np.errstate(divide="ignore"):
+        asn = np.ceil(-2 * inflator * log(risk_limit) / denominator)
+    return np.where(denominator > 0, asn, np.inf)
+
+
+def _stopping_times(step_table, probabilities, threshold, trials, max_n, rng, first_block=16):
+    """
+    Simulates `trials` sequences of draws, each draw being row i of
+    step_table (the increment of every pair's statistic) with probability
+    probabilities[i]. Returns the draw at which every pair's cumulative
+    statistic first reaches threshold, or max_n if none did by then.
+
+    Blocks start at first_block draws and double, so easy contests do not
+    pay for draws beyond their stopping times.
+    """
+    cumulative = np.cumsum(probabilities, dtype=float)
+    cumulative /= cumulative[-1]
+    pairs = step_table.shape[1]
+
+    stops = np.full(trials, max_n, dtype=np.int64)
+    active = np.arange(trials)
+    level = np.zeros((trials, pairs))
+    drawn = 0
+    block = max(int(first_block), 1)
+    while active.size and drawn < max_n:
+        block = int(min(block, max(BLOCK_CELLS // (active.size * pairs), 16), max_n - drawn))
+        # Outcome of a draw is the number of cumulative probabilities it passes
+        uniform = rng.random((active.size, block))
+        outcomes = np.zeros(uniform.shape, dtype=np.intp)
+        for bound in cumulative[:-1]:
+            outcomes += uniform >= bound
+        path = level[:, np.newaxis, :] + np.cumsum(step_table[outcomes], axis=1)
+        verified = (path[:, :, 0] if pairs == 1 else path.min(axis=2)) >= threshold
+
+        stopped = verified.any(axis=1)
+        stops[active[stopped]] = drawn + verified[stopped].argmax(axis=1) + 1
+        level = path[~stopped, -1, :]
+        active = active[~stopped]
+        drawn += block
+        block *= 2
+    return stops
+
+
+def simulate_bravo(shares, ballot_count, risk_limit, trials, rng, first_block=16):
+    """
+    Sample sizes of `trials` BRAVO audits of a contest whose candidates got
+    the given fractions of all ballots, the reported winner first; the rest
+    of the ballots are undervotes, overvotes or write-ins.
+    """
+    shares = np.asarray(shares, dtype=float)
+    s_wl = shares[0] / (shares[0] + shares[1:])
+
+    # Row 0 is a vote for the winner, row i a vote for loser i, the last row anything else
+    step_table = np.zeros((len(shares) + 1, len(shares) - 1))
+    step_table[0] = np.log(2 * s_wl)
+    step_table[np.arange(1, len(shares)), np.arange(len(shares) - 1)] = np.log(2 * (1 - s_wl))
+    probabilities = np.append(shares, max(0.0, 1 - shares.sum()))
+    return _stopping_times(step_table, probabilities, log(1 / risk_limit), trials, ballot_count, rng,
+                           first_block)
+
+
+def simulate_comparison(diluted_margin, ballot_count, risk_limit, trials, rng,
+                        inflator=None, rates=None, first_block=16):
+    # Sample sizes of `trials` comparison audits with discrepancies at the expected rates
+    default_inflator, default_rates = _comparison_defaults()
+    inflator = default_inflator if inflator is None else inflator
+    rates = default_rates if rates is None else rates
+
+    # -log of the Kaplan-Markov P-value grows by this much per match, o1, o2, u1 and u2
+    log_match = log(1 - diluted_margin / (2 * inflator))
+    step_table = -log_match + np.array([[0],
+                                        [log(1 - 1 / (2 * inflator))],
+                                        [log(1 - 1 / inflator)],
+                                        [log(1 + 1 / (2 * inflator))],
+                                        [log(1 + 1 / inflator)]])
+    probabilities = np.array([max(0.0, 1 - sum(rates))] + list(rates))
+    return _stopping_times(step_table, probabilities, -log(risk_limit), trials, ballot_count, rng,
+                           first_block)
+
+
+def summarize(stops, ballot_count, asn=None):
+    # Analytic ASN (or None), mean, QUANTILES and full hand count rate of simulated sample sizes
+    summary = {"asn": None if asn is None else float(min(asn, ballot_count))}
+    if len(stops) == 0:
+        summary["mean"] = summary["asn"]
+        summary["full_hand_count_rate"] = None
+        for q in QUANTILES:
+            summary[q] = None
+        return summary
+
+    summary["mean"] = float(np.mean(stops))
+    summary["full_hand_count_rate"] = float(np.mean(stops >= ballot_count))
+    for q, value in zip(QUANTILES, np.quantile(stops, QUANTILES)):
+        summary[q] = float(value)
+    return summary
+
+
+def _votes(result, ballot_count):
+    return result.get_votes() or result.get_percentage() * ballot_count
+
+
+def _plan_shares(shares, ballot_count, risk_limit, audit_types, trials, rng,
+                 inflator, rates, names=None):
+    # shares: fractions of all ballots per candidate, reported winner first
+    plans = {}
+    for audit_type in audit_types:
+        if len(shares) < 2:
+            # An uncontested race has no outcome to confirm, so no ballots are sampled
+            if audit_type not in ("polling", "rla", "comparison") and audit_type not in simulation.AUDIT_TYPES:
+                raise ValueError("Unknown audit type {!r}".format(audit_type))
+            plans[audit_type] = summarize(np.zeros(trials, dtype=np.int64), ballot_count, 0)
+            continue
+
+        if audit_type in ("polling", "rla"):
+            asn = np.max(bravo_asn(shares[0], shares[1:], risk_limit))
+            simulate = lambda: simulate_bravo(shares, ballot_count, risk_limit, trials, rng,
+                                              first_block=asn / 2)
+        elif audit_type == "comparison":
+            margin = shares[0] - shares[1]
+            asn = comparison_asn(margin, risk_limit, inflator, rates)
+            simulate = lambda: simulate_comparison(margin, ballot_count, risk_limit, trials, rng,
+                                                   inflator, rates, first_block=asn / 2)
+        elif audit_type in simulation.AUDIT_TYPES:
+            # No closed form; run the audit itself on synthetic elections
+            asn = None
+            if names is None:
+                names = ["Candidate {}".format(i) for i in range(len(shares))]
+            simulate = lambda: simulation.simulate(names, shares, ballot_count, 0, audit_type,
+                                                   risk_limit, trials, seed=int(rng.integers(2 ** 63)))
+        else:
+            raise ValueError("Unknown audit type {!r}".format(audit_type))
+
+        if trials == 0:
+            stops = np.zeros(0, dtype=np.int64)
+        elif asn is not None and np.isinf(asn):
+            # Contests the audit cannot confirm need a full hand count in every trial
+            stops = np.full(trials, ballot_count, dtype=np.int64)
+        else:
+            stops = simulate()
+        plans[audit_type] = summarize(stops, ballot_count, asn)
+    return plans
+
+
+def plan(contests, ballot_count, risk_limit, audit_types=("polling", "comparison"),
+         trials=1000, seed=None, inflator=None, rates=None):
+    """
+    Plans audits of many contests in one call. contests is a list of lists
+    of reported Results (or of Contests); ballot_count is one count for all
+    of them or one per contest. Returns, per contest, a dict from audit type
+    to a summary with the analytic average sample number "asn" (None where
+    there is no closed form), the simulated "mean", QUANTILES and
+    "full_hand_count_rate". With trials=0 only the ASN is computed.
+    """
+    rng = np.random.default_rng(seed)
+    ballot_counts = np.broadcast_to(np.asarray(ballot_count), (len(contests),))
+
+    plans = []
+    for contest, count in zip(contests, ballot_counts):
+        results = contest.get_reported_results() if hasattr(contest, "get_reported_results") else contest
+        results = sorted(results, key=lambda r: r.get_percentage(), reverse=True)
+        shares = np.array([_votes(r, count) / count for r in results], dtype=float)
+        names = [r.get_contestant().get_name() for r in results]
+        plans.append(_plan_shares(shares, int(count), risk_limit, audit_types, trials, rng,
+                                  inflator, rates, names))
+    return plans
+
+
+def plan_margins(margins, ballot_count, risk_limit, audit_types=("polling", "comparison"),
+                 trials=1000, seed=None, inflator=None, rates=None):
+    """
+    Plans two-candidate contests over a grid of margins (winner's share minus
+    loser's share of all ballots), e.g. to tabulate sample sizes ahead of an
+    election. Returns one dict per margin, as plan does.
+    """
+    rng = np.random.default_rng(seed)
+    plans = []
+    for margin in np.atleast_1d(margins):
+        shares = np.array([(1 + margin) / 2, (1 - margin) / 2])
+        plans.append(_plan_shares(shares, int(ballot_count), risk_limit, audit_types, trials, rng,
+                                  inflator, rates))
+    return plans
@@ -0,0 +1,63 @@
+import hashlib
+import numpy as np
+
+
+"""
+Reproducible ballot sampling. The k-th draw is read directly from
+SHA-256("<seed>,<k>"), as in Rivest's sampler, so an observer who knows the
+seed can recompute any draw without replaying the earlier ones. Draws are
+with replacement and numbered from 0.
+"""
+
+
+def draw(seed, k, population):
+    # Index in [0, population) of the k-th ballot drawn with this seed
+    digest = hashlib.sha256("{},{}".format(seed, k).encode('utf-8')).hexdigest()
+    return int(digest, 16) % population
+
+
+def draws(seed, population, count, start=0):
+    """
+    Draws start .. start + count - 1 as an int64 array, equal to calling
+    draw for each. Hashing still takes one hashlib call per draw, from a
+    copy of a hash that has already taken the "<seed>," prefix; the 256-bit
+    digests are then reduced modulo the population together, one byte at a
+    time, instead of as Python integers.
+    """
+    prefix = hashlib.sha256("{},".format(seed).encode('utf-8'))
+    digests = bytearray()
+    for k in range(start, start + count):
+        sha = prefix.copy()
+        sha.update(str(k).encode('utf-8'))
+        digests += sha.digest()
+    octets = np.frombuffer(bytes(digests), dtype=np.uint8).reshape(count, 32)
+
+    if population >= 1 << 55:
+        # remainder * 256 could overflow int64
+        return np.array([int.from_bytes(row.tobytes(), 'big') % population for row in octets], dtype=np.int64)
+    remainder = np.zeros(count, dtype=np.int64)
+    for column in range(32):
+        remainder = (remainder * 256 + octets[:, column]) % population
+    return remainder
+
+
+def pull_list(seed, population, count, batches=None, start=0):
+    """
+    Returns the first `count` draws as a retrieval list: a record array with
+    one row per distinct ballot, holding the ballot index, the first draw
+    that selected it and the number of times it was drawn. Rows are sorted
+    by batch (e.g. box or scanner; batches[i] is the batch of ballot i) and
+    then by ballot index, so the ballots can be pulled in one pass.
+    """
+    sample = draws(seed, population, count, start)
+    ballots, first, times = np.unique(sample, return_index=True, return_counts=True)
+
+    pulls = np.zeros(len(ballots), dtype=[('batch', np.int64),
+                                          ('ballot', np.int64),
+                                          ('draw', np.int64),
+                                          ('times', np.int64)])
+    pulls['batch'] = np.asarray(batches)[ballots] if batches is not None else 0
+    pulls['ballot'] = ballots
+    pulls['draw'] = first + start
+    pulls['times'] = times
+    return pulls[np.lexsort((pulls['ballot'], pulls['batch']))]
@@ -0,0 +1,107 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import audit
+import data_gen
+
+
+"""
+Monte Carlo estimate of audit workload. Each trial generates a synthetic
+election, draws ballots from it with replacement and feeds them to an audit
+until it verifies the results; an audit that has not stopped after as many
+draws as there are ballots counts as a full hand count.
+
+Trials run in fixed-size chunks across a process pool. Every chunk gets its
+own seed spawned from one SeedSequence, so the results depend only on the
+seed, never on the number of workers.
+"""
+
+AUDIT_TYPES = {"rla": audit.BallotPolling,
+               "polling": audit.BallotPolling,
+               "comparison": audit.Comparison,
+               "bayesian": audit.Bayesian,
+               "minerva": audit.Minerva,
+               "shangrla": audit.Shangrla}
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def new_audit(audit_type, results, ballot_count, risk_limit):
+    rla = AUDIT_TYPES[audit_type]()
+    if isinstance(rla, audit.Comparison):
+        param = [value for _, value in rla.get_parameters()]
+        param[0] = risk_limit * 100
+        rla.set_parameters(param)
+        reported_choices = {r.get_contestant().get_name(): r.get_votes() for r in results}
+        rla.init(results, ballot_count, reported_choices)
+    elif isinstance(rla, audit.Bayesian):
+        rla.risk_limit_m = risk_limit
+        rla.init(results, ballot_count)
+    else:
+        rla.set_risk_limit(risk_limit)
+        rla.init(results, ballot_count)
+    return rla
+
+
+def ballots_to_stop(rla, ballots, rng):
+    # Ballots drawn before the audit verified the results, or len(ballots) for a full hand count
+    sample = rng.integers(0, len(ballots), size=len(ballots))
+    if isinstance(rla, audit.BallotPolling):
+        # BRAVO replays the whole sample as one array operation
+        stop = rla.stopping_index(rla.get_actual_codes(ballots)[sample])
+        return stop + 1 if stop >= 0 else len(ballots)
+    if isinstance(rla, audit.Shangrla):
+        rla.compute_batch(rla.get_codes(ballots, actual=False)[sample], rla.get_codes(ballots)[sample])
+        stop = rla.stopping_index()
+        return stop + 1 if stop >= 0 else len(ballots)
+
+    for drawn, index in enumerate(sample, 1):
+        rla.compute(ballots[index])
+        status = rla.get_status()
+        if status == rla.status_codes[1]:
+            return drawn
+        if status != rla.status_codes[0]:
+            break
+    return len(ballots)
+
+
+def _run_chunk(candidate_names, vote_shares, num_votes, error_rate, audit_type,
+               risk_limit, trials, seed_sequence):
+    rng = np.random.default_rng(seed_sequence)
+    stops = np.empty(trials, dtype=np.int64)
+
+    for t in range(trials):
+        synthetic = data_gen.Synthetic(candidate_names, vote_shares)
+        synthetic.gen_ballots(num_votes, error_rate, rng)
+        ballots = synthetic.get_election().get_ballots()
+
+        rla = new_audit(audit_type, synthetic.get_reported_results(), num_votes, risk_limit)
+        stops[t] = ballots_to_stop(rla, ballots, rng)
+    return stops
+
+
+def simulate(candidate_names, vote_shares, num_votes, error_rate, audit_type,
+             risk_limit, num_trials, seed=None, max_workers=None, chunk_size=50):
+    """
+    Runs num_trials simulated audits and returns the number of ballots each
+    one examined before stopping. error_rate and risk_limit are fractions.
+    """
+    if audit_type not in AUDIT_TYPES:
+        raise ValueError("Unknown audit type {!r}".format(audit_type))
+
+    chunks = [min(chunk_size, num_trials - start) for start in range(0, num_trials, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_run_chunk, candidate_names, vote_shares, num_votes,
+                                   error_rate, audit_type, risk_limit, trials, chunk_seed)
+                   for trials, chunk_seed in zip(chunks, seeds)]
+        return np.concatenate([f.result() for f in futures])
+
+
+def summarize(stops, num_votes):
+    # Mean, quantiles and full hand count rate of the ballots examined per audit
+    summary = {"mean": float(np.mean(stops)),
+               "full_hand_count_rate": float(np.mean(stops >= num_votes))}
+    for q, value in zip(QUANTILES, np.quantile(stops, QUANTILES)):
+        summary[q] = float(value)
+    return summary
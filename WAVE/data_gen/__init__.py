@@ -1,2 +1,3 @@
 from data_gen.pres2016 import Pres2016
-from data_gen.rispecial import Rispecial
\ No newline at end of file
+from data_gen.rispecial import Rispecial
+from data_gen.synthetic import Synthetic
@@ -0,0 +1,250 @@
+import csv
+import json
+import os
+import numpy as np
+import election
+
+
+"""
+Streaming loader for cast vote record (CVR) files with one ballot per row.
+The file is read once by a single csv reader, so quoted fields may hold
+line breaks, and the byte offset of every row is taken from where the reader
+starts it. Rows are converted to id columns with NumPy in chunks, so memory
+use stays flat however large the manifest is.
+"""
+
+
+def _rows(cvr_file):
+    # (row, byte offset) of each record from the current position; a record may span lines
+    position = cvr_file.tell()
+
+    def lines():
+        nonlocal position
+        for line in cvr_file:
+            position += len(line)
+            yield line.decode('utf-8')
+
+    start = position
+    # The reader pulls lines only as it needs them, so position is the end of each record
+    for row in csv.reader(lines()):
+        yield row, start
+        start = position
+
+
+def load_cvr(filename, contestants, number_column=0, vote_column=-1,
+             default=None, chunk_size=1 << 20):
+    """
+    Returns (ballots, tally, row_offsets): a BallotStore with one ballot per
+    data row, a dict of contestant id to reported votes, and the byte offset
+    of every data row. Votes not naming a contestant are recorded for
+    `default`; without a default they raise a ValueError.
+    """
+    ids_by_name = {c.get_name(): c.get_id() for c in contestants}
+    default_id = default.get_id() if default is not None else None
+
+    physical_chunks = []
+    reported_chunks = []
+    offset_chunks = []
+    tally = {}
+
+    with open(filename, 'rb') as cvr_file:
+        cvr_file.readline()  # Skip header
+        records = _rows(cvr_file)
+
+        exhausted = False
+        while not exhausted:
+            # Whole records making up at least chunk_size bytes, blank lines left out
+            rows = []
+            starts = []
+            chunk_start = None
+            exhausted = True
+            for row, start in records:
+                if chunk_start is None:
+                    chunk_start = start
+                if row:
+                    rows.append(row)
+                    starts.append(start)
+                if start - chunk_start >= chunk_size:
+                    exhausted = False
+                    break
+            if not rows:
+                continue
+
+            # Map each distinct vote in the chunk to a contestant id once
+            votes, inverse = np.unique([row[vote_column] for row in rows], return_inverse=True)
+            vote_ids = np.empty(len(votes), dtype=np.int32)
+            for i, vote in enumerate(votes):
+                if vote in ids_by_name:
+                    vote_ids[i] = ids_by_name[vote]
+                elif default is not None:
+                    vote_ids[i] = default_id
+                else:
+                    raise ValueError("Unknown vote {!r} in {}".format(vote, filename))
+            reported = vote_ids[inverse.reshape(-1)]
+
+            physical_chunks.append(np.array([row[number_column] for row in rows]).astype(np.int32))
+            reported_chunks.append(reported)
+            offset_chunks.append(np.array(starts, dtype=np.int64))
+
+            ids, counts = np.unique(reported, return_counts=True)
+            for contestant_id, count in zip(ids, counts):
+                tally[int(contestant_id)] = tally.get(int(contestant_id), 0) + int(count)
+
+    physical = np.concatenate(physical_chunks) if physical_chunks else np.zeros(0, dtype=np.int32)
+    reported = np.concatenate(reported_chunks) if reported_chunks else np.zeros(0, dtype=np.int32)
+    row_offsets = np.concatenate(offset_chunks) if offset_chunks else np.zeros(0, dtype=np.int64)
+
+    registered = list(contestants) + ([default] if default is not None else [])
+    # Actual values start out as the reported ones until they are audited
+    ballots = election.BallotStore.from_arrays(physical,
+                                               np.arange(len(physical)),
+                                               reported,
+                                               reported,
+                                               registered)
+    return ballots, tally, row_offsets
+
+
+def read_cvr_row(filename, row_offsets, index):
+    # Parses a single data row using the offsets returned by load_cvr
+    with open(filename, 'rb') as cvr_file:
+        cvr_file.seek(int(row_offsets[index]))
+        return next(_rows(cvr_file))[0]
+
+
+# Binary cache layout: magic, header length (uint64), JSON header, padding to a
+# multiple of 8 bytes, then one fixed-width record per ballot
+CACHE_MAGIC = b"WAVECVR1"
+CACHE_RECORD = np.dtype([('physical', '<i4'),
+                         ('audit_seq', '<i4'),
+                         ('reported', '<i4'),
+                         ('actual', '<i4'),
+                         ('offset', '<i8')])
+
+
+def _load_key(contestants, number_column=0, vote_column=-1, default=None, chunk_size=None):
+    # Arguments of load_cvr that change what it returns; a cache is only valid for the same ones
+    return {"contestants": [[c.get_id(), c.get_name()] for c in contestants],
+            "number_column": number_column,
+            "vote_column": vote_column,
+            "default": None if default is None else [default.get_id(), default.get_name()]}
+
+
+def build_cvr_cache(filename, cache_filename, contestants, **load_kwargs):
+    """
+    Parses a CVR file once with load_cvr and writes it to cache_filename as
+    fixed-width binary records, together with the contest and candidate
+    dictionary, the arguments it was loaded with and the size and
+    modification time of the source file.
+    """
+    ballots, tally, row_offsets = load_cvr(filename, contestants, **load_kwargs)
+
+    with open(filename, 'rb') as cvr_file:
+        contest = next(csv.reader([cvr_file.readline().decode('utf-8-sig')]))[-1]
+    source = os.stat(filename)
+    header = json.dumps({"contest": contest,
+                         "contestants": [[c.get_id(), c.get_name()] for c in ballots.get_contestants()],
+                         "tally": [[k, v] for k, v in tally.items()],
+                         "rows": len(ballots),
+                         "load": _load_key(contestants, **load_kwargs),
+                         "source_size": source.st_size,
+                         "source_mtime": source.st_mtime}).encode('utf-8')
+    padding = -(len(CACHE_MAGIC) + 8 + len(header)) % 8
+
+    records = np.zeros(len(ballots), dtype=CACHE_RECORD)
+    records['physical'] = ballots.get_physical_ballot_nums()
+    records['audit_seq'] = ballots.get_audit_seq_nums()
+    records['reported'] = ballots.get_reported_ids()
+    records['actual'] = ballots.get_actual_ids()
+    records['offset'] = row_offsets
+
+    # Written beside the cache and moved into place, so a crash never leaves a
+    # cache whose header is fresh but whose records are cut short
+    tmp_filename = cache_filename + ".tmp"
+    try:
+        with open(tmp_filename, 'wb') as cache_file:
+            cache_file.write(CACHE_MAGIC)
+            cache_file.write(np.uint64(len(header)).tobytes())
+            cache_file.write(header + b" " * padding)
+            records.tofile(cache_file)
+            cache_file.flush()
+            os.fsync(cache_file.fileno())
+        os.replace(tmp_filename, cache_filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def _read_cache_header(cache_filename):
+    with open(cache_filename, 'rb') as cache_file:
+        if cache_file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+            raise ValueError("{} is not a CVR cache".format(cache_filename))
+        length = int(np.frombuffer(cache_file.read(8), dtype=np.uint64)[0])
+        header = json.loads(cache_file.read(length).decode('utf-8'))
+    data_offset = len(CACHE_MAGIC) + 8 + length
+    return header, data_offset + (-data_offset % 8)
+
+
+def open_cvr_cache(cache_filename, contestants=()):
+    """
+    Memory-maps a cache written by build_cvr_cache and returns (ballots,
+    tally, row_offsets) like load_cvr, without parsing any rows. The map is
+    copy-on-write, so audited values never modify the cache file. Passing the
+    election's contestants reuses them instead of rebuilding them by id.
+    """
+    header, data_offset = _read_cache_header(cache_filename)
+    records = np.memmap(cache_filename, dtype=CACHE_RECORD, mode='c',
+                        offset=data_offset, shape=(header["rows"],))
+
+    known = {c.get_id(): c for c in contestants}
+    registered = []
+    for contestant_id, name in header["contestants"]:
+        if contestant_id in known:
+            registered.append(known[contestant_id])
+        elif contestant_id == election.Undervote.CID:
+            registered.append(election.Undervote())
+        elif contestant_id == election.Overvote.CID:
+            registered.append(election.Overvote())
+        else:
+            registered.append(election.Contestant(contestant_id, name))
+
+    ballots = election.BallotStore.from_arrays(records['physical'],
+                                               records['audit_seq'],
+                                               records['reported'],
+                                               records['actual'],
+                                               registered,
+                                               copy=False)
+    tally = {k: v for k, v in header["tally"]}
+    return ballots, tally, records['offset']
+
+
+def load_cvr_cached(filename, contestants, cache_filename=None, **load_kwargs):
+    """
+    Opens the binary cache of a CVR file, building it first if it is missing,
+    older than the CVR file or built with other contestants or load_cvr
+    arguments. Falls back to parsing the CSV if the cache cannot be written.
+    """
+    if cache_filename is None:
+        cache_filename = os.path.splitext(filename)[0] + ".wavecvr"
+
+    source = os.stat(filename)
+    try:
+        header, data_offset = _read_cache_header(cache_filename)
+        stale = (header["source_size"] != source.st_size or
+                 header["source_mtime"] != source.st_mtime or
+                 header.get("load") != _load_key(contestants, **load_kwargs) or
+                 os.path.getsize(cache_filename) != data_offset + header["rows"] * CACHE_RECORD.itemsize)
+    except (OSError, ValueError, KeyError):
+        stale = True
+
+    if not stale:
+        try:
+            return open_cvr_cache(cache_filename, contestants)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    try:
+        build_cvr_cache(filename, cache_filename, contestants, **load_kwargs)
+        return open_cvr_cache(cache_filename, contestants)
+    except OSError:
+        return load_cvr(filename, contestants, **load_kwargs)
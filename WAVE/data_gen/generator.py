@@ -0,0 +1,72 @@
+import random
+import numpy as np
+import election
+
+
+"""
+Vectorized generation of synthetic ballots. Reported values are laid out
+candidate by candidate, errors are assigned to whole slices of them, and a
+single permutation shuffles the result into a BallotStore, so a million
+ballots take a fraction of a second.
+"""
+
+
+def default_rng():
+    # Seeded from the random module, so random.seed() still makes runs reproducible
+    return np.random.default_rng(random.getrandbits(64))
+
+
+def gen_ballot_store(contestants, votes, rng=None, count=None,
+                     overstatement=0.0, understatement=0.0, undervote=0.0, overvote=0.0):
+    """
+    Returns a shuffled BallotStore with votes[i] ballots reported for
+    contestants[i]. Physical ballot numbers are drawn without replacement
+    from range(count), which defaults to the number of ballots. Error rates
+    are fractions:
+
+    overstatement  -- of the reported winner's ballots, actually for the runner-up
+    understatement -- of the runner-up's ballots, actually for the reported winner
+    undervote      -- of all ballots, actually blank
+    overvote       -- of all ballots, actually overvoted
+
+    Undervotes and overvotes replace ballots that are still correct, chosen at
+    random, and stop short if too few are left.
+    """
+    if rng is None:
+        rng = default_rng()
+    votes = np.asarray(votes, dtype=np.int64)
+    ids = np.array([c.get_id() for c in contestants], dtype=np.int32)
+    total = int(votes.sum())
+    if count is None:
+        count = total
+
+    reported = np.repeat(ids, votes)
+    actual = reported.copy()
+    registered = list(contestants)
+
+    order = np.argsort(-votes, kind="stable")
+    if len(order) > 1:
+        winner, runner_up = ids[order[0]], ids[order[1]]
+        winner_ballots = np.flatnonzero(reported == winner)
+        runner_up_ballots = np.flatnonzero(reported == runner_up)
+        actual[winner_ballots[:_error_count(overstatement, len(winner_ballots))]] = runner_up
+        actual[runner_up_ballots[:_error_count(understatement, len(runner_up_ballots))]] = winner
+
+    for rate, invalid in ((undervote, election.Undervote), (overvote, election.Overvote)):
+        if rate:
+            correct = np.flatnonzero(actual == reported)
+            count_invalid = min(len(correct), _error_count(rate, total))
+            actual[rng.choice(correct, count_invalid, replace=False)] = invalid.CID
+            registered.append(invalid())
+
+    shuffled = rng.permutation(total)
+    return election.BallotStore.from_arrays(rng.permutation(count)[:total],
+                                            np.arange(total),
+                                            reported[shuffled],
+                                            actual[shuffled],
+                                            registered)
+
+
+def _error_count(rate, ballots):
+    # Any nonzero rate changes at least one ballot, as in the original generators
+    return min(ballots, int(np.ceil(rate * ballots)))
@@ -1,6 +1,5 @@
-import math
-from random import shuffle, choice
 import election
+from data_gen import generator
 
 
 class Pres2016:
@@ -40,43 +39,18 @@ class Pres2016:
     def get_reported_results(self):
         return self._results
 
-    def gen_ballots(self, count, error):
-        sorted_results = sorted(self._results, 
-                                key=lambda r: r.get_percentage(),
-                                reverse=True)
+    def gen_ballots(self, count, error, rng=None, **error_rates):
+        """
+        Generates `count` ballots split by the reported percentages. A fraction
+        `error` of the winner's ballots were actually cast for the runner-up;
+        further error_rates are passed on to generator.gen_ballot_store.
+        """
+        votes = [int(r.get_percentage() * count) for r in self._results]
+        ballots = generator.gen_ballot_store(self._contestants, votes, rng, count,
+                                             overstatement=error, **error_rates)
 
-        ballots = []
-        audit_counts = [i for i in range(count)]
-
-        for i, result in enumerate(sorted_results):
-            for j in range(int(result.get_percentage() * count)):
-                current_count = choice(audit_counts)
-                audit_counts.remove(current_count)
-
-                ballot = election.Ballot()
-
-                ballot.set_physical_ballot_num(current_count)
-                ballot.set_reported_value(result.get_contestant())
-
-                if i == 0 and j < error * result.get_percentage() * count:
-                    ballot.set_actual_value(sorted_results[i + 1].get_contestant())
-                else:
-                    ballot.set_actual_value(result.get_contestant())
-
-                ballots.append(ballot)
-                
-                for r in self._results:
-                    if r.get_contestant() == ballot.get_reported_value():
-                        r.set_votes(r.get_votes() + 1)
-                        break
-
-        shuffle(ballots)
-        shuffle(ballots)
-        shuffle(ballots)
-
-        for i, ballot in enumerate(ballots):
-            ballot.set_audit_seq_num(i)
+        for r, vote_count in zip(self._results, votes):
+            r.set_votes(r.get_votes() + vote_count)
 
         self._ballots = ballots
         self._election.set_ballots(ballots)
-
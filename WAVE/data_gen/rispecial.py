@@ -1,7 +1,7 @@
 import math
 from random import shuffle, choice
 import election
-import csv
+from data_gen import cvr
 
 
 class Rispecial:
@@ -44,35 +44,14 @@ class Rispecial:
         return self._results
 
     def gen_ballots(self, filename):
-        ballots = []
-        #vote_num = 0
-
-        with open(filename, 'r') as csvfile:
-            csvfile.readline()  # Skip first line
-            readCSV = csv.reader(csvfile, delimiter=',')
-            i = 0
-            for cvr, precinct, ballot_style, vote in readCSV:
-                ballot = election.Ballot()
-                ballot.set_physical_ballot_num(int(cvr))
-                ballot.set_audit_seq_num(int(i))
-                #vote_num = vote_num + 1
-                print("CVR VALUE: " + cvr)
-
-                self.total_ballots = self.total_ballots + 1
-                if vote == 'Reject':
-                    ballot.set_reported_value(self._contestants[1])
-                    ballot.set_actual_value(self._contestants[1])
-                    self.num_reject = self.num_reject + 1
-                else:
-                    ballot.set_reported_value(self._contestants[0])
-                    ballot.set_actual_value(self._contestants[0])
-                    self.num_approve = self.num_approve + 1
-
-                ballots.append(ballot)
-                i = i + 1
-
-        # for i, ballot in enumerate(ballots):
-        #     ballot.set_audit_seq_num(ballot.get_physical_ballot_num())
+        # Anything other than a Reject vote has always been counted as Approve
+        # Reopening the same manifest maps the binary cache instead of parsing it again
+        ballots, tally, self._row_offsets = cvr.load_cvr_cached(filename,
+                                                                self._contestants,
+                                                                default=self._contestants[0])
+        self.total_ballots = len(ballots)
+        self.num_approve = tally.get(self._contestants[0].get_id(), 0)
+        self.num_reject = tally.get(self._contestants[1].get_id(), 0)
 
         self._ballots = ballots
         self._election.set_ballots(ballots)
@@ -0,0 +1,49 @@
+import numpy as np
+import election
+from data_gen import generator
+
+
+class Synthetic:
+    """
+    Election with arbitrary candidates and vote shares, e.g. read from an
+    election results file, for simulating audits. Shares are normalized, so
+    percentages that do not add up to 100 are fine.
+    """
+
+    def __init__(self, candidate_names, vote_shares):
+        self._election = election.Election()
+
+        self._contestants = [election.Contestant(i, name) for i, name in enumerate(candidate_names)]
+        self._election.set_contestants(self._contestants)
+
+        shares = np.asarray(vote_shares, dtype=float)
+        self._shares = shares / shares.sum()
+        self._results = [election.Result(c, s) for c, s in zip(self._contestants, self._shares)]
+        self._election.set_reported_results(self._results)
+
+    def get_election(self):
+        return self._election
+
+    def get_reported_results(self):
+        return self._results
+
+    def gen_ballots(self, count, error, rng=None, **error_rates):
+        """
+        Generates `count` ballots reported according to the vote shares. A
+        fraction `error` of the reported winner's ballots were actually cast
+        for the runner-up, as in Pres2016; further error_rates are passed on
+        to generator.gen_ballot_store.
+        """
+        votes = np.floor(self._shares * count).astype(np.int64)
+        order = np.argsort(-self._shares, kind="stable")
+        # Hand the ballots lost to rounding to the leading candidates
+        votes[order[:count - votes.sum()]] += 1
+
+        ballots = generator.gen_ballot_store(self._contestants, votes, rng,
+                                             overstatement=error, **error_rates)
+
+        for result, vote_count in zip(self._results, votes):
+            result.set_votes(int(vote_count))
+
+        self._ballots = ballots
+        self._election.set_ballots(ballots)
@@ -4,6 +4,9 @@ class Ballot:
         self._physical_ballot_num = -1
         self._reported_value = None
         self._actual_value = None
+        # Values for ballots carrying several contests, keyed by contest id
+        self._contest_reported_values = {}
+        self._contest_actual_values = {}
 
     def get_audit_seq_num(self):
         return self._audit_seq_num
@@ -29,3 +32,18 @@ class Ballot:
     def set_actual_value(self, actual_value):
         self._actual_value = actual_value
 
+    def get_contest_ids(self):
+        # Ids of the contests this ballot carries values for
+        return sorted(set(self._contest_reported_values) | set(self._contest_actual_values))
+
+    def get_contest_reported_value(self, contest_id):
+        return self._contest_reported_values.get(contest_id)
+
+    def set_contest_reported_value(self, contest_id, reported_value):
+        self._contest_reported_values[contest_id] = reported_value
+
+    def get_contest_actual_value(self, contest_id):
+        return self._contest_actual_values.get(contest_id)
+
+    def set_contest_actual_value(self, contest_id, actual_value):
+        self._contest_actual_values[contest_id] = actual_value
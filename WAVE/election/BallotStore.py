@@ -0,0 +1,240 @@
+import numpy as np
+
+
+"""
+Columnar storage for the ballots of an election. Each attribute of a ballot
+is one int32 column, and contestants are stored by id, so a ballot costs 16
+bytes instead of a Python object. Indexing the store returns a BallotView,
+which has the same getters and setters as election.Ballot and reads and
+writes the columns directly. Ballots carrying several contests get a
+reported and an actual column per contest, added when the first ballot for
+that contest arrives.
+"""
+
+# Id stored when a ballot has no reported or actual value yet
+NO_VALUE = -1
+
+
+class BallotView:
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def get_index(self):
+        return self._index
+
+    def get_audit_seq_num(self):
+        return int(self._store._audit_seq[self._index])
+
+    def set_audit_seq_num(self, audit_seq_num):
+        self._store._write("_audit_seq", self._index, audit_seq_num)
+
+    def get_physical_ballot_num(self):
+        return int(self._store._physical[self._index])
+
+    def set_physical_ballot_num(self, physical_ballot_num):
+        self._store._write("_physical", self._index, physical_ballot_num)
+
+    def get_reported_value(self):
+        return self._store.get_contestant(self._store._reported[self._index])
+
+    def set_reported_value(self, reported_value):
+        self._store._reported[self._index] = self._store.register_contestant(reported_value)
+
+    def get_actual_value(self):
+        return self._store.get_contestant(self._store._actual[self._index])
+
+    def set_actual_value(self, actual_value):
+        self._store._actual[self._index] = self._store.register_contestant(actual_value)
+
+    def get_contest_ids(self):
+        return self._store.get_contest_ids(self._index)
+
+    def get_contest_reported_value(self, contest_id):
+        return self._store._get_contest_value(self._store._contest_reported, contest_id, self._index)
+
+    def set_contest_reported_value(self, contest_id, reported_value):
+        self._store._set_contest_value(self._store._contest_reported, contest_id, self._index, reported_value)
+
+    def get_contest_actual_value(self, contest_id):
+        return self._store._get_contest_value(self._store._contest_actual, contest_id, self._index)
+
+    def set_contest_actual_value(self, contest_id, actual_value):
+        self._store._set_contest_value(self._store._contest_actual, contest_id, self._index, actual_value)
+
+
+def _register(contestants, contestant):
+    # Adds a contestant to an id -> contestant table; an id stands for one contestant only
+    registered = contestants.setdefault(contestant.get_id(), contestant)
+    if registered != contestant:
+        raise ValueError("Contestant id {} is already used by {!r}, not {!r}".format(
+            contestant.get_id(), registered.get_name(), contestant.get_name()))
+    return contestant.get_id()
+
+
+class BallotStore:
+    _column_names = ("_physical", "_audit_seq", "_reported", "_actual")
+
+    def __init__(self, capacity=16):
+        self._size = 0
+        self._contestants = {}
+        # Contest id -> column of contestant ids, and contest id -> {contestant id: contestant};
+        # contestant ids are only unique within a contest
+        self._contest_reported = {}
+        self._contest_actual = {}
+        self._contest_contestants = {}
+        # Value -> set of ballot indices for the columns that are searched, built on first use
+        self._indexes = {"_physical": None, "_audit_seq": None}
+        for name in BallotStore._column_names:
+            setattr(self, name, np.full(capacity, NO_VALUE, dtype=np.int32))
+
+    @classmethod
+    def from_arrays(cls, physical, audit_seq, reported_ids, actual_ids, contestants, copy=True):
+        # With copy=False the columns are used as given, e.g. memory-mapped arrays
+        column = np.array if copy else np.asarray
+        store = cls(capacity=0)
+        store._physical = column(physical, dtype=np.int32)
+        store._audit_seq = column(audit_seq, dtype=np.int32)
+        store._reported = column(reported_ids, dtype=np.int32)
+        store._actual = column(actual_ids, dtype=np.int32)
+        store._size = len(store._physical)
+        for contestant in contestants:
+            store.register_contestant(contestant)
+        return store
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [BallotView(self, i) for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ballot index out of range")
+        return BallotView(self, index)
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield BallotView(self, i)
+
+    def copy(self):
+        return self[:]
+
+    def _grow(self, minimum):
+        capacity = max(2 * len(self._physical), minimum, 16)
+        for name in BallotStore._column_names:
+            column = np.full(capacity, NO_VALUE, dtype=np.int32)
+            column[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, column)
+        for columns in (self._contest_reported, self._contest_actual):
+            for contest_id, old in columns.items():
+                column = np.full(capacity, NO_VALUE, dtype=np.int32)
+                column[:self._size] = old[:self._size]
+                columns[contest_id] = column
+
+    def append(self, ballot):
+        if self._size == len(self._physical):
+            self._grow(self._size + 1)
+        view = BallotView(self, self._size)
+        self._size += 1
+        view.set_physical_ballot_num(ballot.get_physical_ballot_num())
+        view.set_audit_seq_num(ballot.get_audit_seq_num())
+        view.set_reported_value(ballot.get_reported_value())
+        view.set_actual_value(ballot.get_actual_value())
+        for contest_id in ballot.get_contest_ids():
+            view.set_contest_reported_value(contest_id, ballot.get_contest_reported_value(contest_id))
+            view.set_contest_actual_value(contest_id, ballot.get_contest_actual_value(contest_id))
+        return view
+
+    def extend(self, ballots):
+        for ballot in ballots:
+            self.append(ballot)
+
+    def _write(self, name, index, value):
+        column = getattr(self, name)
+        old = int(column[index])
+        column[index] = value
+        lookup = self._indexes.get(name)
+        if lookup is None:
+            return
+        rows = lookup.get(old)
+        if rows is not None:
+            rows.discard(index)
+            if not rows:
+                del lookup[old]
+        lookup.setdefault(int(value), set()).add(index)
+
+    def _find(self, name, value):
+        lookup = self._indexes[name]
+        if lookup is None:
+            lookup = self._indexes[name] = {}
+            for i, column_value in enumerate(getattr(self, name)[:self._size].tolist()):
+                lookup.setdefault(column_value, set()).add(i)
+        rows = lookup.get(value)
+        return max(rows) if rows else -1
+
+    def find_audit_seq_num(self, audit_seq_num):
+        # Index of the (last) ballot with this audit sequence number, or -1
+        return self._find("_audit_seq", audit_seq_num)
+
+    def find_physical_ballot_num(self, physical_ballot_num):
+        return self._find("_physical", physical_ballot_num)
+
+    def register_contestant(self, contestant):
+        if contestant is None:
+            return NO_VALUE
+        return _register(self._contestants, contestant)
+
+    def get_contestants(self):
+        return list(self._contestants.values())
+
+    def _set_contest_value(self, columns, contest_id, index, contestant):
+        if contest_id not in columns:
+            # Both columns of a contest are added together, so ballots without it read None
+            for contest_columns in (self._contest_reported, self._contest_actual):
+                contest_columns[contest_id] = np.full(len(self._physical), NO_VALUE, dtype=np.int32)
+            self._contest_contestants[contest_id] = {}
+        if contestant is None:
+            columns[contest_id][index] = NO_VALUE
+            return
+        columns[contest_id][index] = _register(self._contest_contestants[contest_id], contestant)
+
+    def _get_contest_value(self, columns, contest_id, index):
+        column = columns.get(contest_id)
+        if column is None or column[index] == NO_VALUE:
+            return None
+        return self._contest_contestants[contest_id][int(column[index])]
+
+    def get_contest_ids(self, index=None):
+        # Contests with columns in the store, or those the ballot at index has a value for
+        if index is None:
+            return sorted(self._contest_reported)
+        return [contest_id for contest_id in sorted(self._contest_reported)
+                if self._contest_reported[contest_id][index] != NO_VALUE or
+                self._contest_actual[contest_id][index] != NO_VALUE]
+
+    def get_contestant(self, contestant_id):
+        if contestant_id == NO_VALUE:
+            return None
+        return self._contestants[int(contestant_id)]
+
+    def get_physical_ballot_nums(self):
+        return self._physical[:self._size]
+
+    def get_audit_seq_nums(self):
+        return self._audit_seq[:self._size]
+
+    def get_reported_ids(self):
+        return self._reported[:self._size]
+
+    def get_actual_ids(self):
+        return self._actual[:self._size]
+
+    # Number of ballots per contestant id, as a dict of id to count
+    def tally(self, actual=False):
+        ids = self.get_actual_ids() if actual else self.get_reported_ids()
+        values, counts = np.unique(ids, return_counts=True)
+        return {int(v): int(c) for v, c in zip(values, counts) if v != NO_VALUE}
@@ -0,0 +1,69 @@
+import numpy as np
+from election.Contestant import Overvote, Undervote, WriteIn
+
+
+# Code of a value that is not registered in the contest
+INVALID = -1
+
+
+class CandidateRegistry:
+    """
+    Small integer codes for the choices of one contest. The contest's
+    contestants get codes 0, 1, ... in the order given (audits pass them
+    sorted by reported result, so the reported winner is 0), followed by
+    overvote, undervote and write-in. Audits keep their tallies in arrays
+    indexed by these codes.
+    """
+    INVALID = INVALID
+
+    def __init__(self, contestants, invalid_choices=True):
+        self._contestants = list(contestants)
+        if invalid_choices:
+            self._contestants.extend([Overvote(), Undervote(), WriteIn()])
+        self._codes = {c: i for i, c in enumerate(self._contestants)}
+        self._num_candidates = len(self._contestants) - (3 if invalid_choices else 0)
+        self._overvote_code = self.find_code(Overvote())
+        self._undervote_code = self.find_code(Undervote())
+
+    def __len__(self):
+        return len(self._contestants)
+
+    def get_code(self, contestant):
+        # Raises KeyError for a value that is not a choice in this contest
+        return self._codes[contestant]
+
+    def find_code(self, contestant):
+        return self._codes.get(contestant, INVALID)
+
+    def get_contestant(self, code):
+        return self._contestants[code]
+
+    def get_contestants(self):
+        return self._contestants
+
+    def get_names(self):
+        return [c.get_name() for c in self._contestants]
+
+    def get_num_candidates(self):
+        # Number of real candidates, i.e. codes below the invalid choices
+        return self._num_candidates
+
+    def get_overvote_code(self):
+        return self._overvote_code
+
+    def get_undervote_code(self):
+        return self._undervote_code
+
+    def is_invalid(self, code):
+        return code == self._overvote_code or code == self._undervote_code
+
+    def codes_from_ids(self, ids, contestants):
+        """
+        Converts an array of contestant ids (e.g. a BallotStore column) to
+        codes, with INVALID for unregistered values. `contestants` resolves
+        the ids, typically the store itself or anything with get_contestant(id).
+        """
+        ids = np.asarray(ids)
+        values, inverse = np.unique(ids, return_inverse=True)
+        codes = np.array([self.find_code(contestants.get_contestant(v)) for v in values], dtype=np.int64)
+        return codes[inverse.reshape(ids.shape)]
@@ -0,0 +1,30 @@
+class Contest:
+    def __init__(self, ID, name):
+        self._id = ID
+        self._name = name
+        self._contestants = list()
+        self._reported_results = list()
+
+    def get_id(self):
+        return self._id
+
+    def set_id(self, ID):
+        self._id = ID
+
+    def get_name(self):
+        return self._name
+
+    def set_name(self, name):
+        self._name = name
+
+    def get_contestants(self):
+        return self._contestants
+
+    def set_contestants(self, contestants):
+        self._contestants = contestants
+
+    def get_reported_results(self):
+        return self._reported_results
+
+    def set_reported_results(self, reported_results):
+        self._reported_results = reported_results
@@ -1,4 +1,8 @@
 class Contestant:
+    # Contestants are identified by name: equal names compare and hash equal, so the
+    # name is fixed once created, as contestants are keys of dicts and name indexes
+    __slots__ = ("_id", "_name")
+
     def __init__(self, ID, name):
         self._id = ID
         self._name = name
@@ -12,24 +16,37 @@ class Contestant:
     def get_name(self):
         return self._name
 
-    def set_name(self, name):
-        self._name = name
-
     def equals(self, contestant):
-        if isinstance(contestant, Contestant):
-            if contestant.get_name() == self.get_name():
-                return True
+        return self == contestant
+
+    def __eq__(self, other):
+        if isinstance(other, Contestant):
+            return self._name == other._name
+        return NotImplemented
 
-        return False
+    def __hash__(self):
+        return hash(self._name)
+
+    def __repr__(self):
+        return "{}({!r}, {!r})".format(type(self).__name__, self._id, self._name)
 
 class Undervote(Contestant):
+    __slots__ = ()
     CID = -2
 
     def __init__(self):
         super().__init__(Undervote.CID, "undervote")
 
 class Overvote(Contestant):
+    __slots__ = ()
     CID = -3 
 
     def __init__(self):
         super().__init__(Overvote.CID, "overvote")
+
+class WriteIn(Contestant):
+    __slots__ = ()
+    CID = -4
+
+    def __init__(self):
+        super().__init__(WriteIn.CID, "Write-in")
@@ -1,14 +1,28 @@
+from election.BallotStore import BallotStore
+
+
 class Election:
     def __init__(self):
         self._contestants = list()
         self._reported_results = list()
-        self._ballots = list()
+        self._ballots = BallotStore()
+        self._contests = list()
+        self._contestants_by_name = dict()
+        self._contestants_by_id = dict()
 
     def get_contestants(self):
         return self._contestants
 
     def set_contestants(self, contestants):
         self._contestants = contestants
+        self._contestants_by_name = {c.get_name(): c for c in contestants}
+        self._contestants_by_id = {c.get_id(): c for c in contestants}
+
+    def get_contestant_by_name(self, name):
+        return self._contestants_by_name.get(name)
+
+    def get_contestant_by_id(self, contestant_id):
+        return self._contestants_by_id.get(contestant_id)
 
     def get_reported_results(self):
         return self._reported_results
@@ -20,6 +34,10 @@ class Election:
         return self._ballots
 
     def set_ballots(self, ballots):
+        if not isinstance(ballots, BallotStore):
+            store = BallotStore()
+            store.extend(ballots)
+            ballots = store
         self._ballots = ballots
 
     def get_ballot(self, index):
@@ -28,5 +46,26 @@ class Election:
     def add_ballot(self, ballot):
         self._ballots.append(ballot)
 
+    # Ballot lookups return None when no ballot has the number
+    def get_ballot_by_audit_seq_num(self, audit_seq_num):
+        index = self._ballots.find_audit_seq_num(audit_seq_num)
+        return self._ballots[index] if index >= 0 else None
+
+    def get_ballot_by_physical_ballot_num(self, physical_ballot_num):
+        index = self._ballots.find_physical_ballot_num(physical_ballot_num)
+        return self._ballots[index] if index >= 0 else None
+
     def get_ballot_count(self):
         return len(self._ballots)
+
+    def get_contests(self):
+        return self._contests
+
+    def set_contests(self, contests):
+        self._contests = contests
+
+    def add_contest(self, contest):
+        self._contests.append(contest)
+
+    def get_contest(self, index):
+        return self._contests[index]
@@ -1,4 +1,7 @@
 from election.Ballot import Ballot
-from election.Contestant import Contestant, Undervote, Overvote
+from election.BallotStore import BallotStore, BallotView
+from election.Contestant import Contestant, Undervote, Overvote, WriteIn
+from election.CandidateRegistry import CandidateRegistry
+from election.Contest import Contest
 from election.Election import Election
 from election.Result import Result
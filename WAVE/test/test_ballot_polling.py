@@ -1,5 +1,6 @@
 import random
 import unittest
+import numpy as np
 from audit import BallotPolling
 import data_gen
 from election import Ballot
@@ -56,4 +57,70 @@ class TestAudit(unittest.TestCase):
         print("Different ballots: %d" % sum([(election_ballots[i]._actual_value._id != initial_ballots[i]._actual_value._id) for i in range(len(election_ballots))]) )
 
         rla.recompute(election_ballots, pres.get_reported_results())
-        self.assertEqual(rla.get_progress(),'T = 1.1990')
\ No newline at end of file
+        self.assertEqual(rla.get_progress(),'T = 1.1990')
+
+    def test_incremental_matches_recompute(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(100, 0.05)
+        e = pres.get_election()
+        ballots = e.get_ballots()
+
+        incremental = self.setup_ballot_polling()
+        incremental.init(pres.get_reported_results(), e.get_ballot_count())
+        for ballot in ballots:
+            incremental.add_ballot(ballot)
+        changed_contestant = e.get_contestants()[1]
+        for ballot in ballots[:5]:
+            incremental.amend_ballot(ballot, ballot.get_reported_value(), changed_contestant)
+
+        full = self.setup_ballot_polling()
+        full.init(pres.get_reported_results(), e.get_ballot_count())
+        full.update_reported_ballots(ballots, pres.get_reported_results())
+
+        for loser, t in full.get_t_values().items():
+            self.assertAlmostEqual(incremental.get_t_values()[loser] / t, 1.0)
+        self.assertEqual(incremental.get_tallies(), full.get_tallies())
+        self.assertEqual([r.get_percentage() for r in incremental.get_current_result()],
+                         [r.get_percentage() for r in full.get_current_result()])
+
+    def test_batch_matches_incremental(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(500, 0.05)
+        e = pres.get_election()
+        ballots = e.get_ballots()
+
+        incremental = self.setup_ballot_polling()
+        incremental.init(pres.get_reported_results(), e.get_ballot_count())
+        log_t = []
+        for ballot in ballots:
+            incremental.compute(ballot)
+            log_t.append([np.log(incremental.get_t_values()[loser]) for loser in incremental.loser_names])
+
+        batch = self.setup_ballot_polling()
+        batch.init(pres.get_reported_results(), e.get_ballot_count())
+        self.assertTrue(np.allclose(batch.trajectory(batch.get_actual_codes(ballots)), log_t))
+
+        crossed = np.array(log_t) >= np.log(1 / batch.get_risk_limit())
+        for j, first in enumerate(batch.first_crossings(batch.get_actual_codes(ballots))):
+            self.assertEqual(first, crossed[:, j].argmax() if crossed[:, j].any() else -1)
+
+        batch.recompute(ballots, pres.get_reported_results())
+        for loser, t in incremental.get_t_values().items():
+            self.assertAlmostEqual(batch.get_t_values()[loser] / t, 1.0)
+        self.assertEqual(batch.get_tallies(), incremental.get_tallies())
+        self.assertEqual(batch.get_status(), incremental.get_status())
+
+    def test_two_choice_upset_prob_is_exact(self):
+        synthetic = data_gen.Synthetic(["Approve", "Reject"], [55, 45])
+        synthetic.gen_ballots(5000, 0, np.random.default_rng(0))
+        ballots = synthetic.get_election().get_ballots()
+
+        rla = self.setup_ballot_polling()
+        rla.init(synthetic.get_reported_results(), 5000)
+        rla.compute_batch(rla.get_actual_codes(ballots[:200]))
+        upset_prob = rla.compute_upset_prob()
+        self.assertEqual(rla.upset_prob_trials, 0)
+        self.assertEqual(rla.upset_prob_ci, (upset_prob, upset_prob))
+        self.assertIn("(exact)", rla.get_progress(final=True))
@@ -0,0 +1,96 @@
+import random
+import unittest
+import data_gen
+import election
+
+
+class TestBallotStore(unittest.TestCase):
+    def setUp(self):
+        self.contestants = [election.Contestant(0, "A"), election.Contestant(1, "B")]
+
+    def make_ballot(self, num, reported, actual):
+        ballot = election.Ballot()
+        ballot.set_physical_ballot_num(num)
+        ballot.set_audit_seq_num(num)
+        ballot.set_reported_value(reported)
+        ballot.set_actual_value(actual)
+        return ballot
+
+    def test_append_and_views(self):
+        store = election.BallotStore()
+        for i in range(100):
+            store.append(self.make_ballot(i, self.contestants[i % 2], self.contestants[0]))
+
+        self.assertEqual(len(store), 100)
+        self.assertEqual(store[-1].get_physical_ballot_num(), 99)
+        self.assertIs(store[3].get_reported_value(), self.contestants[1])
+
+        store[3].set_actual_value(election.Undervote())
+        self.assertEqual(store[3].get_actual_value().get_id(), election.Undervote.CID)
+        self.assertEqual(store.tally(), {0: 50, 1: 50})
+        self.assertEqual(store.tally(actual=True), {election.Undervote.CID: 1, 0: 99})
+
+    def test_contestant_ids_are_not_shared(self):
+        store = election.BallotStore()
+        store.append(self.make_ballot(0, self.contestants[0], self.contestants[0]))
+        # An equal contestant may be registered again, another one under the same id may not
+        self.assertEqual(store.register_contestant(election.Contestant(0, "A")), 0)
+        with self.assertRaises(ValueError):
+            store[0].set_actual_value(election.Contestant(0, "C"))
+        store[0].set_contest_reported_value(1, election.Contestant(0, "D"))
+        with self.assertRaises(ValueError):
+            store[0].set_contest_actual_value(1, election.Contestant(0, "C"))
+        self.assertFalse(hasattr(self.contestants[0], "set_name"))
+
+    def test_from_arrays_copies_columns(self):
+        ids = [0, 1, 1]
+        store = election.BallotStore.from_arrays([5, 6, 7], [0, 1, 2], ids, ids, self.contestants)
+        store[0].set_actual_value(self.contestants[1])
+        self.assertIs(store[0].get_reported_value(), self.contestants[0])
+
+    def test_election_converts_ballot_lists(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(100, 0.05)
+        ballots = pres.get_election().get_ballots()
+        self.assertIsInstance(ballots, election.BallotStore)
+        self.assertEqual(sorted(b.get_audit_seq_num() for b in ballots), list(range(len(ballots))))
+
+    def test_indexes_follow_writes(self):
+        store = election.BallotStore.from_arrays([10, 11, 12, 13], [0, 1, 2, 3], [0, 1, 0, 1],
+                                                 [0, 1, 0, 1], self.contestants)
+        self.assertEqual(store.find_physical_ballot_num(12), 2)
+        self.assertEqual(store.find_audit_seq_num(7), -1)
+
+        store[3].set_audit_seq_num(0)
+        self.assertEqual(store.find_audit_seq_num(0), 3)
+        self.assertEqual(store.find_audit_seq_num(3), -1)
+        store[3].set_audit_seq_num(3)
+        self.assertEqual(store.find_audit_seq_num(0), 0)
+
+        store.append(self.make_ballot(20, self.contestants[0], self.contestants[0]))
+        self.assertEqual(store.find_physical_ballot_num(20), 4)
+        self.assertEqual(store.find_audit_seq_num(20), 4)
+
+        # With several ballots on one value the last is found, and moving it away falls back to the one before
+        store[1].set_physical_ballot_num(12)
+        store[3].set_physical_ballot_num(12)
+        self.assertEqual(store.find_physical_ballot_num(12), 3)
+        store[3].set_physical_ballot_num(13)
+        self.assertEqual(store.find_physical_ballot_num(12), 2)
+        self.assertEqual(store.find_physical_ballot_num(11), -1)
+
+    def test_election_lookups(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(100, 0.05)
+        e = pres.get_election()
+
+        ballot = e.get_ballot(17)
+        self.assertEqual(e.get_ballot_by_physical_ballot_num(ballot.get_physical_ballot_num()).get_index(), 17)
+        self.assertEqual(e.get_ballot_by_audit_seq_num(ballot.get_audit_seq_num()).get_index(), 17)
+        self.assertIsNone(e.get_ballot_by_physical_ballot_num(-5))
+
+        self.assertIs(e.get_contestant_by_name("Jill Stein"), e.get_contestants()[4])
+        self.assertIs(e.get_contestant_by_id(1), e.get_contestants()[1])
+        self.assertIsNone(e.get_contestant_by_name("Nobody"))
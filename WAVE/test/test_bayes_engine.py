@@ -0,0 +1,159 @@
+import copy
+import pickle
+import random
+import unittest
+import numpy as np
+from scipy.stats import betabinom
+from audit import bayes_engine, Bayesian
+import data_gen
+
+
+def reference_win_probs(tallies, pseudocounts, sizes, seed, num_trials):
+    # Per-trial loop in the style of bctool, used to check the vectorized engine
+    rng = np.random.default_rng(seed)
+    wins = np.zeros(len(tallies[0]))
+    for _ in range(num_trials):
+        total = np.zeros(len(tallies[0]))
+        for tally, pseudocount, size in zip(tallies, pseudocounts, sizes):
+            shares = rng.dirichlet(np.array(tally) + np.array(pseudocount))
+            total += tally + rng.multinomial(size - sum(tally), shares)
+        wins[np.argmax(total)] += 1
+    return wins / num_trials
+
+
+class TestBayesEngine(unittest.TestCase):
+    def test_matches_reference(self):
+        tallies = [[30, 25, 1], [2, 40, 0]]
+        pseudocounts = [[5, 1, 1], [1, 5, 1]]
+        sizes = [300, 350]
+
+        win_probs = bayes_engine.compute_win_probs(tallies, pseudocounts, sizes,
+                                                   1, 20000, ["A", "B", "C"], 1)
+        reference = reference_win_probs(tallies, pseudocounts, sizes, 2, 2000)
+
+        for (i, p), q in zip(win_probs, reference):
+            self.assertAlmostEqual(p, q, delta=0.05)
+
+    def test_seed_is_reproducible(self):
+        args = ([[10, 8, 0]], [[1, 1, 1]], [100], 7, 5000, ["A", "B", "C"], 1)
+        self.assertEqual(bayes_engine.compute_win_probs(*args),
+                         bayes_engine.compute_win_probs(*args))
+
+    def test_probabilities_sum_to_winners(self):
+        win_probs = bayes_engine.compute_win_probs([[10, 8, 5, 1]], [[1, 1, 1, 1]], [200],
+                                                   3, 4000, ["A", "B", "C", "D"], 2)
+        self.assertAlmostEqual(sum(p for i, p in win_probs), 2.0)
+
+    def test_adaptive_stops_early_for_lopsided_contest(self):
+        args = ([[90, 10, 0]], [[1, 1, 1]], [1000], 1, 100000)
+        upset_prob, (low, high), trials = bayes_engine.compute_upset_prob(*args, threshold=0.05,
+                                                                          ci_width=0.01)
+        self.assertLess(trials, 100000)
+        self.assertLess(high, 0.05)
+        self.assertLessEqual(low, upset_prob)
+
+        fixed = bayes_engine.compute_upset_prob(*args)
+        self.assertEqual(fixed[2], 100000)
+
+    def test_callback_reports_and_cancels(self):
+        args = ([[30, 25]], [[1, 1]], [1000], 1, 5000)
+        calls = []
+        bayes_engine.compute_upset_prob(*args, callback=lambda done, total: calls.append((done, total)))
+        self.assertEqual(calls, [(t, 5000) for t in range(1000, 5001, 1000)])
+
+        def cancel(done, total):
+            raise RuntimeError("cancelled")
+        with self.assertRaises(RuntimeError):
+            bayes_engine.compute_upset_prob(*args, callback=cancel)
+
+    def test_betabinom_cdf_matches_scipy(self):
+        for n, a, b in [(1000, 52, 48), (40, 3, 9), (25, 2.5, 1.5), (10, 30, 40)]:
+            for k in [-1, 0, 1, n // 3, n // 2, n, n + 1]:
+                self.assertAlmostEqual(bayes_engine.betabinom_cdf(k, n, a, b), betabinom.cdf(k, n, a, b))
+        # Far tails keep their relative precision
+        self.assertAlmostEqual(bayes_engine.betabinom_cdf(1380, 3000, 70, 30) / betabinom.cdf(1380, 3000, 70, 30),
+                               1.0, places=9)
+
+    def test_exact_upset_prob_matches_simulation(self):
+        args = ([[30, 25]], [[1, 1]], [1000], 1, 200000)
+        exact, (low, high), trials = bayes_engine.compute_upset_prob(*args, choices=2)
+        self.assertEqual((low, high, trials), (exact, exact, 0))
+        simulated, (low, high), _ = bayes_engine.compute_upset_prob(*args)
+        self.assertLess(low, exact)
+        self.assertGreater(high, exact)
+
+        # A sample that covers every ballot leaves nothing uncertain
+        self.assertEqual(bayes_engine.exact_upset_prob([30, 25], [1, 1], 0), 0.0)
+        self.assertEqual(bayes_engine.exact_upset_prob([25, 30], [1, 1], 0), 1.0)
+        self.assertEqual(bayes_engine.exact_upset_prob([30, 30], [1, 1], 0), 0.0)
+
+    def test_posterior_cache_draws_like_compute_upset_prob(self):
+        args = ([[30, 25, 3]], [[1, 1, 1]], [2000], 1, 5000)
+        self.assertEqual(bayes_engine.PosteriorCache().compute_upset_prob(*args),
+                         bayes_engine.compute_upset_prob(*args))
+
+    def test_posterior_cache_reweights_added_ballots(self):
+        cache = bayes_engine.PosteriorCache()
+        tally = np.array([30, 25, 3])
+        cache.compute_upset_prob([tally], [[1, 1, 1]], [2000], 1, 20000)
+        rng = np.random.default_rng(5)
+        for choice in rng.choice(3, size=40, p=[0.5, 0.45, 0.05]):
+            tally[choice] += 1
+            upset_prob, (low, high), trials = cache.compute_upset_prob([tally.copy()], [[1, 1, 1]], [2000], 1, 20000)
+        self.assertEqual(cache.resamples, 1)
+        self.assertEqual(trials, 20000)
+        self.assertLess(cache.get_effective_sample_size(), 20000)
+
+        fresh, (fresh_low, fresh_high), _ = bayes_engine.compute_upset_prob([tally], [[1, 1, 1]], [2000], 2, 200000)
+        self.assertLess(max(low, fresh_low), min(high, fresh_high))
+
+        # Taking a ballot away cannot be reweighted, so the draws are replaced
+        tally[0] -= 1
+        cache.compute_upset_prob([tally], [[1, 1, 1]], [2000], 1, 20000)
+        self.assertEqual(cache.resamples, 2)
+
+    def test_posterior_cache_resamples_when_weights_degenerate(self):
+        cache = bayes_engine.PosteriorCache(ess_fraction=0.9)
+        cache.compute_upset_prob([[10, 10]], [[1, 1]], [1000], 1, 2000)
+        for loser_votes in range(11, 30):
+            cache.compute_upset_prob([[10, loser_votes]], [[1, 1]], [1000], 1, 2000)
+            self.assertGreaterEqual(cache.get_effective_sample_size(), 0.9 * 2000)
+        self.assertGreater(cache.resamples, 1)
+
+    def test_posterior_cache_copies(self):
+        cache = bayes_engine.PosteriorCache()
+        cache.compute_upset_prob([[30, 25, 3]], [[1, 1, 1]], [2000], 1, 1000)
+        self.assertEqual(copy.deepcopy(cache).compute_upset_prob([[31, 25, 3]], [[1, 1, 1]], [2000], 1, 1000),
+                         cache.compute_upset_prob([[31, 25, 3]], [[1, 1, 1]], [2000], 1, 1000))
+        # Snapshots leave the draws out
+        restored = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(restored.get_effective_sample_size(), 0.0)
+
+    def test_bayesian_audit(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(1000, 0)
+        e = pres.get_election()
+
+        bayesian = Bayesian()
+        bayesian.n_trials = 2000
+        bayesian.init(pres.get_reported_results(), e.get_ballot_count())
+        self.assertEqual(bayesian.get_status(), "In Progress")
+
+        bayesian.recompute(e.get_ballots()[:200], pres.get_reported_results())
+        self.assertLess(bayesian.compute_upset_prob(), 0.05)
+        self.assertEqual(bayesian.get_status(), "Election Results Verified")
+
+    def test_bayesian_audit_needs_evidence(self):
+        # A 20% overstatement rate hands this contest to the runner-up
+        for ballot_count in (300, 30000):
+            synthetic = data_gen.Synthetic(["A", "B", "C", "D"], [40, 30, 20, 10])
+            synthetic.gen_ballots(ballot_count, 0.2, np.random.default_rng(0))
+            ballots = synthetic.get_election().get_ballots()
+
+            bayesian = Bayesian()
+            bayesian.n_trials = 2000
+            bayesian.init(synthetic.get_reported_results(), ballot_count)
+            for i in np.random.default_rng(1).permutation(ballot_count)[:20]:
+                bayesian.compute(ballots[int(i)])
+                self.assertNotEqual(bayesian.get_status(), "Election Results Verified")
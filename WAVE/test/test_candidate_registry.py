@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+import election
+from election import CandidateRegistry, Contestant, Overvote, Undervote, WriteIn
+
+
+class TestCandidateRegistry(unittest.TestCase):
+    def setUp(self):
+        self.contestants = [Contestant(7, "Alice"), Contestant(3, "Bob"), Contestant(5, "Carol")]
+        self.registry = CandidateRegistry(self.contestants)
+
+    def test_contestants_compare_by_name(self):
+        self.assertEqual(Contestant(1, "Alice"), Contestant(2, "Alice"))
+        self.assertNotEqual(Contestant(1, "Alice"), Contestant(1, "Bob"))
+        self.assertEqual(hash(Contestant(1, "Alice")), hash(Contestant(2, "Alice")))
+        self.assertTrue(Contestant(1, "Alice").equals(Contestant(2, "Alice")))
+        self.assertEqual(Undervote(), Undervote())
+        self.assertNotEqual(Contestant(1, "Alice"), "Alice")
+
+    def test_codes(self):
+        self.assertEqual(len(self.registry), 6)
+        self.assertEqual(self.registry.get_num_candidates(), 3)
+        self.assertEqual(self.registry.get_names(), ["Alice", "Bob", "Carol", "overvote", "undervote", "Write-in"])
+        self.assertEqual(self.registry.get_code(Contestant(0, "Bob")), 1)
+        self.assertEqual(self.registry.get_code(WriteIn()), 5)
+        self.assertEqual(self.registry.get_contestant(2), self.contestants[2])
+        self.assertEqual(self.registry.find_code(Contestant(0, "Dave")), CandidateRegistry.INVALID)
+        self.assertRaises(KeyError, self.registry.get_code, Contestant(0, "Dave"))
+
+    def test_invalid_choices(self):
+        self.assertTrue(self.registry.is_invalid(self.registry.get_code(Overvote())))
+        self.assertTrue(self.registry.is_invalid(self.registry.get_code(Undervote())))
+        self.assertFalse(self.registry.is_invalid(self.registry.get_code(WriteIn())))
+        self.assertFalse(self.registry.is_invalid(0))
+
+        plain = CandidateRegistry(self.contestants, invalid_choices=False)
+        self.assertEqual(len(plain), 3)
+        self.assertEqual(plain.find_code(Undervote()), CandidateRegistry.INVALID)
+        self.assertFalse(plain.is_invalid(0))
+
+    def test_codes_from_ids(self):
+        ids = [7, 3, 5, -2, 9, 7]
+        ballots = election.BallotStore.from_arrays(range(6), range(6), ids, ids,
+                                                   self.contestants + [Undervote(), Contestant(9, "Dave")])
+        codes = self.registry.codes_from_ids(ballots.get_actual_ids(), ballots)
+        self.assertTrue(np.array_equal(codes, [0, 1, 2, 4, CandidateRegistry.INVALID, 0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import random
 import unittest
+import numpy as np
 from audit import Comparison
 import data_gen
 from election import Ballot
@@ -17,11 +18,18 @@ class TestAudit(unittest.TestCase):
         pres.gen_ballots(ballot_count, 0.05)
         e = pres.get_election()
 
+        results = pres.get_reported_results()
+        reported_choices = {r.get_contestant().get_name(): r.get_votes() for r in results}
+
         rla = self.setup_comparison()
-        rla.init(pres.get_reported_results(), e.get_ballot_count())
+        rla.init(results, e.get_ballot_count(), reported_choices)
         rla.set_parameters([5, 1.03905,0.001,0.0001,0.001,0.0001])
-        rla.recompute(e.get_ballots(), pres.get_reported_results())
-        self.assertEqual(rla._stopping_count, 96)
+        rla.recompute(e.get_ballots(), results)
+        # The stopping count is what is left of Stark's sample size after the audited ballots:
+        # all 98 ballots with three 2-vote overstatements call for 164 in total
+        self.assertEqual((rla._o1, rla._o2, rla._u1, rla._u2), (0, 3, 0, 0))
+        self.assertEqual(rla._sample_size, 98)
+        self.assertEqual(rla._stopping_count, 164 - 98)
 
         # Change actual value for ballots
         changed_contestant = e.get_contestants()[0]
@@ -30,5 +38,57 @@ class TestAudit(unittest.TestCase):
         for i in range(5):
             election_ballots[i].set_actual_value(changed_contestant)
 
-        rla.recompute(election_ballots, pres.get_reported_results())
-        self.assertEqual(rla._stopping_count, 87)
\ No newline at end of file
+        # Three of them become 1-vote understatements, which lower the total to 149
+        rla.recompute(election_ballots, results)
+        self.assertEqual((rla._o1, rla._o2, rla._u1, rla._u2), (0, 3, 3, 0))
+        self.assertEqual(rla._stopping_count, 149 - 98)
+
+    def test_incremental_matches_recompute(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(1000, 0.05)
+        e = pres.get_election()
+        results = pres.get_reported_results()
+        reported_choices = {r.get_contestant().get_name(): r.get_votes() for r in results}
+        ballots = e.get_ballots()[:200]
+
+        incremental = self.setup_comparison()
+        incremental.init(results, e.get_ballot_count(), reported_choices)
+        for ballot in ballots:
+            incremental.add_ballot(ballot)
+        for ballot in ballots[:20]:
+            incremental.amend_ballot(ballot, ballot.get_reported_value(), e.get_contestants()[1])
+
+        full = self.setup_comparison()
+        full.init(results, e.get_ballot_count(), reported_choices)
+        full.update_reported_ballots(ballots, results)
+
+        self.assertEqual(incremental._stopping_count, full._stopping_count)
+        self.assertEqual((incremental._o1, incremental._o2, incremental._u1, incremental._u2),
+                         (full._o1, full._o2, full._u1, full._u2))
+        self.assertAlmostEqual(incremental.compute_risk() / full.compute_risk(), 1.0)
+
+    def test_discrepancy_matrix(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(1000, 0.05)
+        e = pres.get_election()
+        results = pres.get_reported_results()
+        reported_choices = {r.get_contestant().get_name(): r.get_votes() for r in results}
+        ballots = e.get_ballots()[:200]
+
+        rla = self.setup_comparison()
+        rla.init(results, e.get_ballot_count(), reported_choices)
+        for ballot in ballots:
+            rla.compute(ballot)
+
+        names = rla._candidates
+        for reported, actual in [(0, 0), (0, 1), (1, 0)]:
+            expected = sum(1 for b in ballots
+                           if b.get_reported_value().get_name() == names[reported]
+                           and b.get_actual_value().get_name() == names[actual])
+            self.assertEqual(rla._tallies[reported, actual], expected)
+        self.assertEqual(rla._tallies.sum(), len(ballots))
+        # Every candidate is a stratum, so the engine is handed views of the matrix
+        self.assertTrue(np.shares_memory(rla._tallies[rla._strata], rla._tallies))
+
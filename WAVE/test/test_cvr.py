@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from data_gen import cvr
+import election
+
+
+class TestCVR(unittest.TestCase):
+    def setUp(self):
+        self.contestants = [election.Contestant(0, "Approve"), election.Contestant(1, "Reject")]
+        handle, self.filename = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as cvr_file:
+            cvr_file.write('Cast Vote Record,Precinct,Ballot Style,"A, quoted question"\n')
+            for i in range(2, 502):
+                cvr_file.write("{},Precinct {},Style,{}\n".format(i, i % 3, "Reject" if i % 4 == 0 else "Approve"))
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_load_in_chunks(self):
+        ballots, tally, offsets = cvr.load_cvr(self.filename, self.contestants, chunk_size=256)
+        self.assertEqual(len(ballots), 500)
+        self.assertEqual(tally, {0: 375, 1: 125})
+        self.assertEqual(ballots[2].get_physical_ballot_num(), 4)
+        self.assertEqual(ballots[2].get_reported_value().get_name(), "Reject")
+        self.assertEqual(cvr.read_cvr_row(self.filename, offsets, 2), ["4", "Precinct 1", "Style", "Reject"])
+
+    def test_quoted_line_breaks(self):
+        with open(self.filename, "w") as cvr_file:
+            cvr_file.write('Cast Vote Record,Precinct,Ballot Style,Question\n')
+            for i in range(2, 102):
+                style = '"Style\nwith a note"' if i % 10 == 0 else "Style"
+                cvr_file.write("{},Precinct {},{},{}\n".format(i, i % 3, style, "Reject" if i % 4 == 0 else "Approve"))
+
+        # Small chunks end inside quoted fields; every row still starts where the reader found it
+        ballots, tally, offsets = cvr.load_cvr(self.filename, self.contestants, chunk_size=64)
+        self.assertEqual(len(ballots), 100)
+        self.assertEqual(tally, {0: 75, 1: 25})
+        self.assertEqual(cvr.read_cvr_row(self.filename, offsets, 8),
+                         ["10", "Precinct 1", "Style\nwith a note", "Approve"])
+        self.assertEqual(cvr.read_cvr_row(self.filename, offsets, 9), ["11", "Precinct 2", "Style", "Approve"])
+        self.assertEqual(ballots[9].get_physical_ballot_num(), 11)
+
+    def test_unknown_vote(self):
+        with self.assertRaises(ValueError):
+            cvr.load_cvr(self.filename, self.contestants[:1])
+        ballots, tally, offsets = cvr.load_cvr(self.filename, self.contestants[:1],
+                                               default=election.Undervote())
+        self.assertEqual(tally[election.Undervote.CID], 125)
+
+    def test_binary_cache(self):
+        cache_filename = os.path.splitext(self.filename)[0] + ".wavecvr"
+        try:
+            ballots, tally, offsets = cvr.load_cvr_cached(self.filename, self.contestants)
+            self.assertTrue(os.path.exists(cache_filename))
+
+            cached, cached_tally, cached_offsets = cvr.open_cvr_cache(cache_filename, self.contestants)
+            self.assertEqual(cached_tally, {0: 375, 1: 125})
+            self.assertEqual(list(cached_offsets), list(cvr.load_cvr(self.filename, self.contestants)[2]))
+            self.assertIs(cached[2].get_reported_value(), self.contestants[1])
+
+            # Audited values stay in memory and never touch the cache file
+            cached[2].set_actual_value(self.contestants[0])
+            reopened = cvr.open_cvr_cache(cache_filename)[0]
+            self.assertEqual(reopened[2].get_actual_value().get_name(), "Reject")
+        finally:
+            if os.path.exists(cache_filename):
+                os.remove(cache_filename)
+
+    def test_cache_follows_load_arguments(self):
+        cache_filename = os.path.splitext(self.filename)[0] + ".wavecvr"
+        try:
+            cvr.load_cvr_cached(self.filename, self.contestants)
+            # A cache built for both choices does not answer a load that counts one as an undervote
+            ballots, tally, offsets = cvr.load_cvr_cached(self.filename, self.contestants[:1],
+                                                          default=election.Undervote())
+            self.assertEqual(tally, {0: 375, election.Undervote.CID: 125})
+            ballots, tally, offsets = cvr.load_cvr_cached(self.filename, self.contestants)
+            self.assertEqual(tally, {0: 375, 1: 125})
+            self.assertIs(ballots[2].get_reported_value(), self.contestants[1])
+        finally:
+            if os.path.exists(cache_filename):
+                os.remove(cache_filename)
+
+    def test_truncated_cache_is_rebuilt(self):
+        cache_filename = os.path.splitext(self.filename)[0] + ".wavecvr"
+        try:
+            cvr.build_cvr_cache(self.filename, cache_filename, self.contestants)
+            self.assertFalse(os.path.exists(cache_filename + ".tmp"))
+            size = os.path.getsize(cache_filename)
+
+            # A write cut short keeps a fresh-looking header in front of too few records
+            with open(cache_filename, 'r+b') as cache_file:
+                cache_file.truncate(size - 100)
+            ballots, tally, offsets = cvr.load_cvr_cached(self.filename, self.contestants)
+            self.assertEqual(len(ballots), 500)
+            self.assertEqual(tally, {0: 375, 1: 125})
+            self.assertEqual(os.path.getsize(cache_filename), size)
+        finally:
+            if os.path.exists(cache_filename):
+                os.remove(cache_filename)
@@ -0,0 +1,94 @@
+import os
+import random
+import tempfile
+import unittest
+import json
+from audit import event_log, Comparison
+import data_gen
+
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix=".jsonl")
+        os.close(handle)
+
+    def tearDown(self):
+        event_log.stop()
+        os.remove(self.filename)
+
+    def read_entries(self):
+        with open(self.filename) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_audit_events_are_chained(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(100, 0.05)
+        e = pres.get_election()
+        results = pres.get_reported_results()
+
+        event_log.start(self.filename)
+        rla = Comparison()
+        rla.init(results, e.get_ballot_count(), {r.get_contestant().get_name(): r.get_votes() for r in results})
+        for ballot in e.get_ballots()[:10]:
+            rla.add_ballot(ballot)
+        event_log.stop()
+
+        entries = self.read_entries()
+        self.assertEqual([entry["event"] for entry in entries], ["init"] + ["ballot"] * 10)
+        self.assertEqual(entries[-1]["fields"]["stopping_count"], rla._stopping_count)
+        self.assertIsNone(event_log.verify_log(self.filename))
+
+        # Appending continues the chain
+        event_log.start(self.filename)
+        event_log.log_event("seed", seed=12)
+        event_log.log_event("detail", event_log.DEBUG, value=1)
+        event_log.stop()
+        self.assertEqual(len(self.read_entries()), 12)
+        self.assertIsNone(event_log.verify_log(self.filename))
+
+    def test_tampering_is_detected(self):
+        event_log.start(self.filename)
+        for i in range(5):
+            event_log.log_event("draw", draw=i, index=i * 7)
+        event_log.stop()
+
+        with open(self.filename) as log_file:
+            lines = log_file.readlines()
+        lines[2] = lines[2].replace('"index": 14', '"index": 15')
+        with open(self.filename, 'w') as log_file:
+            log_file.writelines(lines)
+        self.assertEqual(event_log.verify_log(self.filename), 2)
+
+        with open(self.filename, 'w') as log_file:
+            log_file.writelines(lines[:2] + lines[3:])
+        self.assertEqual(event_log.verify_log(self.filename), 2)
+
+    def test_torn_tail_is_cut_off(self):
+        event_log.start(self.filename)
+        for i in range(5):
+            event_log.log_event("draw", draw=i, index=i * 7)
+        event_log.stop()
+        with open(self.filename, 'ab') as log_file:
+            log_file.write(b'{"event": "draw", "fields": {"dra')
+
+        # Reopening drops the partial line, records what was dropped and continues the chain
+        event_log.start(self.filename)
+        event_log.log_event("draw", draw=5, index=35)
+        event_log.stop()
+        entries = self.read_entries()
+        self.assertEqual([entry["event"] for entry in entries], ["draw"] * 5 + ["torn_tail", "draw"])
+        self.assertEqual(entries[5]["fields"]["dropped"], '{"event": "draw", "fields": {"dra')
+        self.assertIsNone(event_log.verify_log(self.filename))
+
+        # Blocks smaller than a line are read backwards until a whole entry turns up
+        self.assertEqual(event_log._chain_tail(self.filename, block=16)[:2],
+                         (7, entries[-1]["hash"]))
+
+    def test_silent_without_log(self):
+        self.assertFalse(event_log.logger.isEnabledFor(event_log.INFO))
+        event_log.log_event("ballot", t={"A": 1.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
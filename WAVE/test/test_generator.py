@@ -0,0 +1,53 @@
+import random
+import unittest
+import numpy as np
+import data_gen
+import election
+from data_gen import generator
+
+
+class TestGenerator(unittest.TestCase):
+    def setUp(self):
+        self.contestants = [election.Contestant(0, "A"),
+                            election.Contestant(1, "B"),
+                            election.Contestant(2, "C")]
+
+    def test_error_models(self):
+        ballots = generator.gen_ballot_store(self.contestants, [500, 300, 200], np.random.default_rng(1),
+                                             overstatement=0.1, understatement=0.05,
+                                             undervote=0.02, overvote=0.01)
+        reported = ballots.get_reported_ids()
+        actual = ballots.get_actual_ids()
+
+        self.assertEqual(ballots.tally(), {0: 500, 1: 300, 2: 200})
+        self.assertEqual(((reported == 0) & (actual == 1)).sum(), 50)
+        self.assertEqual(((reported == 1) & (actual == 0)).sum(), 15)
+        self.assertEqual((actual == election.Undervote.CID).sum(), 20)
+        self.assertEqual((actual == election.Overvote.CID).sum(), 10)
+        self.assertEqual(ballots[int(np.argmax(actual == election.Undervote.CID))].get_actual_value().get_name(),
+                         "undervote")
+
+        self.assertEqual(sorted(ballots.get_physical_ballot_nums()), list(range(1000)))
+        self.assertEqual(list(ballots.get_audit_seq_nums()), list(range(1000)))
+
+    def test_pres2016(self):
+        random.seed(0)
+        pres = data_gen.Pres2016()
+        pres.gen_ballots(1000, 0.05)
+        ballots = pres.get_election().get_ballots()
+
+        self.assertEqual(len(ballots), sum(r.get_votes() for r in pres.get_reported_results()))
+        self.assertEqual(pres.get_reported_results()[0].get_votes(), 544)
+        self.assertEqual(ballots.tally(actual=True)[1], 389 + 28)
+        self.assertEqual(len(set(ballots.get_physical_ballot_nums())), len(ballots))
+
+        # The stdlib random seed still fixes the generated election
+        random.seed(0)
+        again = data_gen.Pres2016()
+        again.gen_ballots(1000, 0.05)
+        self.assertTrue(np.array_equal(again.get_election().get_ballots().get_actual_ids(),
+                                       ballots.get_actual_ids()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import audit
+import data_gen
+from audit import journal, sampler
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "audit.journal")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def make_election():
+        synthetic = data_gen.Synthetic(["Alice", "Bob", "Carol"], [50, 35, 15])
+        synthetic.gen_ballots(2000, 0.05, np.random.default_rng(7))
+        return synthetic.get_election()
+
+    def run_audit(self, e, count, snapshot_every):
+        rla = audit.BallotPolling()
+        rla.init(e.get_reported_results(), e.get_ballot_count())
+        session = journal.Journal(self.filename, snapshot_every=snapshot_every, sync=False)
+        session.start(11, rla, e.get_ballot_count())
+
+        ballots = []
+        bob = e.get_contestant_by_name("Bob")
+        for draw in range(count):
+            index = sampler.draw(11, draw, e.get_ballot_count())
+            ballot = e.get_ballot(index)
+            ballot.set_audit_seq_num(draw)
+            ballots.append(ballot)
+            rla.add_ballot(ballot)
+            session.record_draw(draw, index, ballot)
+            if draw % 7 == 0:
+                rla.amend_ballot(ballot, ballot.get_reported_value(), bob)
+                session.record_amend(draw, ballot)
+            if session.snapshot_due():
+                session.snapshot(rla, ballots, e)
+        session.close()
+        return rla, ballots
+
+    def check_resume(self, snapshot_every):
+        rla, ballots = self.run_audit(self.make_election(), 60, snapshot_every)
+
+        e = self.make_election()
+        session = journal.Journal(self.filename, sync=False)
+        self.assertTrue(session.exists())
+        resumed = session.resume(e)
+        session.close()
+
+        self.assertEqual(resumed.seed, 11)
+        self.assertEqual(resumed.next_draw, 60)
+        self.assertEqual([b.get_index() for b in resumed.ballots], [b.get_index() for b in ballots])
+        self.assertEqual([b.get_actual_value() for b in resumed.ballots],
+                         [b.get_actual_value() for b in ballots])
+        self.assertEqual(resumed.audit.get_tallies(), rla.get_tallies())
+        for loser, t in rla.get_t_values().items():
+            self.assertAlmostEqual(resumed.audit.get_t_values()[loser] / t, 1.0)
+
+    def test_resume_from_journal(self):
+        self.check_resume(snapshot_every=1000)
+        self.assertFalse(os.path.exists(self.filename + journal.SNAPSHOT_SUFFIX))
+
+    def test_resume_from_snapshot(self):
+        self.check_resume(snapshot_every=25)
+        self.assertTrue(os.path.exists(self.filename + journal.SNAPSHOT_SUFFIX))
+
+    def test_torn_record_is_dropped(self):
+        self.run_audit(self.make_election(), 10, snapshot_every=1000)
+        with open(self.filename, 'ab') as journal_file:
+            journal_file.write(b'{"seq": 99, "type": "dr')
+
+        session = journal.Journal(self.filename, sync=False)
+        resumed = session.resume(self.make_election())
+        self.assertEqual(resumed.next_draw, 10)
+        session.record_parameters(resumed.audit.get_name(), ["2.00%"])
+        session.close()
+
+        records, _ = journal._read_records(self.filename)
+        self.assertEqual([r["seq"] for r in records], list(range(len(records))))
+        self.assertEqual(records[-1]["type"], "parameters")
+
+    def test_other_election_is_rejected(self):
+        self.run_audit(self.make_election(), 5, snapshot_every=1000)
+        synthetic = data_gen.Synthetic(["Alice", "Bob"], [60, 40])
+        synthetic.gen_ballots(100, 0, np.random.default_rng(1))
+        self.assertRaises(ValueError, journal.Journal(self.filename).resume, synthetic.get_election())
+
+    def test_resume_comparison_without_snapshot(self):
+        e = self.make_election()
+        comparison = audit.Comparison()
+        reported_choices = {r.get_contestant().get_name(): r.get_votes() for r in e.get_reported_results()}
+        comparison.init(e.get_reported_results(), e.get_ballot_count(), reported_choices)
+        session = journal.Journal(self.filename, sync=False)
+        session.start(3, comparison, e.get_ballot_count())
+        for draw in range(20):
+            index = sampler.draw(3, draw, e.get_ballot_count())
+            ballot = e.get_ballot(index)
+            ballot.set_audit_seq_num(draw)
+            comparison.add_ballot(ballot)
+            session.record_draw(draw, index, ballot)
+        session.close()
+
+        session = journal.Journal(self.filename, sync=False)
+        resumed = session.resume(self.make_election())
+        session.close()
+        self.assertIsInstance(resumed.audit, audit.Comparison)
+        self.assertEqual(resumed.next_draw, 20)
+        np.testing.assert_array_equal(resumed.audit._tallies, comparison._tallies)
+
+    def test_amend_replays_audits_without_remove(self):
+        for audit_class in audit.get_audits():
+            if audit_class.supports_remove:
+                self.assertIsNot(audit_class.remove_ballot, audit.Audit.remove_ballot)
+
+        e = self.make_election()
+        rla = audit.Shangrla()
+        rla.init(e.get_reported_results(), e.get_ballot_count())
+        self.assertFalse(rla.supports_remove)
+        session = journal.Journal(self.filename, sync=False)
+        session.start(5, rla, e.get_ballot_count())
+        ballots = []
+        bob = e.get_contestant_by_name("Bob")
+        for draw in range(30):
+            index = sampler.draw(5, draw, e.get_ballot_count())
+            ballot = e.get_ballot(index)
+            ballot.set_audit_seq_num(draw)
+            ballots.append(ballot)
+            rla.add_ballot(ballot)
+            session.record_draw(draw, index, ballot)
+        ballots[3].set_actual_value(bob)
+        session.record_amend(3, ballots[3])
+        session.close()
+        rla.recompute(ballots, e.get_reported_results())
+
+        session = journal.Journal(self.filename, sync=False)
+        resumed = session.resume(self.make_election())
+        session.close()
+        self.assertEqual(resumed.ballots[3].get_actual_value().get_name(), "Bob")
+        np.testing.assert_allclose(resumed.audit.get_p_values(), rla.get_p_values())
+
+    def test_amend_by_row(self):
+        # A ballot drawn twice keeps the sequence number of its last draw, so amends name the row
+        e = self.make_election()
+        rla = audit.BallotPolling()
+        rla.init(e.get_reported_results(), e.get_ballot_count())
+        session = journal.Journal(self.filename, sync=False)
+        session.start(11, rla, e.get_ballot_count())
+        ballots = []
+        for draw, index in enumerate([4, 9, 4]):
+            ballot = e.get_ballot(index)
+            ballot.set_audit_seq_num(draw)
+            ballots.append(ballot)
+            rla.add_ballot(ballot)
+            session.record_draw(draw, index, ballot)
+        bob = e.get_contestant_by_name("Bob")
+        rla.amend_ballot(ballots[1], ballots[1].get_reported_value(), bob)
+        session.record_amend(1, ballots[1])
+        session.close()
+
+        records, _ = journal._read_records(self.filename)
+        self.assertEqual(records[-1]["row"], 1)
+        session = journal.Journal(self.filename, sync=False)
+        resumed = session.resume(self.make_election())
+        session.close()
+        self.assertEqual([b.get_index() for b in resumed.ballots], [4, 9, 4])
+        self.assertEqual(resumed.ballots[1].get_actual_value().get_name(), "Bob")
+        self.assertEqual(resumed.audit.get_tallies(), rla.get_tallies())
+
+    def test_journal_is_keyed_to_the_election(self):
+        e = self.make_election()
+        rla = audit.BallotPolling()
+        rla.init(e.get_reported_results(), e.get_ballot_count())
+        session = journal.Journal(self.filename, sync=False)
+        session.start(11, rla, e.get_ballot_count(), key=journal.election_key(e))
+        session.close()
+        self.assertEqual(journal.journal_filename(e), journal.journal_filename(self.make_election()))
+
+        # Same ballot count, different ballots
+        other = data_gen.Synthetic(["Alice", "Bob", "Carol"], [50, 35, 15])
+        other.gen_ballots(2000, 0.05, np.random.default_rng(8))
+        other.get_election().get_ballots().get_physical_ballot_nums()[:] += 1
+        self.assertNotEqual(journal.journal_filename(other.get_election()), journal.journal_filename(e))
+        self.assertRaises(ValueError, journal.Journal(self.filename).resume, other.get_election())
+
+        self.assertEqual(journal.Journal(self.filename).read_session()["seed"], 11)
+        archived = journal.Journal(self.filename).archive()
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertEqual(journal.Journal(archived).read_session()["seed"], 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
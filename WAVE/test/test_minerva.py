@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+from scipy.stats import binom
+import data_gen
+import election
+from audit import Minerva
+from audit.Minerva import _Pair
+
+
+class TestMinerva(unittest.TestCase):
+    def setup_election(self, shares=(55, 35, 10), count=10000):
+        synthetic = data_gen.Synthetic(["A", "B", "C"][:len(shares)], list(shares))
+        synthetic.gen_ballots(count, 0, np.random.default_rng(1))
+        return synthetic
+
+    def test_first_round_is_binomial_tail_ratio(self):
+        pair = _Pair(0.6)
+        pair.add_round(100, 58, 0.1)
+        self.assertAlmostEqual(pair.risk, binom.sf(57, 100, 0.5) / binom.sf(57, 100, 0.6))
+
+    def test_second_round_conditions_on_not_stopping(self):
+        # Tails of the second round only count first rounds that did not stop
+        pair = _Pair(0.6)
+        pair.add_round(50, 27, 0.1)
+        self.assertFalse(pair.confirmed)
+        kmin = len(pair.dist_null)
+        pair.add_round(50, 30, 0.1)
+
+        def tail(p):
+            first = binom.pmf(np.arange(kmin), 50, p)
+            return sum(first[k] * binom.sf(57 - k - 1, 50, p) for k in range(kmin))
+        self.assertAlmostEqual(pair.risk, tail(0.5) / tail(0.6))
+
+    def test_round_size_meets_stopping_probability(self):
+        synthetic = self.setup_election()
+        rla = Minerva()
+        rla.init(synthetic.get_reported_results(), 10000)
+        size = rla.get_next_round_size()
+        self.assertGreaterEqual(rla.stopping_probability(size), 0.9)
+        self.assertLess(rla.stopping_probability(size - 1), 0.9)
+
+    def test_round_size_is_bounded(self):
+        # A statewide contest is searched only up to a few times BRAVO's average sample number
+        a, b = election.Contestant(0, "A"), election.Contestant(1, "B")
+        results = [election.Result(a, 0.52, 5200000), election.Result(b, 0.48, 4800000)]
+        rla = Minerva()
+        rla.set_parameters([10, 99.99])
+        rla.init(results, 10000000)
+        bound = int(np.ceil(rla.round_size_bound()))
+        self.assertLess(bound, 20000)
+        self.assertEqual(rla.get_next_round_size(), bound)
+
+        # A tied pair cannot be confirmed, so the whole contest is the round
+        rla.init([election.Result(a, 0.5, 500), election.Result(b, 0.5, 500)], 1000)
+        self.assertEqual(rla.get_next_round_size(), 1000)
+
+    def test_round_matches_ballot_by_ballot(self):
+        synthetic = self.setup_election(shares=(56, 44))
+        store = synthetic.get_election().get_ballots()
+        ballots = [store[int(i)] for i in np.random.default_rng(2).integers(0, len(store), 3000)]
+        results = synthetic.get_reported_results()
+
+        by_ballot = Minerva()
+        by_ballot.init(results, len(store))
+        for ballot in ballots[:3000]:
+            by_ballot.compute(ballot)
+            if by_ballot.get_status() != Minerva.status_codes[0]:
+                break
+
+        by_round = Minerva()
+        by_round.init(results, len(store))
+        start = 0
+        for end in by_ballot.get_round_ends():
+            by_round.compute_round(ballots[start:end])
+            start = end
+        self.assertEqual(by_round.get_status(), by_ballot.get_status())
+        self.assertEqual([p.risk for p in by_round._pairs], [p.risk for p in by_ballot._pairs])
+
+        self.assertGreater(len(by_ballot.get_round_ends()), 0)
+        replayed = Minerva()
+        replayed.init(results, len(store))
+        replayed._round_ends = by_ballot.get_round_ends()
+        replayed.recompute(ballots[:by_ballot.get_round_ends()[-1]], results)
+        self.assertEqual(replayed.get_round_ends(), by_ballot.get_round_ends())
+        self.assertEqual(replayed.get_status(), by_ballot.get_status())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import random
+import unittest
+import numpy as np
+from audit import BallotPolling, MultiContest
+import election
+
+
+def make_contest(contest_id, name, votes):
+    contest = election.Contest(contest_id, name)
+    contestants = [election.Contestant(i, n) for i, n in enumerate(votes)]
+    total = sum(votes.values())
+    contest.set_contestants(contestants)
+    contest.set_reported_results([election.Result(c, votes[c.get_name()] / total, votes[c.get_name()])
+                                  for c in contestants])
+    return contest
+
+
+def make_ballots(contests, count, flips=0):
+    # Ballots match the reported results; the first `flips` ballots of the
+    # first contest are reported for its winner but were actually for the loser
+    ballots = []
+    columns = []
+    for contest in contests:
+        values = []
+        for result in contest.get_reported_results():
+            values.extend([result.get_contestant()] * result.get_votes())
+        random.shuffle(values)
+        columns.append(values)
+
+    for i in range(count):
+        ballot = election.Ballot()
+        ballot.set_audit_seq_num(i)
+        for contest, values in zip(contests, columns):
+            ballot.set_contest_reported_value(contest.get_id(), values[i])
+            ballot.set_contest_actual_value(contest.get_id(), values[i])
+        ballots.append(ballot)
+    return ballots
+
+
+class TestMultiContest(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.contests = [make_contest(0, "Landslide", {"A": 800, "B": 200}),
+                         make_contest(1, "Close", {"C": 505, "D": 495}),
+                         make_contest(2, "Three way", {"E": 500, "F": 300, "G": 200})]
+        self.ballots = make_ballots(self.contests, 1000)
+
+    def test_per_contest_status(self):
+        mc = MultiContest()
+        mc.init(self.contests, 1000)
+        for ballot in self.ballots[:300]:
+            mc.compute(ballot)
+
+        self.assertEqual(mc.get_statuses(), ["Election Results Verified",
+                                             "In Progress",
+                                             "Election Results Verified"])
+        self.assertEqual(mc.get_status(), "In Progress")
+
+    def test_polling_matches_ballot_polling(self):
+        contest = self.contests[2]
+        mc = MultiContest()
+        mc.init([contest], 1000)
+
+        bp = BallotPolling()
+        bp.init(contest.get_reported_results(), 1000)
+
+        for ballot in self.ballots[:200]:
+            mc.compute(ballot)
+            single = election.Ballot()
+            single.set_actual_value(ballot.get_contest_actual_value(contest.get_id()))
+            bp.compute(single)
+
+        for log_t, loser in zip(mc._log_t, ["F", "G"]):
+            self.assertAlmostEqual(log_t, np.log(bp.get_t_values()[loser]))
+
+    def test_comparison_batch_and_remove(self):
+        mc = MultiContest("comparison")
+        mc.init(self.contests, 1000)
+        reported = np.array([mc.get_codes(b, actual=False) for b in self.ballots[:100]])
+        actual = reported.copy()
+        actual[:3, 1] = 1
+        mc.compute_batch(reported, actual)
+        risks = mc.get_risks()
+
+        # Overstatements only raise the risk of the contest they occur in
+        clean = MultiContest("comparison")
+        clean.init(self.contests, 1000)
+        clean.compute_batch(reported, reported)
+        self.assertGreater(risks[1], clean.get_risks()[1])
+        self.assertAlmostEqual(risks[0], clean.get_risks()[0])
+
+        mc.compute_batch(reported[:3], actual[:3], direction=-1)
+        mc.compute_batch(reported[:3], reported[:3])
+        np.testing.assert_allclose(mc.get_risks(), clean.get_risks())
+
+    def test_ballots_stored_in_election(self):
+        # Per-contest values survive the election's columnar ballot store
+        e = election.Election()
+        e.set_ballots(self.ballots[:500])
+        for ballot in self.ballots[500:]:
+            e.add_ballot(ballot)
+
+        stored = MultiContest()
+        stored.init(self.contests, 1000)
+        direct = MultiContest()
+        direct.init(self.contests, 1000)
+        for ballot, original in zip(e.get_ballots()[:300], self.ballots):
+            self.assertIs(ballot.get_contest_actual_value(2), original.get_contest_actual_value(2))
+            stored.compute(ballot)
+            direct.compute(original)
+        self.assertEqual(stored.get_statuses(), direct.get_statuses())
+        np.testing.assert_allclose(stored.get_risks(), direct.get_risks())
+        self.assertEqual(e.get_ballots()[0].get_contest_ids(), [0, 1, 2])
+        self.assertIsNone(e.get_ballots()[0].get_contest_reported_value(7))
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import election
+from audit import planner, simulation
+
+
+class TestPlanner(unittest.TestCase):
+    def test_bravo_asn_matches_simulation(self):
+        rng = np.random.default_rng(0)
+        stops = planner.simulate_bravo([0.6, 0.4], 10000, 0.1, 4000, rng)
+        asn = planner.bravo_asn(0.6, 0.4, 0.1)
+        self.assertAlmostEqual(stops.mean() / asn, 1.0, delta=0.05)
+
+    def test_bravo_matches_ballot_polling(self):
+        # The statistic-level simulation agrees with running BallotPolling itself
+        planned = planner.simulate_bravo([0.6, 0.4], 2000, 0.1, 2000, np.random.default_rng(1))
+        audited = simulation.simulate(["A", "B"], [60, 40], 2000, 0, "rla", 0.1, 400,
+                                      seed=1, max_workers=1)
+        self.assertAlmostEqual(planned.mean() / audited.mean(), 1.0, delta=0.15)
+
+    def test_comparison_without_discrepancies(self):
+        stops = planner.simulate_comparison(0.1, 10000, 0.05, 100, np.random.default_rng(0),
+                                            rates=[0, 0, 0, 0])
+        expected = int(np.ceil(np.log(0.05) / np.log(1 - 0.1 / (2 * 1.03905))))
+        self.assertTrue((stops == expected).all())
+        self.assertEqual(planner.comparison_asn(0.1, 0.05, rates=[0, 0, 0, 0]),
+                         np.ceil(-2 * 1.03905 * np.log(0.05) / 0.1))
+
+    def test_asn_is_vectorized(self):
+        margins = np.array([0.05, 0.1, 0.2])
+        asn = planner.bravo_asn((1 + margins) / 2, (1 - margins) / 2, 0.05)
+        self.assertEqual(asn.shape, (3,))
+        self.assertTrue((np.diff(asn) < 0).all())
+        self.assertTrue(np.isinf(planner.bravo_asn(0.5, 0.5, 0.05)))
+
+    def test_plan(self):
+        contest = election.Contest(0, "Mayor")
+        contest.set_reported_results([election.Result(election.Contestant(0, "A"), 0.45, 450),
+                                      election.Result(election.Contestant(1, "B"), 0.55, 550)])
+        tied = [election.Result(election.Contestant(0, "C"), 0.5, 500),
+                election.Result(election.Contestant(1, "D"), 0.5, 500)]
+        plans = planner.plan([contest, tied], 1000, 0.1, trials=200, seed=3)
+
+        self.assertEqual(plans[0]["polling"]["asn"], float(planner.bravo_asn(0.55, 0.45, 0.1)))
+        self.assertLessEqual(plans[0]["polling"][0.5], plans[0]["polling"][0.9])
+        self.assertLessEqual(plans[0]["comparison"][0.9], plans[0]["comparison"][0.99])
+        for audit_type in ("polling", "comparison"):
+            self.assertEqual(plans[1][audit_type]["mean"], 1000)
+            self.assertEqual(plans[1][audit_type]["full_hand_count_rate"], 1.0)
+
+        analytic = planner.plan([contest], 1000, 0.1, trials=0)[0]
+        self.assertEqual(analytic["polling"]["mean"], analytic["polling"]["asn"])
+        self.assertIsNone(analytic["polling"][0.9])
+
+    def test_plan_margins_is_reproducible(self):
+        first = planner.plan_margins([0.05, 0.1], 5000, 0.05, trials=100, seed=7)
+        again = planner.plan_margins([0.05, 0.1], 5000, 0.05, trials=100, seed=7)
+        self.assertEqual(first, again)
+        self.assertGreater(first[0]["polling"]["mean"], first[1]["polling"]["mean"])
+
+    def test_uncontested_race(self):
+        uncontested = [election.Result(election.Contestant(0, "A"), 1.0, 100)]
+        plans = planner.plan([uncontested], 100, 0.05, audit_types=("polling", "comparison", "minerva"),
+                             trials=50, seed=1)
+        for summary in plans[0].values():
+            self.assertEqual(summary["asn"], 0)
+            self.assertEqual(summary["mean"], 0)
+            self.assertEqual(summary["full_hand_count_rate"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
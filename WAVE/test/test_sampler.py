@@ -0,0 +1,38 @@
+import hashlib
+import unittest
+import numpy as np
+from audit import sampler
+
+
+class TestSampler(unittest.TestCase):
+    def test_draw(self):
+        digest = hashlib.sha256(b"12345678901234567890,7").hexdigest()
+        self.assertEqual(sampler.draw("12345678901234567890", 7, 1000), int(digest, 16) % 1000)
+
+    def test_draws_are_independent_of_order(self):
+        first = sampler.draws(42, 5000, 100)
+        later = sampler.draws(42, 5000, 50, start=50)
+        self.assertTrue(np.array_equal(first[50:], later))
+        self.assertEqual(first[17], sampler.draw(42, 17, 5000))
+        self.assertTrue(((first >= 0) & (first < 5000)).all())
+        for population in (1, 2 ** 40 + 3, 2 ** 60 + 1):
+            self.assertEqual(list(sampler.draws("seed", population, 20, start=3)),
+                             [sampler.draw("seed", k, population) for k in range(3, 23)])
+
+    def test_pull_list(self):
+        batches = np.arange(20) // 5
+        pulls = sampler.pull_list(3, 20, 60, batches=batches)
+        sample = sampler.draws(3, 20, 60)
+
+        self.assertEqual(pulls['times'].sum(), 60)
+        self.assertEqual(sorted(pulls['ballot']), sorted(set(sample)))
+        self.assertTrue(np.array_equal(pulls['batch'], batches[pulls['ballot']]))
+        keys = list(zip(pulls['batch'], pulls['ballot']))
+        self.assertEqual(keys, sorted(keys))
+        for row in pulls:
+            self.assertEqual(sample[row['draw']], row['ballot'])
+            self.assertNotIn(row['ballot'], sample[:row['draw']])
+
+
+if __name__ == '__main__':
+    unittest.main()
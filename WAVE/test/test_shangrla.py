@@ -0,0 +1,109 @@
+import unittest
+import numpy as np
+import data_gen
+from audit import Shangrla, simulation
+from audit.Shangrla import alpha_p_values, kaplan_markov_p_values
+
+
+def alpha_reference(x, u, eta0, t=0.5, d=100, population=None):
+    # Ballot-by-ballot ALPHA, written directly from the definition
+    p_values = []
+    log_t = 0.0
+    best = 0.0
+    total = 0.0
+    for j, value in enumerate(x, 1):
+        mu = t if population is None else (population * t - total) / (population - j + 1)
+        eta = min(u * (1 - np.finfo(float).eps),
+                  max((d * eta0 + total) / (d + j - 1), mu + (eta0 - t) / 2 / np.sqrt(d + j - 1)))
+        log_t += np.log(value / mu * (eta - mu) / (u - mu) + (u - eta) / (u - mu))
+        best = max(best, log_t)
+        p_values.append(min(1.0, np.exp(-best)))
+        total += value
+    return p_values
+
+
+class TestShangrla(unittest.TestCase):
+    def setup_audit(self, names, shares, count=2000, **parameters):
+        synthetic = data_gen.Synthetic(names, shares)
+        synthetic.gen_ballots(count, 0, np.random.default_rng(1))
+        rla = Shangrla()
+        param = [value for _, value in rla.get_parameters()]
+        for i, key in enumerate(["risk_limit", "winners", "supermajority", "comparison", "risk_function"]):
+            if key in parameters:
+                param[i] = parameters[key]
+        rla.set_parameters(param)
+        rla.init(synthetic.get_reported_results(), count)
+        return rla, synthetic.get_election().get_ballots()
+
+    def test_alpha_matches_reference(self):
+        x = np.random.default_rng(0).choice([0, 0.5, 1], size=300, p=[0.4, 0.1, 0.5])
+        np.testing.assert_allclose(alpha_p_values(x, 1, 0.55)[0], alpha_reference(x, 1, 0.55))
+        np.testing.assert_allclose(alpha_p_values(x, 1, 0.55, population=1000)[0],
+                                   alpha_reference(x, 1, 0.55, population=1000))
+
+    def test_alpha_in_batches(self):
+        x = np.random.default_rng(2).choice([0, 0.5, 1], size=(2, 300), p=[0.4, 0.1, 0.5])
+        state = {}
+        batches = [alpha_p_values(x[:, i:i + 70], 1, [0.55, 0.6], population=1000, state=state)
+                   for i in range(0, 300, 70)]
+        np.testing.assert_allclose(np.hstack(batches), alpha_p_values(x, 1, [0.55, 0.6], population=1000))
+
+        state = {}
+        batches = [kaplan_markov_p_values(x[:, i:i + 70], state=state) for i in range(0, 300, 70)]
+        np.testing.assert_allclose(np.hstack(batches), kaplan_markov_p_values(x))
+
+    def test_alpha_eta_below_u(self):
+        # Sampling zeros without replacement pushes the null mean up to just below u, where
+        # mu + c / sqrt(d + j - 1) passes u; eta must still be truncated to below u
+        x = np.zeros(50)
+        state = {}
+        p_values = alpha_p_values(x, 1, 0.9, d=1, population=100, state=state)[0]
+        np.testing.assert_allclose(p_values, alpha_reference(x, 1, 0.9, d=1, population=100))
+        # With eta above u a zero makes its term negative and the test statistic log(0)
+        self.assertTrue(np.isfinite(state["log_t"]).all())
+
+    def test_kaplan_markov(self):
+        x = np.array([1, 1, 0, 1])
+        expected = np.minimum.accumulate(np.cumprod(0.6 / (x + 0.1)))
+        np.testing.assert_allclose(kaplan_markov_p_values(x)[0], np.minimum(1, expected))
+
+    def test_multi_winner_assertions(self):
+        rla, _ = self.setup_audit(["A", "B", "C", "D"], [40, 30, 20, 10], winners=2)
+        self.assertEqual(rla.get_assertions(), ["A beats C", "A beats D", "B beats C", "B beats D"])
+
+    def test_supermajority(self):
+        rla, ballots = self.setup_audit(["Approve", "Reject"], [70, 30], supermajority=60)
+        self.assertEqual(len(rla.get_assertions()), 1)
+        self.assertIsNotNone(rla.recompute(ballots, rla._results))
+        self.assertEqual(rla.get_status(), Shangrla.status_codes[1])
+
+        # A 55% Approve vote does not meet a 60% threshold
+        rla, ballots = self.setup_audit(["Approve", "Reject"], [55, 45], supermajority=60)
+        self.assertIsNone(rla.recompute(ballots, rla._results))
+        self.assertEqual(rla.get_status(), Shangrla.status_codes[2])
+
+    def test_comparison_without_discrepancies(self):
+        # Every overstatement assorter value is 1 / (2 - v), so Kaplan-Markov needs a known number of ballots
+        rla, ballots = self.setup_audit(["A", "B"], [55, 45], comparison="1", risk_function="kaplan-markov")
+        rla.recompute(ballots, rla._results)
+        v = rla._margins[0]
+        ratio = 0.6 / (1 / (2 - v) + 0.1)
+        self.assertEqual(rla.stopping_index() + 1, int(np.ceil(np.log(0.05) / np.log(ratio))))
+
+    def test_compute_matches_batch(self):
+        rla, ballots = self.setup_audit(["A", "B", "C"], [50, 30, 20])
+        for i in range(200):
+            rla.compute(ballots[i])
+        batch, _ = self.setup_audit(["A", "B", "C"], [50, 30, 20])
+        batch.compute_batch(batch.get_codes(ballots[:200], actual=False), batch.get_codes(ballots[:200]))
+        np.testing.assert_allclose(rla.get_p_values(), batch.get_p_values())
+        self.assertEqual(rla.get_status(), batch.get_status())
+
+    def test_simulation(self):
+        stops = simulation.simulate(["A", "B"], [60, 40], 2000, 0, "shangrla", 0.1, 50,
+                                    seed=1, max_workers=1)
+        self.assertLess(np.median(stops), 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from audit import simulation, BallotPolling
+import data_gen
+
+
+class TestSimulation(unittest.TestCase):
+    def test_synthetic_election(self):
+        synthetic = data_gen.Synthetic(["A", "B", "C"], [50, 30, 10])
+        synthetic.gen_ballots(1000, 0.1, np.random.default_rng(0))
+        ballots = synthetic.get_election().get_ballots()
+
+        votes = [r.get_votes() for r in synthetic.get_reported_results()]
+        self.assertEqual(sum(votes), 1000)
+        self.assertEqual(ballots.tally(), {i: v for i, v in enumerate(votes)})
+        # 10% of A's ballots were actually cast for B
+        self.assertEqual(ballots.tally(actual=True)[1], votes[1] + int(np.ceil(0.1 * votes[0])))
+
+    def test_bravo_stops_at_risk_limit(self):
+        synthetic = data_gen.Synthetic(["A", "B"], [60, 40])
+        synthetic.gen_ballots(100, 0)
+        rla = BallotPolling()
+        rla.set_risk_limit(0.1)
+        rla.init(synthetic.get_reported_results(), 100)
+
+        winner = synthetic.get_election().get_contestants()[0]
+        votes = 0
+        while rla.get_status() == "In Progress":
+            ballot = synthetic.get_election().get_ballots()[0]
+            ballot.set_actual_value(winner)
+            rla.compute(ballot)
+            votes += 1
+        # T grows by 1.2 per vote for the winner and must reach 1 / 0.1
+        self.assertEqual(votes, 13)
+        self.assertEqual(rla.get_status(), "Election Results Verified")
+
+    def test_simulate_is_reproducible(self):
+        stops = simulation.simulate(["A", "B"], [60, 40], 200, 0.0, "polling", 0.1, 20,
+                                    seed=5, chunk_size=5)
+        serial = simulation.simulate(["A", "B"], [60, 40], 200, 0.0, "polling", 0.1, 20,
+                                     seed=5, max_workers=1, chunk_size=5)
+        self.assertTrue(np.array_equal(stops, serial))
+        self.assertTrue(((stops > 0) & (stops <= 200)).all())
+
+        summary = simulation.summarize(stops, 200)
+        self.assertAlmostEqual(summary["mean"], stops.mean())
+        self.assertLessEqual(summary[0.05], summary[0.5])
+
+
+if __name__ == '__main__':
+    unittest.main()